@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, CustomerProfile, Order, OrderItem, Wishlist
+from .models import CustomUser, CustomerProfile, Wishlist
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
@@ -22,23 +22,13 @@ class CustomUserAdmin(UserAdmin):
 
 @admin.register(CustomerProfile)
 class CustomerProfileAdmin(admin.ModelAdmin):
-    list_display = ('user', 'get_address')  # use a method to access the address
+    list_display = ('user', 'get_address', 'order_count', 'lifetime_spend', 'last_order_at')  # use a method to access the address
     search_fields = ('user__username', 'user__address')
 
     def get_address(self, obj):
         return obj.user.address
     get_address.short_description = 'Address'
 
-@admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'customer', 'status', 'total_amount', 'created_at')
-    list_filter = ('status',)
-    search_fields = ('customer__username',)
-
-@admin.register(OrderItem)
-class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ('order', 'product', 'quantity', 'price')
-
 @admin.register(Wishlist)
 class WishlistAdmin(admin.ModelAdmin):
     list_display = ('customer', 'product', 'added_at')
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+PLACED_STATUSES = ('paid', 'processing', 'shipped', 'completed')
+
+
+def backfill_order_summaries(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    CustomerProfile = apps.get_model('accounts', 'CustomerProfile')
+    placed = Order.objects.filter(status__in=PLACED_STATUSES)
+    stats = placed.values('user_id').annotate(count=Count('id'), spend=Sum('total_amount'), last_at=Max('created_at')).order_by()
+    profiles = []
+    for row in stats:
+        last_id = placed.filter(user_id=row['user_id']).order_by('-created_at', '-id').values_list('id', flat=True).first()
+        for profile in CustomerProfile.objects.filter(user_id=row['user_id']):
+            profile.order_count, profile.lifetime_spend = row['count'], row['spend'] or 0
+            profile.last_order_id, profile.last_order_at = last_id, row['last_at']
+            profiles.append(profile)
+    CustomerProfile.objects.bulk_update(profiles, ['order_count', 'lifetime_spend', 'last_order', 'last_order_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_order_customer_created_idx'),
+        # MpesaPayment.order pointed at accounts.Order until this one
+        ('mpesapayment', '0002_mpesapayment_checkout_request_id_and_more'),
+        ('store', '0017_unify_orders'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='orderitem',
+            name='order',
+        ),
+        migrations.RemoveField(
+            model_name='orderitem',
+            name='product',
+        ),
+        migrations.AddField(
+            model_name='customerprofile',
+            name='last_order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='store.order'),
+        ),
+        migrations.AddField(
+            model_name='customerprofile',
+            name='last_order_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customerprofile',
+            name='lifetime_spend',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='customerprofile',
+            name='order_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_order_summaries, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='Order',
+        ),
+        migrations.DeleteModel(
+            name='OrderItem',
+        ),
+    ]
@@ -28,6 +28,13 @@ class CustomerProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+
+    # Placed-order summary for the dashboard header, maintained by store.customers
+    order_count = models.PositiveIntegerField(default=0)
+    lifetime_spend = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    last_order = models.ForeignKey('store.Order', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_order_at = models.DateTimeField(blank=True, null=True)
+
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
@@ -60,53 +67,6 @@ class Cart(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in {self.customer.username}'s cart"
 
-# ----------------------------
-# Orders & Order Items
-# ----------------------------
-class Order(models.Model):
-    STATUS_CHOICES = [
-        ('pending', 'Pending'),
-        ('paid', 'Paid'),
-        ('shipped', 'Shipped'),
-        ('delivered', 'Delivered'),
-        ('cancelled', 'Cancelled'),
-    ]
-
-    customer = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='orders')
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
-    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
-    shipping_address = models.TextField(blank=True, null=True)
-
-    def __str__(self):
-        return f"Order {self.id} by {self.customer.username}"
-
-    def calculate_total(self):
-        total = sum(item.total_price() for item in self.items.all())
-        self.total_amount = total
-        self.save()
-        return total
-
-    def cancel_order(self):
-        if self.status == 'pending':
-            self.status = 'cancelled'
-            self.save()
-            return True
-        return False
-
-class OrderItem(models.Model):
-    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='accounts_order')
-    product = models.ForeignKey('store.Product', on_delete=models.CASCADE)
-    quantity = models.PositiveIntegerField(default=1)
-    price = models.DecimalField(max_digits=12, decimal_places=2)
-
-    def __str__(self):
-        return f"{self.quantity} x {self.product.name}"
-
-    def total_price(self):
-        return self.quantity * self.price
-
 # ----------------------------
 # Signals: Auto-create CustomerProfile
 # ----------------------------
@@ -2,6 +2,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.conf import settings
 from django.urls import reverse_lazy
 from django.contrib.auth.views import (
     PasswordChangeView, PasswordChangeDoneView,
@@ -15,8 +16,12 @@ from .forms import (
     CustomUserCreationForm, 
     CustomerProfileUpdateForm
 )
-from .models import CustomUser, CustomerProfile, Order, Wishlist
-from store.models import Product
+from .models import CustomUser, CustomerProfile, Wishlist
+from store.models import Order
+from store.checkout import release
+from store.customers import refresh_summaries
+from store.carts import Cart, persist as persist_cart
+from store.pagination import paginate
  
 def register(request):
     if request.method == 'POST':
@@ -54,7 +59,13 @@ def user_login(request):
             login(request, user)
             messages.success(request, f"Welcome back, {user.username}!")
             next_url = request.GET.get('next') or 'accounts:customer_dashboard'
-            return redirect(next_url)
+            response = redirect(next_url)
+            # Carry the anonymous cart over to the account
+            basket = Cart.from_request(request)
+            if basket:
+                persist_cart(basket, user)
+                basket.clear(response)
+            return response
     else:
         form = LoginForm()
     return render(request, 'accounts/login.html', {'form': form})
@@ -72,16 +83,19 @@ def user_logout(request):
 @login_required
 def customer_dashboard(request):
     user = request.user
-    profile, _ = CustomerProfile.objects.get_or_create(user=user)
-    orders = Order.objects.filter(customer=user).order_by('-created_at')
+    profile, created = CustomerProfile.objects.get_or_create(user=user)
+    if created:
+        # Summaries are only maintained on existing profiles
+        refresh_summaries([user.pk])
+        profile.refresh_from_db()
+    orders = paginate(request, Order.objects.filter(user=user), settings.ORDERS_PER_PAGE)
     wishlist = Wishlist.objects.filter(customer=user)
-    products = Product.objects.filter(quantity__gt=0)  # in stock
     return render(request, 'accounts/customer_dashboard.html', {
         'user': user,
         'profile': profile,
         'orders': orders,
+        'page': orders,
         'wishlist': wishlist,
-        'products': products
     })
 
 
@@ -109,10 +123,11 @@ def update_customer_profile(request):
 # ----------------------------
 @login_required
 def cancel_order(request, order_id):
-    order = get_object_or_404(Order, id=order_id, customer=request.user)
+    order = get_object_or_404(Order, id=order_id, user=request.user)
     if order.status == 'pending':
         order.status = 'cancelled'
         order.save()
+        release(order)
         messages.success(request, f"Order #{order.id} cancelled.")
     else:
         messages.error(request, "You cannot cancel this order.")
@@ -121,8 +136,8 @@ def cancel_order(request, order_id):
 
 @login_required
 def order_history(request):
-    orders = Order.objects.filter(customer=request.user).order_by('-created_at')
-    return render(request, 'accounts/order_history.html', {'orders': orders})
+    orders = paginate(request, Order.objects.filter(user=request.user), settings.ORDERS_PER_PAGE)
+    return render(request, 'accounts/order_history.html', {'orders': orders, 'page': orders})
 
 
 # ----------------------------
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class HelpcentreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'helpcentre'
+
+    def ready(self):
+        import helpcentre.signals
@@ -0,0 +1,13 @@
+from store.trigrams import LazyTrigramIndex
+
+
+def _load_faqs():
+    from .models import FAQ
+
+    return FAQ.objects.filter(is_active=True).values_list('id', 'question').iterator()
+
+
+# Typo-tolerant fallback for the help centre search box. FAQs have no version
+# to compare, so each worker rebuilds this small index every
+# SEARCH_INDEX_CHECK_SECONDS to pick up other workers' edits.
+faq_index = LazyTrigramIndex(_load_faqs)
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import FAQ
+from .search import faq_index
+
+
+@receiver(post_save, sender=FAQ)
+def update_fuzzy_faq(sender, instance, raw=False, **kwargs):
+    index = faq_index.loaded()
+    if index is None or raw:
+        return
+    if instance.is_active:
+        index.add(instance.pk, instance.question)
+    else:
+        index.remove(instance.pk)
+
+
+@receiver(post_delete, sender=FAQ)
+def remove_fuzzy_faq(sender, instance, **kwargs):
+    index = faq_index.loaded()
+    if index is not None:
+        index.remove(instance.pk)
@@ -5,6 +5,8 @@ from django.conf import settings
 
 from .models import HelpCategory, FAQ, SupportTicket, TicketReply
 from .forms import TicketForm, ReplyForm, ContactForm
+from .search import faq_index
+from store.search import rank_by_ids, with_fuzzy_matches
 
 
 # ----- HELP CENTER -----
@@ -12,7 +14,9 @@ def help_centre(request):
     query = request.GET.get('q')
     faqs = FAQ.objects.filter(is_active=True)
     if query:
-        faqs = faqs.filter(question__icontains=query)
+        # Exact matches first, then close spellings when there are few of them
+        ids = list(faqs.filter(question__icontains=query).values_list('id', flat=True))
+        faqs = rank_by_ids(faqs, with_fuzzy_matches(ids, query, faq_index))
     categories = HelpCategory.objects.all()
     return render(request, 'helpcentre/help_centre.html', {
         'faqs': faqs,
@@ -142,6 +142,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Wait for a concurrent writer (e.g. two checkouts) instead of failing
+        'OPTIONS': {'timeout': 20},
+        # A file rather than in-memory, so threaded tests share one database
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -205,4 +209,66 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
 # Optional: only if using forms
-CSRF_TRUSTED_ORIGINS = ['https://miniecommerce-hb7o.onrender.com']
\ No newline at end of file
+CSRF_TRUSTED_ORIGINS = ['https://miniecommerce-hb7o.onrender.com']
+
+# Product search: max ranked matches pulled from the full-text index
+SEARCH_RESULTS_LIMIT = 1000
+
+# Page sizes for cursor-paginated listings
+PRODUCTS_PER_PAGE = 24
+ORDERS_PER_PAGE = 20
+
+# Product view counting: 'cache' (shared by every worker that shares the
+# cache, flushable with `manage.py flush_view_counts`), 'memory' (per
+# process, development only) or 'off'. With several workers 'cache' needs a
+# shared backend such as Redis or Memcached; the default per-process LocMem
+# cache only suits a single worker.
+VIEW_COUNT_BUFFER = config('VIEW_COUNT_BUFFER', default='cache')
+VIEW_COUNT_FLUSH_INTERVAL = config('VIEW_COUNT_FLUSH_INTERVAL', default=30, cast=int)  # seconds
+VIEW_COUNT_FLUSH_THRESHOLD = config('VIEW_COUNT_FLUSH_THRESHOLD', default=100, cast=int)  # pending hits
+
+# "Customers also bought" neighbours kept per product
+RECOMMENDATIONS_PER_PRODUCT = 8
+
+# Typo-tolerant fallback: used when exact search finds fewer than N results
+SEARCH_FUZZY_MIN_RESULTS = 3
+SEARCH_FUZZY_THRESHOLD = 0.45  # share of the query's trigrams a match must contain
+
+# In-memory search indexes (autocomplete, typo-tolerant search) look for
+# changes made by other workers at most this often (seconds)
+SEARCH_INDEX_CHECK_SECONDS = 10
+
+# Product image uploads: 'cloudinary' or 'local' (MEDIA_ROOT, for development/tests)
+IMAGE_UPLOAD_BACKEND = config('IMAGE_UPLOAD_BACKEND', default='cloudinary')
+IMAGE_UPLOAD_WORKERS = config('IMAGE_UPLOAD_WORKERS', default=4, cast=int)  # per worker process
+
+# JSON catalog API (store.api)
+API_CACHE_SECONDS = 60
+API_MAX_PAGE_SIZE = 100
+
+# Home page featured feed (store.featured): curated slots topped up by popularity
+FEATURED_PRODUCTS_COUNT = 10
+FEATURED_SALES_DAYS = 30
+FEATURED_SALES_WEIGHT = 20  # one unit sold counts as this many views
+FEATURED_CACHE_SECONDS = 300
+
+# product_list facet sidebar (store.facets); counters are exact, this only bounds cache staleness
+FACETS_CACHE_SECONDS = 600
+
+# Signed-cookie cart (store.carts), written to an Order at login or checkout
+CART_COOKIE_AGE = 60 * 60 * 24 * 30  # seconds
+CART_MAX_LINES = 50  # keeps the cookie well under the 4 KB browser limit
+CART_MAX_QUANTITY = 99
+
+# Stock held for an order once checkout starts (store.checkout); run expire_reservations every minute or so
+RESERVATION_TTL_SECONDS = 15 * 60
+
+# Checkout waiting room (store.admission); needs a cache shared by all workers to be a global limit
+ADMISSION_MAX_ACTIVE = config('ADMISSION_MAX_ACTIVE', default=20, cast=int)  # concurrent checkouts, 0 = off
+ADMISSION_LEASE_SECONDS = 300  # an admitted shopper's slot lapses after this long idle
+ADMISSION_QUEUE_IDLE_SECONDS = 30  # queued shoppers who stop polling lose their place
+ADMISSION_POLL_SECONDS = 3
+
+# Idempotency keys for checkout, cart and payment POSTs (store.idempotency)
+IDEMPOTENCY_KEY_TTL_SECONDS = 24 * 60 * 60
+IDEMPOTENCY_WAIT_SECONDS = 10  # a duplicate waits this long for the first request to finish
@@ -10,6 +10,9 @@ urlpatterns = [
     # Callback URL that Safaricom will hit after payment
     path('payment/callback/', views.payment_callback, name='payment_callback'),
 
+    # Staff export of payment attempts (CSV/JSONL)
+    path('payment/export/', views.export_payments, name='export_payments'),
+
     # Optional test endpoint for standalone STK push
     path('stk_push/', views.initiate_stk_push, name='stk_push'),
 ]
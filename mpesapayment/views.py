@@ -1,11 +1,14 @@
 from django.shortcuts import get_object_or_404, redirect, render
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 
 from store.models import Order
+from store.exports import is_staff, stream_export
+from store.admission import admission_required, leave
+from store.idempotency import idempotent
 from .models import MpesaPayment
 from .utilis import get_mpesa_token, generate_password, get_timestamp
 import requests
@@ -16,6 +19,8 @@ import json
 # Initiate STK Push Payment
 # ----------------------------
 @login_required
+@idempotent
+@admission_required
 def initiate_payment(request, order_id):
     """
     Initiates an M-Pesa STK Push for a specific order.
@@ -81,6 +86,7 @@ def initiate_payment(request, order_id):
         except Exception as e:
             messages.error(request, f'Error connecting to M-Pesa: {str(e)}')
 
+        leave(request)
         return redirect('store:order_detail', order_id=order.id)
 
     return render(request, 'mpesapayment/mpesa_payment.html', {'order': order})
@@ -186,3 +192,26 @@ def initiate_stk_push(request):
 
     response = requests.post(stk_push_url, json=payload, headers=headers)
     return JsonResponse(response.json())
+
+
+# ----------------------------
+# Staff: Streaming Payment Export
+# ----------------------------
+@login_required
+@user_passes_test(is_staff)
+def export_payments(request):
+    """
+    CSV/JSONL download of payment attempts; the raw Safaricom response is left out.
+    """
+    columns = [
+        ('id', 'id'),
+        ('order_id', 'order_id'),
+        ('amount', 'amount'),
+        ('phone_number', 'phone_number'),
+        ('mpesa_receipt', 'mpesa_receipt'),
+        ('checkout_request_id', 'checkout_request_id'),
+        ('status', 'status'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    ]
+    return stream_export(request, MpesaPayment.objects.order_by('id'), columns, 'mpesa-payments')
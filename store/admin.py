@@ -1,12 +1,16 @@
 from django.contrib import admin
-from .models import Product, Category, ProductImage, Review
+from .models import Product, Category, ProductImage, Review, FeaturedProduct
 
 # ----------------------------
 # Product Admin
 # ----------------------------
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price', 'category', 'is_in_stock', 'views_count', 'created_at')
-    readonly_fields = ('views_count', 'created_at', 'updated_at')
+    list_display = ('name', 'price', 'category', 'is_in_stock', 'views_count', 'rating_avg', 'rating_count', 'created_at')
+    readonly_fields = (
+        'views_count', 'created_at', 'updated_at',
+        'rating_avg', 'rating_count', 'rating_sum',
+        'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+    )
     list_filter = ('category', 'is_in_stock')
     search_fields = ('name', 'description')
     prepopulated_fields = {'slug': ('name',)}
@@ -36,8 +40,18 @@ class ReviewAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at',)
     search_fields = ('product__name', 'customer__username')
 
+# ----------------------------
+# Featured Products Admin
+# ----------------------------
+class FeaturedProductAdmin(admin.ModelAdmin):
+    list_display = ('product', 'position', 'is_active', 'created_at')
+    list_editable = ('position', 'is_active')
+    raw_id_fields = ('product',)
+    search_fields = ('product__name',)
+
 # Register all models
 admin.site.register(Product, ProductAdmin)
 admin.site.register(Category, CategoryAdmin)
 admin.site.register(ProductImage, ProductImageAdmin)
 admin.site.register(Review, ReviewAdmin)
+admin.site.register(FeaturedProduct, FeaturedProductAdmin)
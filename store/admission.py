@@ -0,0 +1,253 @@
+"""
+Admission control ("virtual waiting room") for checkout.
+
+During a flash sale every shopper reaching checkout at once would queue on
+the SQLite writer lock until requests time out. A Gate lets at most
+ADMISSION_MAX_ACTIVE shoppers through at a time; everyone else gets a FIFO
+queue position and a page that polls admission_status until it's their turn.
+
+An admitted shopper holds a lease that every gated request renews. The lease
+ends when they finish (leave()) or after ADMISSION_LEASE_SECONDS without a
+request. Queued shoppers who stop polling for ADMISSION_QUEUE_IDLE_SECONDS
+lose their place.
+
+The gate's state is one cache entry changed under a cache.add() lock, so all
+workers must share a cache (Redis, Memcached, database) for the limit to be
+global; with the default LocMemCache each worker process runs its own gate.
+"""
+import time
+from dataclasses import dataclass
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import render
+from django.urls import reverse
+
+WAIT_SAMPLES = 500  # recent queue waits kept for the metrics
+
+
+@dataclass
+class Admission:
+    admitted: bool
+    position: int = 0  # 1 = next in line; 0 once admitted or if the gate was busy
+    queue_depth: int = 0
+    retry_after: int = 0
+
+
+class Gate:
+    def __init__(self, name, max_active=None, lease_seconds=None, queue_idle_seconds=None):
+        self.key = f'store:admission:{name}'
+        self.lock_key = f'{self.key}:lock'
+        self._max_active = max_active
+        self._lease_seconds = lease_seconds
+        self._queue_idle_seconds = queue_idle_seconds
+
+    # Read on use so override_settings and per-environment config apply
+    @property
+    def max_active(self):
+        return self._max_active if self._max_active is not None else getattr(settings, 'ADMISSION_MAX_ACTIVE', 20)
+
+    @property
+    def lease_seconds(self):
+        return self._lease_seconds or getattr(settings, 'ADMISSION_LEASE_SECONDS', 300)
+
+    @property
+    def queue_idle_seconds(self):
+        return self._queue_idle_seconds or getattr(settings, 'ADMISSION_QUEUE_IDLE_SECONDS', 30)
+
+    @property
+    def enabled(self):
+        return bool(self.max_active)
+
+    # ----------------------------
+    # State
+    # ----------------------------
+    def _load(self):
+        return cache.get(self.key) or {
+            'active': {},  # ticket -> lease expiry
+            'queue': {},  # ticket -> joined, in arrival order
+            'admitted': 0, 'expired': 0, 'abandoned': 0,
+            'waits': [],
+        }
+
+    def _seen_key(self, ticket):
+        return f'{self.key}:seen:{ticket}'
+
+    def _touch(self, ticket, now):
+        # A queue place lapses with this key, so polling needs no lock
+        cache.set(self._seen_key(ticket), now, timeout=self.queue_idle_seconds)
+
+    def _acquire(self, wait=2.0):
+        deadline = time.monotonic() + wait
+        while not cache.add(self.lock_key, 1, timeout=5):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def _tidy(self, state, now):
+        """
+        Drop lapsed leases and abandoned queue places, then admit from the
+        head of the queue while there is room.
+        """
+        for ticket, expires in list(state['active'].items()):
+            if expires <= now:
+                del state['active'][ticket]
+                state['expired'] += 1
+        seen = cache.get_many([self._seen_key(ticket) for ticket in state['queue']])
+        for ticket in list(state['queue']):
+            if self._seen_key(ticket) not in seen:
+                del state['queue'][ticket]
+                state['abandoned'] += 1
+        while state['queue'] and len(state['active']) < self.max_active:
+            ticket = next(iter(state['queue']))
+            joined = state['queue'].pop(ticket)
+            state['active'][ticket] = now + self.lease_seconds
+            state['admitted'] += 1
+            state['waits'] = (state['waits'] + [now - joined])[-WAIT_SAMPLES:]
+
+    def _needs_update(self, state, ticket, now):
+        """
+        Whether entering needs the lock: joining, renewing a half-used lease,
+        or being admitted to a free slot (only the head of the queue asks).
+        """
+        if ticket in state['active']:
+            return state['active'][ticket] - now < self.lease_seconds / 2
+        if ticket not in state['queue']:
+            return True
+        free = self.max_active - sum(1 for expires in state['active'].values() if expires > now)
+        return free > 0 and list(state['queue']).index(ticket) < free
+
+    def _update(self, change):
+        """
+        Run change(state, now) under the lock and save; None if the lock
+        couldn't be taken in time.
+        """
+        if not self._acquire():
+            return None
+        try:
+            state, now = self._load(), time.time()
+            change(state, now)
+            self._tidy(state, now)
+            cache.set(self.key, state, timeout=None)
+            return state
+        finally:
+            cache.delete(self.lock_key)
+
+    # ----------------------------
+    # Shoppers
+    # ----------------------------
+    def enter(self, ticket):
+        """
+        Admit `ticket`, renew its lease, or keep its place in the queue.
+        Waiting shoppers' polls only take the lock when a slot is free.
+        """
+        if not self.enabled:
+            return Admission(admitted=True)
+        state, now = self._load(), time.time()
+        if not self._needs_update(state, ticket, now):
+            if ticket in state['queue']:
+                self._touch(ticket, now)
+            return self._admission(state, ticket)
+
+        def change(state, now):
+            if ticket in state['active']:
+                state['active'][ticket] = now + self.lease_seconds
+            else:
+                state['queue'].setdefault(ticket, now)
+                self._touch(ticket, now)
+
+        updated = self._update(change)
+        if updated is None:
+            # Lock contended: answer from the snapshot and let the shopper retry
+            if ticket in state['queue']:
+                self._touch(ticket, now)
+            return self._admission(state, ticket)
+        return self._admission(updated, ticket)
+
+    def leave(self, ticket):
+        """
+        Give up an admission (or a queue place) so the next shopper can go.
+        """
+        if not self.enabled:
+            return
+
+        def change(state, now):
+            state['active'].pop(ticket, None)
+            state['queue'].pop(ticket, None)
+
+        self._update(change)
+        cache.delete(self._seen_key(ticket))
+
+    def _admission(self, state, ticket):
+        if state['active'].get(ticket, 0) > time.time():
+            return Admission(admitted=True, queue_depth=len(state['queue']))
+        queue = list(state['queue'])
+        position = queue.index(ticket) + 1 if ticket in queue else 0
+        return Admission(admitted=False, position=position, queue_depth=len(queue), retry_after=self.poll_seconds())
+
+    @staticmethod
+    def poll_seconds():
+        return getattr(settings, 'ADMISSION_POLL_SECONDS', 3)
+
+    # ----------------------------
+    # Metrics
+    # ----------------------------
+    def metrics(self):
+        state, now = self._load(), time.time()
+        waits = sorted(state['waits'])
+        oldest = min(state['queue'].values(), default=None)
+        return {
+            'enabled': self.enabled,
+            'max_active': self.max_active,
+            'active': sum(1 for expires in state['active'].values() if expires > now),
+            'queue_depth': len(state['queue']),
+            'oldest_wait_seconds': round(now - oldest, 1) if oldest is not None else 0,
+            'admitted_total': state['admitted'],
+            'expired_total': state['expired'],
+            'abandoned_total': state['abandoned'],
+            'wait_seconds': {
+                'samples': len(waits),
+                'avg': round(sum(waits) / len(waits), 2) if waits else 0,
+                'p50': round(waits[len(waits) // 2], 2) if waits else 0,
+                'p95': round(waits[int(len(waits) * 0.95)], 2) if waits else 0,
+                'max': round(waits[-1], 2) if waits else 0,
+            },
+        }
+
+    def reset(self):
+        cache.delete_many([self.key, self.lock_key])
+
+
+checkout_gate = Gate('checkout')
+
+
+def ticket_for(request):
+    # Gated views are login_required, so the user id identifies the shopper
+    return f'user:{request.user.pk}'
+
+
+def admission_required(view):
+    """
+    Serve the waiting room instead of `view` until the shopper is admitted.
+    Put it under @login_required.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        admission = checkout_gate.enter(ticket_for(request))
+        if admission.admitted:
+            return view(request, *args, **kwargs)
+        response = render(request, 'store/waiting_room.html', {
+            'admission': admission,
+            'status_url': reverse('store:admission_status'),
+            'next_url': request.get_full_path() if request.method == 'GET' else reverse('store:cart'),
+        }, status=503)
+        response['Retry-After'] = str(admission.retry_after)
+        response['Cache-Control'] = 'no-store'
+        return response
+    return wrapper
+
+
+def leave(request):
+    checkout_gate.leave(ticket_for(request))
@@ -0,0 +1,170 @@
+"""
+Read-only JSON catalog API.
+
+List endpoints read plain dicts with .values() and never build model
+instances. Clients choose columns with ?fields=id,name,price (only the
+columns asked for are selected), page with the same opaque cursors as the
+HTML listing (?cursor=, ?limit=) and filter/sort with the listing parameters (see store.listing).
+Responses are public, cacheable for API_CACHE_SECONDS and carry an ETag
+tied to the catalog version, so unchanged data revalidates as 304.
+"""
+from django.conf import settings
+from django.db.models import Count, Q
+from django.db.models.functions import Substr
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
+
+from .conditional import public_catalog_etag
+from .images import public_variants
+from .models import Category, Product, ProductImage
+from .pagination import paginate
+from .listing import filter_products
+
+# Public field name -> ORM lookup (or expression) for .values()
+PRODUCT_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'slug': 'slug',
+    'price': 'price',
+    'quantity': 'quantity',
+    'in_stock': 'is_in_stock',
+    'category': 'category__name',
+    'category_id': 'category_id',
+    'category_slug': 'category__slug',
+    'summary': Substr('description', 1, 160),
+    'description': 'description',
+    'thumbnail': 'main_image_variants__thumb',
+    'image_variants': 'main_image_variants',
+    'rating_avg': 'rating_avg',
+    'rating_count': 'rating_count',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+PRODUCT_LIST_DEFAULT = ['id', 'name', 'slug', 'price', 'in_stock', 'category', 'thumbnail', 'rating_avg', 'rating_count']
+PRODUCT_DETAIL_DEFAULT = PRODUCT_LIST_DEFAULT + ['description', 'quantity', 'image_variants', 'images', 'url', 'created_at']
+# Detail-only extras that are not product columns
+PRODUCT_DETAIL_EXTRAS = {'images', 'url'}
+
+CATEGORY_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'slug': 'slug',
+    'description': 'description',
+    'product_count': Count('products', filter=Q(products__quantity__gt=0)),
+}
+CATEGORY_DEFAULT = ['id', 'name', 'slug', 'product_count']
+
+
+class FieldError(ValueError):
+    pass
+
+
+def _cacheable(view):
+    max_age = getattr(settings, 'API_CACHE_SECONDS', 60)
+    return require_GET(cache_control(public=True, max_age=max_age)(condition(etag_func=public_catalog_etag)(view)))
+
+
+def _requested_fields(request, available, default):
+    raw = request.GET.get('fields', '').strip()
+    if not raw:
+        return list(default)
+    fields = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise FieldError(
+            f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(sorted(available))}."
+        )
+    return fields
+
+
+def _select(queryset, fields, lookups, extra=()):
+    """
+    .values() for the requested public fields plus `extra` internal columns
+    (e.g. the pagination keys). Expressions are annotated under a private
+    alias so they can't clash with model field names.
+    """
+    names, expressions = list(extra), {}
+    for field in fields:
+        lookup = lookups[field]
+        if isinstance(lookup, str):
+            names.append(lookup)
+        else:
+            expressions[f'_{field}'] = lookup
+    return queryset.values(*dict.fromkeys(names), **expressions)
+
+
+def _public(row, fields, lookups):
+    data = {
+        field: row[lookups[field] if isinstance(lookups[field], str) else f'_{field}']
+        for field in fields
+    }
+    if 'image_variants' in data:
+        data['image_variants'] = public_variants(data['image_variants'])
+    return data
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+# ----------------------------
+# Products
+# ----------------------------
+@_cacheable
+def product_list(request):
+    try:
+        fields = _requested_fields(request, PRODUCT_FIELDS, PRODUCT_LIST_DEFAULT)
+    except FieldError as exc:
+        return _error(str(exc))
+    try:
+        limit = min(int(request.GET.get('limit', settings.PRODUCTS_PER_PAGE)), getattr(settings, 'API_MAX_PAGE_SIZE', 100))
+    except ValueError:
+        return _error("limit must be an integer.")
+    if limit < 1:
+        return _error("limit must be at least 1.")
+
+    products, ordering, _ = filter_products(Product.objects.all(), request.GET)
+    keys = [name.lstrip('-') for name in ordering]
+    rows = _select(products, fields, PRODUCT_FIELDS, extra=keys)
+    page = paginate(request, rows, limit, ordering)
+    return JsonResponse({
+        'results': [_public(row, fields, PRODUCT_FIELDS) for row in page],
+        'next': request.path + page.next_query if page.has_next else None,
+        'previous': request.path + page.previous_query if page.has_previous else None,
+    })
+
+
+@_cacheable
+def product_detail(request, product_id):
+    available = {**PRODUCT_FIELDS, **dict.fromkeys(PRODUCT_DETAIL_EXTRAS)}
+    try:
+        fields = _requested_fields(request, available, PRODUCT_DETAIL_DEFAULT)
+    except FieldError as exc:
+        return _error(str(exc))
+    columns = [field for field in fields if field not in PRODUCT_DETAIL_EXTRAS]
+
+    row = _select(Product.objects.filter(id=product_id), columns, PRODUCT_FIELDS).first()
+    if row is None:
+        return _error("Product not found.", status=404)
+    data = _public(row, columns, PRODUCT_FIELDS)
+    if 'images' in fields:
+        images = ProductImage.objects.filter(product_id=product_id).order_by('uploaded_at', 'id')
+        data['images'] = [public_variants(variants) for variants in images.values_list('variants', flat=True)]
+    if 'url' in fields:
+        data['url'] = reverse('store:product_detail', args=[product_id])
+    return JsonResponse(data)
+
+
+# ----------------------------
+# Categories
+# ----------------------------
+@_cacheable
+def category_list(request):
+    try:
+        fields = _requested_fields(request, CATEGORY_FIELDS, CATEGORY_DEFAULT)
+    except FieldError as exc:
+        return _error(str(exc))
+    rows = _select(Category.objects.order_by('name'), fields, CATEGORY_FIELDS)
+    return JsonResponse({'results': [_public(row, fields, CATEGORY_FIELDS) for row in rows]})
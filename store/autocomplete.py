@@ -0,0 +1,129 @@
+"""
+In-memory prefix index for search-box suggestions.
+
+Every worker keeps a sorted array of (normalized key, kind, id) tuples for
+in-stock product names and category names and answers prefix queries with
+bisect, so suggestions never touch the database. Each name is indexed from
+every word, so "gal" finds "Samsung Galaxy". The index is built on first use,
+kept current by the Product/Category signals in store.signals, and rebuilt
+when another worker changes what it holds (see store.lazyindex).
+"""
+import bisect
+import threading
+import unicodedata
+from urllib.parse import urlencode
+
+from django.urls import reverse
+
+from .lazyindex import LazyIndex, search_index_version
+
+PRODUCT = 'product'
+CATEGORY = 'category'
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(ch for ch in text if not unicodedata.combining(ch)).strip()
+
+
+def _keys(label):
+    words = normalize(label).split()
+    return {' '.join(words[start:]) for start in range(len(words))}
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []      # sorted (key, kind, id)
+        self._entries = {}   # (kind, id) -> {'label', 'url', 'keys'}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, entries):
+        """
+        Replace the contents with (kind, id, label, url) tuples.
+        """
+        keys, table = [], {}
+        for kind, pk, label, url in entries:
+            entry_keys = _keys(label)
+            table[(kind, pk)] = {'label': label, 'url': url, 'keys': entry_keys}
+            keys.extend((key, kind, pk) for key in entry_keys)
+        keys.sort()
+        with self._lock:
+            self._keys, self._entries = keys, table
+
+    def add(self, kind, pk, label, url):
+        with self._lock:
+            self.remove(kind, pk)
+            entry_keys = _keys(label)
+            self._entries[(kind, pk)] = {'label': label, 'url': url, 'keys': entry_keys}
+            for key in entry_keys:
+                bisect.insort(self._keys, (key, kind, pk))
+
+    def remove(self, kind, pk):
+        with self._lock:
+            entry = self._entries.pop((kind, pk), None)
+            if entry is None:
+                return
+            for key in entry['keys']:
+                position = bisect.bisect_left(self._keys, (key, kind, pk))
+                if position < len(self._keys) and self._keys[position] == (key, kind, pk):
+                    del self._keys[position]
+
+    def search(self, prefix, limit=10):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        results, seen = [], set()
+        with self._lock:
+            position = bisect.bisect_left(self._keys, (prefix,))
+            while position < len(self._keys) and len(results) < limit:
+                key, kind, pk = self._keys[position]
+                if not key.startswith(prefix):
+                    break
+                position += 1
+                if (kind, pk) in seen:
+                    continue
+                seen.add((kind, pk))
+                entry = self._entries[(kind, pk)]
+                results.append({'type': kind, 'id': pk, 'label': entry['label'], 'url': entry['url']})
+        return results
+
+
+def product_entry(pk, name):
+    return PRODUCT, pk, name, reverse('store:product_detail', args=[pk])
+
+
+def category_entry(pk, name, slug):
+    return CATEGORY, pk, name, f"{reverse('store:product_list')}?{urlencode({'category': slug})}"
+
+
+def _build_index():
+    from .models import Product, Category
+
+    index = PrefixIndex()
+    index.load(
+        [product_entry(pk, name) for pk, name in Product.objects.filter(quantity__gt=0).values_list('id', 'name')]
+        + [category_entry(*row) for row in Category.objects.values_list('id', 'name', 'slug')]
+    )
+    return index
+
+
+_index = LazyIndex(_build_index, version=search_index_version)
+
+
+def get_index():
+    return _index.get()
+
+
+def loaded_index():
+    return _index.loaded()
+
+
+def reset_index():
+    _index.reset()
+
+
+def suggest(query, limit=10):
+    return get_index().search(query, limit)
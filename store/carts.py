@@ -0,0 +1,203 @@
+"""
+Cookie-backed shopping cart.
+
+Adding to the cart only rewrites a signed cookie holding {product_id:
+quantity}, so browsing costs no database writes and works before login. The
+cookie is merged into the user's pending Order at login or when checkout is
+opened, with one bulk insert for the new lines, and then cleared.
+
+apply_changes() edits the pending Order directly with a batch of add/set/
+remove operations; it backs the cart/batch/ endpoint and "reorder".
+
+The signature stops clients from forging contents; prices are never stored
+in the cookie and are always read from Product when lines are persisted.
+"""
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+
+from .models import Order, OrderItem, Product
+from .totals import refresh_totals
+
+COOKIE_NAME = 'cart'
+COOKIE_SALT = 'store.cart'
+
+
+class Cart:
+    def __init__(self, lines=None):
+        self.lines = dict(lines or {})
+
+    @classmethod
+    def from_request(cls, request):
+        """
+        The cart from the request's cookie; empty if missing or tampered with.
+        """
+        try:
+            data = request.get_signed_cookie(COOKIE_NAME, salt=COOKIE_SALT, max_age=cls.max_age())
+        except (KeyError, signing.BadSignature):
+            return cls()
+        lines = {}
+        for pair in data.split(','):
+            product_id, _, quantity = pair.partition(':')
+            if product_id.isdigit() and quantity.isdigit() and int(quantity) > 0:
+                lines[int(product_id)] = int(quantity)
+        return cls(lines)
+
+    @staticmethod
+    def max_age():
+        return getattr(settings, 'CART_COOKIE_AGE', 60 * 60 * 24 * 30)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def __len__(self):
+        return sum(self.lines.values())
+
+    def add(self, product_id, quantity=1):
+        """
+        Add to a line; returns False if the cart already has too many lines.
+        """
+        if product_id not in self.lines and len(self.lines) >= getattr(settings, 'CART_MAX_LINES', 50):
+            return False
+        self.lines[product_id] = min(self.lines.get(product_id, 0) + quantity, getattr(settings, 'CART_MAX_QUANTITY', 99))
+        return True
+
+    def remove(self, product_id):
+        self.lines.pop(product_id, None)
+
+    def save(self, response):
+        if not self.lines:
+            return self.clear(response)
+        value = ','.join(f'{product_id}:{quantity}' for product_id, quantity in sorted(self.lines.items()))
+        response.set_signed_cookie(
+            COOKIE_NAME, value, salt=COOKIE_SALT, max_age=self.max_age(),
+            httponly=True, samesite='Lax', secure=not settings.DEBUG,
+        )
+
+    def clear(self, response):
+        self.lines = {}
+        response.delete_cookie(COOKIE_NAME, samesite='Lax')
+
+    def products(self):
+        """
+        [(product, quantity)] for lines whose product still exists, in one query.
+        """
+        products = Product.objects.in_bulk(list(self.lines))
+        return [(products[pk], quantity) for pk, quantity in self.lines.items() if pk in products]
+
+
+def persist(cart, user):
+    """
+    Merge the cart into the user's pending order and return the order (None
+    if the cart is empty). New lines go in with one bulk insert; the caller
+    should then clear the cookie.
+    """
+    if not cart:
+        return None
+    with transaction.atomic():
+        order, _ = Order.objects.get_or_create(user=user, status='pending')
+        existing = {item.product_id: item for item in order.items.filter(product_id__in=list(cart.lines))}
+        prices = dict(Product.objects.filter(pk__in=list(cart.lines)).values_list('id', 'price'))
+        new, changed = [], []
+        for product_id, quantity in cart.lines.items():
+            if product_id in existing:
+                item = existing[product_id]
+                item.quantity += quantity
+                changed.append(item)
+            elif product_id in prices:
+                new.append(OrderItem(order=order, product_id=product_id, quantity=quantity, price=prices[product_id]))
+        OrderItem.objects.bulk_create(new)
+        OrderItem.objects.bulk_update(changed, ['quantity'])
+        # bulk operations send no post_save, so refresh the total here
+        refresh_totals([order.pk])
+    order.refresh_from_db(fields=['total_amount'])
+    return order
+
+
+# ----------------------------
+# Batch changes to the pending order
+# ----------------------------
+OPERATIONS = ('add', 'set', 'remove')
+
+
+class CartChangeError(ValueError):
+    pass
+
+
+def parse_changes(data):
+    """
+    Validate a list of {'product_id', 'quantity', 'op'} dicts ('op' defaults
+    to 'add'). Raises CartChangeError.
+    """
+    if not isinstance(data, list) or not data:
+        raise CartChangeError("Expected a non-empty list of changes.")
+    if len(data) > getattr(settings, 'CART_MAX_LINES', 50):
+        raise CartChangeError("Too many changes in one request.")
+    changes = []
+    for change in data:
+        if not isinstance(change, dict):
+            raise CartChangeError("Each change must be an object.")
+        op = change.get('op', 'add')
+        product_id, quantity = change.get('product_id'), change.get('quantity', 1)
+        if op not in OPERATIONS:
+            raise CartChangeError(f"Unknown op {op!r}; use one of {', '.join(OPERATIONS)}.")
+        if type(product_id) is not int or type(quantity) is not int:
+            raise CartChangeError("product_id and quantity must be integers.")
+        if op != 'remove' and quantity < (0 if op == 'set' else 1):
+            raise CartChangeError(f"Invalid quantity for product {product_id}.")
+        changes.append((op, product_id, quantity))
+    return changes
+
+
+def apply_changes(user, changes):
+    """
+    Apply [(op, product_id, quantity)] to the user's pending order in one
+    transaction: products come from one in_bulk() query and lines are written
+    with one bulk_create, one bulk_update and one delete. Products that are
+    missing or out of stock are skipped. Returns (order, skipped_ids).
+    """
+    limit = getattr(settings, 'CART_MAX_QUANTITY', 99)
+    with transaction.atomic():
+        order, _ = Order.objects.get_or_create(user=user, status='pending')
+        ids = {product_id for _, product_id, _ in changes}
+        products = Product.objects.in_bulk(ids)
+        items = {item.product_id: item for item in order.items.select_for_update().filter(product_id__in=ids)}
+        quantities = {product_id: item.quantity for product_id, item in items.items()}
+
+        skipped = set()
+        for op, product_id, quantity in changes:
+            product = products.get(product_id)
+            if op == 'remove':
+                quantities[product_id] = 0
+            elif product is None or not product.is_in_stock:
+                skipped.add(product_id)
+            elif op == 'add':
+                quantities[product_id] = min(quantities.get(product_id, 0) + quantity, limit)
+            else:
+                quantities[product_id] = min(quantity, limit)
+
+        new, changed, removed = [], [], []
+        for product_id, quantity in quantities.items():
+            item = items.get(product_id)
+            if item is None:
+                if quantity:
+                    new.append(OrderItem(order=order, product_id=product_id, quantity=quantity, price=products[product_id].price))
+            elif not quantity:
+                removed.append(item.pk)
+            elif quantity != item.quantity:
+                item.quantity = quantity
+                changed.append(item)
+        OrderItem.objects.bulk_create(new)
+        OrderItem.objects.bulk_update(changed, ['quantity'])
+        if removed:
+            OrderItem.objects.filter(pk__in=removed).delete()
+        refresh_totals([order.pk])
+    order.refresh_from_db(fields=['total_amount'])
+    return order, sorted(skipped)
+
+
+def reorder_changes(order):
+    """
+    'add' changes that put every line of a past order back in the cart.
+    """
+    return [('add', product_id, quantity) for product_id, quantity in order.items.values_list('product_id', 'quantity')]
@@ -0,0 +1,228 @@
+"""
+Transactional checkout.
+
+Starting checkout reserves stock: reserve() holds every line of the pending
+order for RESERVATION_TTL_SECONDS with one conditional statement per line,
+
+    UPDATE store_product SET reserved_quantity = reserved_quantity + n
+    WHERE id = %s AND quantity - reserved_quantity >= n
+
+and records the hold as StockReservation rows. Product.reserved_quantity is
+the sum of the active holds, so available stock (quantity minus reserved) is
+read straight off the row. Stale holds are returned in bulk by the
+expire_reservations command; release() returns an order's holds at once.
+
+complete_order() claims the pending order and takes stock for every line in
+one transaction, consuming the order's own holds:
+
+    UPDATE store_product SET is_in_stock = (quantity > n), quantity = quantity - n,
+        reserved_quantity = reserved_quantity - held
+    WHERE id = %s AND quantity - (reserved_quantity - held) >= n
+
+so concurrent checkouts can't lose updates, oversell, or take units held for
+someone else: whichever one runs out of stock updates no row. If any line
+fails, the transaction (including the order's status change) is rolled back
+and OutOfStock lists the short lines. Lines are processed in product id
+order so that two orders can't lock the same rows in opposite orders.
+
+The writes bypass Product.save(), so once the transaction commits the
+stock_changed signal is sent for store.signals to refresh derived data.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .customers import refresh_summaries
+from .models import Order, OrderItem, Product, StockReservation
+from .signals import stock_changed
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class OrderNotPending(CheckoutError):
+    def __init__(self, order_id):
+        super().__init__(f"Order #{order_id} is no longer pending.")
+
+
+class OutOfStock(CheckoutError):
+    def __init__(self, shortages):
+        # [(product_id, name, requested, available)]
+        self.shortages = shortages
+        names = ', '.join(f"{name} ({available} left)" for _, name, _, available in shortages)
+        super().__init__(f"Not enough stock for: {names}.")
+
+
+def order_lines(order_id):
+    """
+    {product_id: quantity} for an order, with repeated products summed.
+    """
+    return dict(
+        OrderItem.objects.filter(order_id=order_id).values_list('product_id')
+        .annotate(total=Sum('quantity')).order_by()
+    )
+
+
+def _shortages(short, lines, held=None):
+    held = held or {}
+    rows = Product.objects.filter(pk__in=short).values_list('id', 'name', 'quantity', 'reserved_quantity')
+    return [
+        (pk, name, lines[pk], max(quantity - reserved + held.get(pk, 0), 0))
+        for pk, name, quantity, reserved in rows
+    ]
+
+
+# ----------------------------
+# Reservations
+# ----------------------------
+def reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'RESERVATION_TTL_SECONDS', 15 * 60))
+
+
+def _take_holds(reservations):
+    """
+    Delete the given (already locked) reservations; returns {product_id: quantity}.
+    """
+    rows = list(reservations.values_list('id', 'product_id', 'quantity'))
+    if not rows:
+        return Counter()
+    StockReservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+    held = Counter()
+    for _, product_id, quantity in rows:
+        held[product_id] += quantity
+    return held
+
+
+def _unreserve(held):
+    """
+    Give {product_id: quantity} back to available stock in one UPDATE.
+    """
+    if not held:
+        return
+    Product.objects.filter(pk__in=held).update(
+        reserved_quantity=F('reserved_quantity') - Case(
+            *[When(pk=pk, then=Value(quantity)) for pk, quantity in held.items()],
+            default=Value(0), output_field=IntegerField(),
+        )
+    )
+
+
+def reserve(order):
+    """
+    Hold stock for every line of a pending order, all or nothing, replacing
+    any earlier hold for the order. Returns the expiry time; raises OutOfStock.
+    """
+    expires_at = timezone.now() + reservation_ttl()
+    with transaction.atomic():
+        _unreserve(_take_holds(StockReservation.objects.select_for_update().filter(order_id=order.pk)))
+        lines = order_lines(order.pk)
+        short = []
+        for product_id, quantity in sorted(lines.items()):
+            updated = Product.objects.filter(
+                pk=product_id, quantity__gte=F('reserved_quantity') + quantity,
+            ).update(reserved_quantity=F('reserved_quantity') + quantity)
+            if not updated:
+                short.append(product_id)
+        if short:
+            raise OutOfStock(_shortages(short, lines))
+        StockReservation.objects.bulk_create([
+            StockReservation(order_id=order.pk, product_id=product_id, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in lines.items()
+        ])
+    return expires_at
+
+
+def release(order):
+    """
+    Return everything held for an order (e.g. when it is cancelled).
+    """
+    with transaction.atomic():
+        held = _take_holds(StockReservation.objects.select_for_update().filter(order_id=order.pk))
+        _unreserve(held)
+    return sum(held.values())
+
+
+def expire_reservations(batch_size=1000, now=None):
+    """
+    Return stale holds to stock in batches; returns the number of
+    reservations expired.
+    """
+    now = now or timezone.now()
+    expired = 0
+    while True:
+        with transaction.atomic():
+            batch = (
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=now).order_by('id')[:batch_size]
+            )
+            ids = list(batch.values_list('id', flat=True))
+            _unreserve(_take_holds(StockReservation.objects.filter(pk__in=ids)))
+        expired += len(ids)
+        if len(ids) < batch_size:
+            return expired
+
+
+# ----------------------------
+# Completing an order
+# ----------------------------
+def take_stock(lines, held=None):
+    """
+    Decrement stock for {product_id: quantity}, consuming the order's own
+    holds {product_id: quantity}; must run inside a transaction. Returns the
+    ids that could not be fulfilled.
+    """
+    held = held or {}
+    short = []
+    for product_id in sorted(set(lines) | set(held)):
+        quantity, own = lines.get(product_id, 0), held.get(product_id, 0)
+        updated = Product.objects.filter(
+            pk=product_id, quantity__gte=F('reserved_quantity') - own + quantity,
+        ).update(
+            # Listed first: MySQL evaluates SET clauses left to right with the
+            # new values; SQLite and PostgreSQL always see the old row
+            is_in_stock=Case(When(quantity__gt=quantity, then=Value(True)), default=Value(False)),
+            quantity=F('quantity') - quantity,
+            reserved_quantity=F('reserved_quantity') - own,
+            updated_at=timezone.now(),
+        )
+        if not updated and quantity:
+            short.append(product_id)
+    return short
+
+
+def complete_order(order):
+    """
+    Take stock for every line of a pending order and mark it completed,
+    all or nothing. Raises OrderNotPending or OutOfStock.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Claiming the order first makes a double-submitted checkout a no-op
+        claimed = Order.objects.filter(pk=order.pk, status='pending').update(
+            status='completed', completed_at=now, placed_at=now,
+        )
+        if not claimed:
+            raise OrderNotPending(order.pk)
+
+        lines = order_lines(order.pk)
+        # Holds count as the order's own stock even if they expired but haven't been swept
+        held = _take_holds(StockReservation.objects.select_for_update().filter(order_id=order.pk))
+        short = take_stock(lines, held)
+        if short:
+            raise OutOfStock(_shortages(short, lines, held))
+
+        # The status change bypassed Order.save(), so update the customer's summary here
+        refresh_summaries([order.user_id])
+
+        sold_out = list(Product.objects.filter(pk__in=lines, quantity=0).values_list('id', 'category_id', 'price'))
+        transaction.on_commit(
+            lambda: stock_changed.send(sender=Product, product_ids=list(lines), sold_out=sold_out)
+        )
+
+    order.status, order.completed_at, order.placed_at = 'completed', now, now
+    return order
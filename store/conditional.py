@@ -0,0 +1,105 @@
+"""
+Conditional GET (ETag / Last-Modified) for catalog pages.
+
+A page's validator combines:
+- the catalog version, a counter in a single CatalogVersion row that
+  store.signals bumps whenever anything shown on catalog pages changes;
+- the product's updated_at (detail page only);
+- the viewer's auth state: user id, staff flags and the bits of the layout
+  that depend on the user.
+
+views_count is written with queryset.update() by store.counters, so it fires
+no signal and never touches updated_at; a page view does not invalidate
+the ETag.
+
+Responses carrying flash messages are never made conditional, so a 304 can't
+swallow a message.
+"""
+import hashlib
+
+from django.contrib import messages
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CatalogVersion, Product
+
+_STAMP_ATTR = '_catalog_stamp'
+
+
+def catalog_version():
+    """
+    (version, updated_at) of the catalog as a whole.
+    """
+    row = CatalogVersion.objects.filter(pk=1).values_list('version', 'updated_at').first()
+    if row is None:
+        CatalogVersion.objects.get_or_create(pk=1)
+        return catalog_version()
+    return row
+
+
+def bump_catalog_version():
+    updated = CatalogVersion.objects.filter(pk=1).update(version=F('version') + 1, updated_at=timezone.now())
+    if not updated:
+        CatalogVersion.objects.get_or_create(pk=1)
+
+
+def _viewer_key(request):
+    user = request.user
+    if not user.is_authenticated:
+        return 'anon'
+    # base.html shows the avatar and links the latest order in the footer
+    latest_order = user.store_orders.order_by('-id').values_list('id', flat=True).first()
+    return f'{user.pk}:{int(user.is_staff)}{int(user.is_superuser)}:{user.profile_image or ""}:{latest_order}'
+
+
+def _stamp(request, product_id=None):
+    """
+    (etag, last_modified) for this request, computed once and shared by the
+    ETag and Last-Modified callbacks. (None, None) disables conditional
+    handling.
+    """
+    cached = getattr(request, _STAMP_ATTR, None)
+    if cached is not None:
+        return cached
+
+    stamp = (None, None)
+    if not len(messages.get_messages(request)):
+        version, last_modified = catalog_version()
+        parts = [request.get_full_path(), str(version), _viewer_key(request)]
+        if product_id is None:
+            stamp = (parts, last_modified)
+        else:
+            updated_at = Product.objects.filter(pk=product_id).values_list('updated_at', flat=True).first()
+            if updated_at is not None:
+                parts.append(updated_at.isoformat())
+                stamp = (parts, max(last_modified, updated_at))
+        if stamp[0] is not None:
+            stamp = (hashlib.md5('|'.join(stamp[0]).encode()).hexdigest(), stamp[1])
+
+    setattr(request, _STAMP_ATTR, stamp)
+    return stamp
+
+
+def catalog_etag(request, *args, **kwargs):
+    return _stamp(request)[0]
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    return _stamp(request)[1]
+
+
+def product_etag(request, product_id, *args, **kwargs):
+    return _stamp(request, product_id)[0]
+
+
+def product_last_modified(request, product_id, *args, **kwargs):
+    return _stamp(request, product_id)[1]
+
+
+def public_catalog_etag(request, *args, **kwargs):
+    """
+    ETag for publicly cacheable responses that don't depend on the viewer
+    (the JSON API): just the URL and the catalog version.
+    """
+    version, _ = catalog_version()
+    return hashlib.md5(f'{request.get_full_path()}|{version}'.encode()).hexdigest()
@@ -0,0 +1,207 @@
+"""
+Write-behind buffering for Product.views_count.
+
+product_detail records a hit here instead of issuing its own UPDATE. Hits are
+summed per product and written back in a single batched UPDATE once
+VIEW_COUNT_FLUSH_THRESHOLD hits are pending or VIEW_COUNT_FLUSH_INTERVAL
+seconds have passed since the last flush.
+
+VIEW_COUNT_BUFFER picks where pending hits live:
+  'memory' - per worker process, for development (runserver, tests). Each
+             worker only flushes its own hits, a crashed worker loses them,
+             and `manage.py flush_view_counts` runs in a process of its own
+             so it has nothing to flush. Use 'cache' with several workers.
+  'cache'  - the default. In the Django cache, shared by every worker that
+             shares the cache (so not LocMem once there are several
+             workers), and flushable with `manage.py flush_view_counts`.
+  'off'    - no buffering, one UPDATE per hit.
+"""
+import atexit
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Case, When, Value, PositiveIntegerField
+
+UPDATE_BATCH_SIZE = 500
+
+
+def write_view_counts(counts):
+    """
+    Add {product_id: hits} to views_count, one UPDATE per batch of products.
+    """
+    from .models import Product
+
+    items = [(pk, hits) for pk, hits in counts.items() if hits > 0]
+    for start in range(0, len(items), UPDATE_BATCH_SIZE):
+        batch = items[start:start + UPDATE_BATCH_SIZE]
+        increment = Case(
+            *[When(id=pk, then=Value(hits)) for pk, hits in batch],
+            output_field=PositiveIntegerField(),
+        )
+        Product.objects.filter(id__in=[pk for pk, _ in batch]).update(views_count=F('views_count') + increment)
+
+
+class ViewCountBuffer:
+    """
+    In-process buffer; each worker keeps and flushes its own hits.
+    """
+
+    def __init__(self, flush_interval, flush_threshold):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._total = 0
+        self._last_flush = time.monotonic()
+
+    def add(self, product_id, hits=1):
+        with self._lock:
+            self._pending[product_id] += hits
+            self._total += hits
+            due = self._total >= self.flush_threshold or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def take(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._total = 0
+            self._last_flush = time.monotonic()
+        return pending
+
+    def flush(self):
+        """
+        Write out everything pending and return the number of hits written.
+        """
+        pending = self.take()
+        write_view_counts(pending)
+        return sum(pending.values())
+
+
+class CacheViewCountBuffer(ViewCountBuffer):
+    """
+    Buffer kept in the Django cache so every worker (and manage.py) sees the
+    same pending hits. Counters are decremented by what was written rather
+    than deleted, so hits recorded during a flush are never lost.
+
+    Products with pending hits are listed in a dirty set. A per-product
+    marker key, taken with cache.add(), makes only the first hit since the
+    last flush register the id, and the set itself is only changed under
+    DIRTY_LOCK_KEY. A flush drops the markers before reading the counters, so
+    a hit that lands after the read registers its product again, and prunes
+    the drained ids from the set.
+    """
+    KEY_PREFIX = 'store:views:'
+    MARKER_PREFIX = 'store:views:marked:'
+    DIRTY_KEY = 'store:views:dirty'
+    DIRTY_LOCK_KEY = 'store:views:dirty_lock'
+    TOTAL_KEY = 'store:views:total'
+    FLUSHED_AT_KEY = 'store:views:flushed_at'
+    LOCK_KEY = 'store:views:flush_lock'
+
+    def _key(self, product_id):
+        return f'{self.KEY_PREFIX}{product_id}'
+
+    def _marker(self, product_id):
+        return f'{self.MARKER_PREFIX}{product_id}'
+
+    def _incr(self, key, delta):
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+    def _change_dirty(self, change, wait=2.0):
+        """
+        Run change(dirty) under the dirty-set lock and save the set; False
+        if the lock couldn't be taken in time.
+        """
+        deadline = time.monotonic() + wait
+        while not cache.add(self.DIRTY_LOCK_KEY, 1, timeout=5):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        try:
+            dirty = cache.get(self.DIRTY_KEY) or set()
+            change(dirty)
+            cache.set(self.DIRTY_KEY, dirty, timeout=None)
+            return True
+        finally:
+            cache.delete(self.DIRTY_LOCK_KEY)
+
+    def add(self, product_id, hits=1):
+        self._incr(self._key(product_id), hits)
+        if cache.add(self._marker(product_id), 1, timeout=None):
+            if not self._change_dirty(lambda dirty: dirty.add(product_id)):
+                # Let the product's next hit try to register it again
+                cache.delete(self._marker(product_id))
+        self._incr(self.TOTAL_KEY, hits)
+
+        flushed_at = cache.get_or_set(self.FLUSHED_AT_KEY, time.time, timeout=None)
+        total = cache.get(self.TOTAL_KEY, 0)
+        if total >= self.flush_threshold or time.time() - flushed_at >= self.flush_interval:
+            self.flush()
+
+    def take(self):
+        dirty = cache.get(self.DIRTY_KEY) or set()
+        # Hits from here on register their product again
+        cache.delete_many([self._marker(pk) for pk in dirty])
+        counts = cache.get_many([self._key(pk) for pk in dirty])
+        pending = Counter()
+        for pk in dirty:
+            hits = counts.get(self._key(pk), 0)
+            if hits > 0:
+                cache.decr(self._key(pk), hits)
+                pending[pk] = hits
+        if pending:
+            self._incr(self.TOTAL_KEY, -sum(pending.values()))
+
+        def prune(current):
+            registered = cache.get_many([self._marker(pk) for pk in dirty])
+            current.difference_update(pk for pk in dirty if self._marker(pk) not in registered)
+
+        self._change_dirty(prune)
+        cache.set(self.FLUSHED_AT_KEY, time.time(), timeout=None)
+        return pending
+
+    def flush(self):
+        # Only one worker flushes at a time, otherwise hits could be written twice
+        if not cache.add(self.LOCK_KEY, 1, timeout=60):
+            return 0
+        try:
+            return super().flush()
+        finally:
+            cache.delete(self.LOCK_KEY)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """
+    Return the configured buffer, or None when buffering is off.
+    """
+    global _buffer
+    mode = getattr(settings, 'VIEW_COUNT_BUFFER', 'cache')
+    if mode == 'off':
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            interval = getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 30)
+            threshold = getattr(settings, 'VIEW_COUNT_FLUSH_THRESHOLD', 100)
+            if mode == 'cache':
+                _buffer = CacheViewCountBuffer(interval, threshold)
+            else:
+                _buffer = ViewCountBuffer(interval, threshold)
+                atexit.register(_buffer.flush)
+        return _buffer
+
+
+def record_product_view(product_id):
+    buffer = get_buffer()
+    if buffer is None:
+        write_view_counts({product_id: 1})
+    else:
+        buffer.add(product_id)
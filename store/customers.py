@@ -0,0 +1,45 @@
+"""
+Per-customer order summary on accounts.CustomerProfile.
+
+order_count, lifetime_spend and last_order cover placed orders
+(PLACED_STATUSES: a pending order is still a cart, and cancelled orders
+don't count). store.signals recomputes a customer's summary, with one
+aggregate query and one UPDATE, whenever one of their orders enters or
+leaves those statuses or a placed order's total changes; complete_order()
+does the same since it writes with queryset.update(). The dashboard header
+therefore reads a single profile row.
+"""
+from django.db.models import Count, Sum
+
+from accounts.models import CustomerProfile
+from .models import Order
+
+PLACED_STATUSES = ('paid', 'processing', 'shipped', 'completed')
+
+
+def is_placed(status):
+    return status in PLACED_STATUSES
+
+
+def refresh_summaries(user_ids):
+    for user_id in set(user_ids):
+        placed = Order.objects.filter(user_id=user_id, status__in=PLACED_STATUSES)
+        stats = placed.aggregate(count=Count('id'), spend=Sum('total_amount'))
+        last_id, last_at = placed.order_by('-created_at', '-id').values_list('id', 'created_at').first() or (None, None)
+        CustomerProfile.objects.filter(user_id=user_id).update(
+            order_count=stats['count'],
+            lifetime_spend=stats['spend'] or 0,
+            last_order_id=last_id,
+            last_order_at=last_at,
+        )
+
+
+def order_changed(user_id, old, new):
+    """
+    Refresh the summary if an order's (status, total) change affects it;
+    `old`/`new` are None on create/delete.
+    """
+    if old == new:
+        return
+    if any(state is not None and is_placed(state[0]) for state in (old, new)):
+        refresh_summaries([user_id])
@@ -0,0 +1,195 @@
+"""
+Faceted navigation for the product listing.
+
+FacetCount holds one counter per (category, price band, in stock) cell, so
+the table stays tiny (categories x bands x 2). Any facet count, including
+counts narrowed by the other active facets, is a sum over those cells. The
+counters are kept current by the Product receivers in store.signals (and
+adjust() for code that writes with queryset.update()); rebuild_facets
+recomputes them from scratch.
+
+The cells and the category list are cached together, so the sidebar and
+category lookups in product_list cost no queries on a cache hit. The cache
+entry is dropped whenever a counter changes.
+"""
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, CharField, Count, F, Value, When
+from django.utils.text import slugify
+
+from .models import Category, FacetCount, Product
+
+CACHE_KEY = 'store:facets'
+
+# (key, label, lower bound inclusive, upper bound exclusive or None)
+PRICE_BANDS = [
+    ('under-1000', 'Under Ksh 1,000', Decimal('0'), Decimal('1000')),
+    ('1000-4999', 'Ksh 1,000 - 4,999', Decimal('1000'), Decimal('5000')),
+    ('5000-19999', 'Ksh 5,000 - 19,999', Decimal('5000'), Decimal('20000')),
+    ('20000-49999', 'Ksh 20,000 - 49,999', Decimal('20000'), Decimal('50000')),
+    ('50000-plus', 'Ksh 50,000 and above', Decimal('50000'), None),
+]
+BANDS = {key: (low, high) for key, _, low, high in PRICE_BANDS}
+
+STOCK_CHOICES = [('', 'In stock'), ('out', 'Out of stock'), ('all', 'All products')]
+
+
+def price_band(price):
+    for key, _, low, high in PRICE_BANDS:
+        if price >= low and (high is None or price < high):
+            return key
+    return PRICE_BANDS[0][0]
+
+
+def cell(category_id, price, in_stock):
+    return (category_id, price_band(price), bool(in_stock))
+
+
+# ----------------------------
+# Counter maintenance
+# ----------------------------
+def adjust(deltas):
+    """
+    Apply {(category_id, band, in_stock): delta} to the counters.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        for (category_id, band, in_stock), delta in deltas.items():
+            updated = FacetCount.objects.filter(
+                category_id=category_id, price_band=band, in_stock=in_stock,
+            ).update(count=F('count') + delta)
+            if not updated:
+                FacetCount.objects.get_or_create(
+                    category_id=category_id, price_band=band, in_stock=in_stock,
+                    defaults={'count': max(delta, 0)},
+                )
+    invalidate()
+
+
+def product_moved(old, new):
+    """
+    Move one product between cells; either side may be None (create/delete).
+    """
+    if old == new:
+        return
+    deltas = Counter()
+    if old is not None:
+        deltas[old] -= 1
+    if new is not None:
+        deltas[new] += 1
+    adjust(deltas)
+
+
+def products_added(products):
+    adjust(Counter(cell(p.category_id, p.price, p.is_in_stock) for p in products))
+
+
+def rebuild():
+    """
+    Recompute every counter with one grouped query.
+    """
+    band = Case(
+        *[When(price__gte=low, price__lt=high, then=Value(key)) for key, _, low, high in PRICE_BANDS if high],
+        default=Value(PRICE_BANDS[-1][0]),
+        output_field=CharField(),
+    )
+    rows = (
+        Product.objects.annotate(band=band)
+        .values('category_id', 'band', 'is_in_stock')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        FacetCount.objects.bulk_create([
+            FacetCount(category_id=row['category_id'], price_band=row['band'], in_stock=row['is_in_stock'], count=row['total'])
+            for row in rows
+        ])
+    invalidate()
+
+
+# ----------------------------
+# Reading
+# ----------------------------
+def invalidate():
+    cache.delete(CACHE_KEY)
+
+
+def get_facets():
+    """
+    {'categories': [{'id', 'name', 'slug'}], 'cells': {(category_id, band, in_stock): count}}
+    """
+    data = cache.get(CACHE_KEY)
+    if data is None:
+        data = {
+            'categories': list(Category.objects.order_by('name').values('id', 'name', 'slug')),
+            'cells': {
+                (category_id, band, in_stock): count
+                for category_id, band, in_stock, count in
+                FacetCount.objects.filter(count__gt=0).values_list('category_id', 'price_band', 'in_stock', 'count')
+            },
+        }
+        cache.set(CACHE_KEY, data, getattr(settings, 'FACETS_CACHE_SECONDS', 600))
+    return data
+
+
+def resolve_category(value, facets=None):
+    """
+    The category dict for an id, slug or (case-insensitive) name, or None.
+    Names are still accepted so older links such as ?category=Phones work.
+    """
+    value = (value or '').strip()
+    if not value:
+        return None
+    categories = (facets or get_facets())['categories']
+    for matches in (
+        lambda c: value.isdigit() and c['id'] == int(value),
+        lambda c: c['slug'] == value,
+        lambda c: c['name'].casefold() == value.casefold(),
+        lambda c: c['slug'] == slugify(value),
+    ):
+        for category in categories:
+            if matches(category):
+                return category
+    return None
+
+
+def _stock_matches(in_stock, stock):
+    return stock == 'all' or in_stock == (stock != 'out')
+
+
+def sidebar(facets, category_id=None, band=None, stock=''):
+    """
+    Counts for each facet value, each narrowed by the other active facets.
+    """
+    cells = facets['cells']
+    band = band or None  # filter_products passes '' for "any price"
+
+    def total(want_category=None, want_band=None, want_stock=stock):
+        return sum(
+            count for (c, b, s), count in cells.items()
+            if (want_category is None or c == want_category)
+            and (want_band is None or b == want_band)
+            and _stock_matches(s, want_stock)
+        )
+
+    return {
+        'categories': [
+            {**category, 'count': total(want_category=category['id'], want_band=band)}
+            for category in facets['categories']
+        ],
+        'price_bands': [
+            {'key': key, 'label': label, 'count': total(want_category=category_id, want_band=key)}
+            for key, label, _, _ in PRICE_BANDS
+        ],
+        'stock': [
+            {'key': key, 'label': label, 'count': total(want_category=category_id, want_band=band, want_stock=key)}
+            for key, label in STOCK_CHOICES
+        ],
+    }
@@ -0,0 +1,93 @@
+"""
+Home page featured feed.
+
+The feed is the admin-curated FeaturedProduct slots (in position order)
+topped up with the best in-stock products by popularity: views_count plus
+FEATURED_SALES_WEIGHT per unit sold in placed orders over the last
+FEATURED_SALES_DAYS. It is materialized as a short list of plain dicts and
+kept in the cache, so rendering the home page runs no catalog queries.
+
+store.signals drops the cached feed when products or featured slots change
+and the next request rebuilds it. Entries also expire after
+FEATURED_CACHE_SECONDS, so the popularity ranking refreshes on its own; the
+build_featured command rebuilds it ahead of time (e.g. from cron).
+"""
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Substr
+from django.utils import timezone
+
+from .customers import PLACED_STATUSES
+from .models import FeaturedProduct, Product
+
+CACHE_KEY = 'store:featured-feed'
+
+
+def _size():
+    return getattr(settings, 'FEATURED_PRODUCTS_COUNT', 10)
+
+
+def _entry(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': product.price,
+        'summary': product.summary,
+        'main_image_thumb': product.main_image_thumb,
+        'main_image_srcset': product.main_image_srcset,
+    }
+
+
+def _card_fields(queryset):
+    return (
+        queryset.only('id', 'name', 'price', 'main_image', 'main_image_variants')
+        .annotate(summary=Substr('description', 1, 160))
+    )
+
+
+def build_feed():
+    """
+    Compute the feed from the database and store it in the cache.
+    """
+    size = _size()
+    curated_ids = list(
+        FeaturedProduct.objects.filter(is_active=True, product__quantity__gt=0)
+        .order_by('position', 'id').values_list('product_id', flat=True)[:size]
+    )
+    by_id = _card_fields(Product.objects.all()).in_bulk(curated_ids)
+    products = [by_id[pk] for pk in curated_ids if pk in by_id]
+
+    if len(products) < size:
+        since = timezone.now() - datetime.timedelta(days=getattr(settings, 'FEATURED_SALES_DAYS', 30))
+        recent_sales = Coalesce(
+            Sum('store_order_items__quantity', filter=Q(
+                store_order_items__order__status__in=PLACED_STATUSES,
+                store_order_items__order__placed_at__gte=since,
+            )),
+            Value(0),
+        )
+        popular = (
+            _card_fields(Product.objects.filter(quantity__gt=0).exclude(id__in=curated_ids))
+            .annotate(recent_sales=recent_sales)
+            .annotate(score=F('views_count') + F('recent_sales') * getattr(settings, 'FEATURED_SALES_WEIGHT', 20))
+            .order_by('-score', '-id')[:size - len(products)]
+        )
+        products.extend(popular)
+
+    feed = [_entry(product) for product in products]
+    cache.set(CACHE_KEY, feed, getattr(settings, 'FEATURED_CACHE_SECONDS', 300))
+    return feed
+
+
+def get_feed():
+    feed = cache.get(CACHE_KEY)
+    if feed is None:
+        feed = build_feed()
+    return feed
+
+
+def invalidate_feed():
+    cache.delete(CACHE_KEY)
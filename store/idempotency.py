@@ -0,0 +1,148 @@
+"""
+Idempotency keys for state-changing requests.
+
+Forms that must not run twice carry a hidden idempotency_key field
+({% idempotency_field %}, refreshed per page view by base.html); API clients
+send an Idempotency-Key header. The first request with a key inserts an
+IdempotencyKey row before the view runs and stores the response once it
+finishes. A retry with the same key gets that response replayed (status,
+Location/Content-Type, cookies and body) instead of running the view again,
+so a resubmitted checkout or payment can't take stock or push an STK request
+twice. A duplicate that arrives while the first is still running waits for it,
+up to IDEMPOTENCY_WAIT_SECONDS, then gets 409.
+
+Requests without a key run as before. Keys are scoped to the user, so
+another user sending the same key gets their own result (anonymous requests
+share one namespace). They expire after IDEMPOTENCY_KEY_TTL_SECONDS and are
+deleted in bulk by the purge_idempotency_keys command. Server errors aren't
+stored, so a key whose first attempt failed can be retried.
+"""
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+FIELD = 'idempotency_key'
+REPLAYED_HEADERS = ('Content-Type', 'Location', 'Retry-After', 'Cache-Control')
+
+
+def get_key(request):
+    key = request.META.get(HEADER) or request.POST.get(FIELD, '')
+    key = key.strip()
+    return key if 0 < len(key) <= 64 else None
+
+
+def _owner(request):
+    return request.user.pk if request.user.is_authenticated else None
+
+
+def _claim(request, key):
+    """
+    Insert the key's row; returns (row, created). An expired row is replaced.
+    """
+    now = timezone.now()
+    ttl = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL_SECONDS', 24 * 60 * 60))
+    rows = IdempotencyKey.objects.filter(key=key, user_id=_owner(request))
+    rows.filter(expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            row = IdempotencyKey.objects.create(
+                key=key, user_id=_owner(request), method=request.method, path=request.path, expires_at=now + ttl,
+            )
+        return row, True
+    except IntegrityError:
+        return rows.first(), False
+
+
+def _wait_for(row):
+    """
+    Poll a row claimed by a concurrent request until its response is stored.
+    """
+    deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 10)
+    while row is not None and row.status_code is None and time.monotonic() < deadline:
+        time.sleep(0.1)
+        row = IdempotencyKey.objects.filter(pk=row.pk).first()
+    return row
+
+
+def _store(row, response):
+    if isinstance(response, StreamingHttpResponse) or response.status_code >= 500:
+        row.delete()
+        return
+    try:
+        body = response.content.decode(response.charset or 'utf-8')
+    except UnicodeDecodeError:
+        row.delete()
+        return
+    row.status_code = response.status_code
+    row.response = {
+        'headers': {name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)},
+        'cookies': [morsel.OutputString() for morsel in response.cookies.values()],
+        'body': body,
+    }
+    row.save(update_fields=['status_code', 'response'])
+
+
+def _replay(row):
+    stored = row.response
+    response = HttpResponse(stored.get('body', ''), status=row.status_code)
+    for name, value in stored.get('headers', {}).items():
+        response[name] = value
+    for cookie in stored.get('cookies', []):
+        response.cookies.load(cookie)
+    response['Idempotent-Replay'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """
+    Run `view` at most once per idempotency key; see the module docstring.
+    Only POST requests that carry a key are affected.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = get_key(request) if request.method == 'POST' else None
+        if key is None:
+            return view(request, *args, **kwargs)
+
+        row, created = _claim(request, key)
+        if not created:
+            if row is None:  # the first attempt failed and released the key meanwhile
+                return view(request, *args, **kwargs)
+            if (row.method, row.path) != (request.method, request.path):
+                return JsonResponse({'error': "Idempotency key was already used for a different request."}, status=422)
+            row = _wait_for(row)
+            if row is None:
+                return JsonResponse({'error': "The original request failed; retry with the same key."}, status=409)
+            if row.status_code is None:
+                return JsonResponse({'error': "The original request is still in progress."}, status=409)
+            return _replay(row)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            row.delete()
+            raise
+        _store(row, response)
+        return response
+    return wrapper
+
+
+def purge_expired(batch_size=5000):
+    """
+    Delete expired keys in batches; returns the number deleted.
+    """
+    now = timezone.now()
+    deleted = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
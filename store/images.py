@@ -0,0 +1,273 @@
+"""
+Concurrent product image uploads.
+
+CloudinaryField uploads a file inside Model.save(), one blocking round trip
+per image. Here the main image and every additional image are pushed through
+a shared, bounded thread pool at the same time, and the resulting references
+are stored with a single bulk_create. The backend is pluggable
+(IMAGE_UPLOAD_BACKEND): 'cloudinary' in production, 'local' to write into
+MEDIA_ROOT for development and tests.
+
+Each stored image also gets thumb/medium/large variant URLs (Cloudinary
+transformation URLs, or Pillow-resized copies on the local backend). They are
+recorded in a JSON column next to the image, keyed by the source they were
+built from, so templates emit `srcset` without rebuilding URLs on every render.
+"""
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from cloudinary import CloudinaryResource, uploader
+from cloudinary.models import CloudinaryField
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import UploadedFile
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> maximum width in px; images are never upscaled
+VARIANT_WIDTHS = {'thumb': 200, 'medium': 600, 'large': 1200}
+
+# MEDIA_ROOT folder of LocalBackend uploads; stored names starting with it
+# are local files rather than Cloudinary public ids
+LOCAL_FOLDER = 'local'
+
+
+class ImageUploadError(Exception):
+    pass
+
+
+class CloudinaryBackend:
+    def upload(self, file):
+        if hasattr(file, 'seekable') and file.seekable():
+            file.seek(0)
+        return uploader.upload_resource(file, type='upload', resource_type='image')
+
+    def url(self, stored):
+        return as_resource(stored).url
+
+    def variants(self, stored):
+        """
+        Transformation URLs only; Cloudinary renders each size on first hit.
+        """
+        resource = as_resource(stored)
+        return {
+            name: resource.build_url(width=width, crop='limit', quality='auto', fetch_format='auto', secure=True)
+            for name, width in VARIANT_WIDTHS.items()
+        }
+
+
+class LocalBackend:
+    """
+    Stand-in for Cloudinary that saves into MEDIA_ROOT/local/<location>. The
+    returned name is stored as-is in the CloudinaryField column; the local/
+    folder is what makes image_url() serve it from MEDIA_URL.
+    """
+
+    def __init__(self, location='product_images'):
+        self.location = location
+        self.storage = FileSystemStorage()
+
+    def upload(self, file):
+        _, extension = os.path.splitext(file.name)
+        name = f'{LOCAL_FOLDER}/{self.location}/{uuid.uuid4().hex}{extension.lower()}'
+        return self.storage.save(name, file)
+
+    def url(self, stored):
+        return self.storage.url(local_name(stored))
+
+    def variants(self, stored):
+        from PIL import Image
+
+        name = local_name(stored)
+        stem, extension = os.path.splitext(name)
+        with self.storage.open(name) as source:
+            image = Image.open(source)
+            image.load()
+        image_format = image.format or 'JPEG'
+        urls = {}
+        for variant, width in VARIANT_WIDTHS.items():
+            resized = image.copy()
+            resized.thumbnail((width, width * 10))
+            buffer = BytesIO()
+            resized.save(buffer, format=image_format)
+            variant_name = f'{stem}_{variant}{extension}'
+            self.storage.delete(variant_name)
+            urls[variant] = self.storage.url(self.storage.save(variant_name, ContentFile(buffer.getvalue())))
+        return urls
+
+
+BACKENDS = {
+    'cloudinary': CloudinaryBackend,
+    'local': LocalBackend,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_backend():
+    name = getattr(settings, 'IMAGE_UPLOAD_BACKEND', 'cloudinary')
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ImageUploadError(f"Unknown IMAGE_UPLOAD_BACKEND {name!r}")
+
+
+def get_executor():
+    """
+    One pool per worker process, so concurrent requests share the same
+    IMAGE_UPLOAD_WORKERS threads instead of each starting their own.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_UPLOAD_WORKERS', 4),
+                thread_name_prefix='image-upload',
+            )
+        return _executor
+
+
+# ----------------------------
+# Variants
+# ----------------------------
+def as_resource(stored):
+    """
+    The CloudinaryResource for a stored value, whether fresh from an upload
+    or loaded from the database.
+    """
+    if isinstance(stored, CloudinaryResource):
+        return stored
+    return CloudinaryField().parse_cloudinary_resource(str(stored))
+
+
+def local_name(stored):
+    """
+    The MEDIA_ROOT-relative file name of a LocalBackend upload, else None.
+    """
+    resource = as_resource(stored)
+    if not resource.public_id or not resource.public_id.startswith(f'{LOCAL_FOLDER}/'):
+        return None
+    return resource.public_id + (f'.{resource.format}' if resource.format else '')
+
+
+def backend_for(stored):
+    """
+    The backend that owns a stored image, whichever backend is configured
+    for new uploads now.
+    """
+    return LocalBackend() if local_name(stored) else CloudinaryBackend()
+
+
+def image_url(stored):
+    """
+    The URL to render for a stored image: MEDIA_URL for local uploads,
+    Cloudinary otherwise.
+    """
+    if not stored:
+        return ''
+    return backend_for(stored).url(stored)
+
+
+def source_key(stored):
+    return as_resource(stored).get_prep_value() if stored else ''
+
+
+def build_variants(stored, backend=None):
+    """
+    Return the variant record for a stored image: {'source': ..., 'thumb':
+    url, 'medium': url, 'large': url}, built by the backend that owns the
+    image unless `backend` is given. Empty if the variants can't be built.
+    """
+    if not stored:
+        return {}
+    backend = backend or backend_for(stored)
+    try:
+        urls = backend.variants(stored)
+    except Exception:
+        logger.exception("Could not build image variants for %s", source_key(stored))
+        return {}
+    return {'source': source_key(stored), **urls}
+
+
+def variants_current(variants, stored):
+    return bool(variants) and variants.get('source') == source_key(stored)
+
+
+def public_variants(variants):
+    """
+    The variant URLs alone, without the internal 'source' key.
+    """
+    return {name: url for name, url in (variants or {}).items() if name in VARIANT_WIDTHS}
+
+
+def srcset(variants):
+    return ', '.join(
+        f"{variants[name]} {width}w" for name, width in VARIANT_WIDTHS.items() if variants.get(name)
+    )
+
+
+# ----------------------------
+# Uploads
+# ----------------------------
+def _upload_with_variants(backend, file):
+    stored = backend.upload(file)
+    return stored, build_variants(stored, backend)
+
+
+def upload_images(files, backend=None):
+    """
+    Upload `files` concurrently, building each one's variants in the same
+    worker. Returns a list in the same order holding (stored reference,
+    variants) per file, or None where the upload failed.
+    """
+    if not files:
+        return []
+    backend = backend or get_backend()
+    futures = [get_executor().submit(_upload_with_variants, backend, f) for f in files]
+    results = []
+    for f, future in zip(files, futures):
+        try:
+            results.append(future.result())
+        except Exception:
+            logger.exception("Image upload failed for %s", getattr(f, 'name', f))
+            results.append(None)
+    return results
+
+
+def save_with_images(product, additional_images, backend=None):
+    """
+    Save an unsaved-changes `product` (e.g. from form.save(commit=False))
+    together with its images: a newly chosen main image and all
+    `additional_images` are uploaded in parallel, then the ProductImage rows
+    are inserted in one query. Raises ImageUploadError if the main image
+    fails; returns the number of additional images that failed.
+    """
+    from .conditional import bump_catalog_version
+    from .models import ProductImage
+
+    main_image = product.main_image if isinstance(product.main_image, UploadedFile) else None
+    files = ([main_image] if main_image else []) + list(additional_images)
+    results = upload_images(files, backend)
+
+    if main_image:
+        uploaded = results.pop(0)
+        if uploaded is None:
+            raise ImageUploadError(f"Could not upload the main image {main_image.name}.")
+        product.main_image, product.main_image_variants = uploaded
+    product.save()
+
+    created = ProductImage.objects.bulk_create([
+        ProductImage(product=product, image=stored, variants=variants)
+        for stored, variants in filter(None, results)
+    ])
+    if created:
+        # bulk_create sends no post_save, and the bump from product.save()
+        # came before these rows existed
+        bump_catalog_version()
+    return results.count(None)
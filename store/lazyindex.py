@@ -0,0 +1,73 @@
+"""
+Per-worker in-memory indexes that follow writes made by other workers.
+
+Signal handlers keep an index current only for writes made in their own
+process. LazyIndex builds the index on first use and rebuilds it when
+`version()` has changed, reading the version at most every
+SEARCH_INDEX_CHECK_SECONDS. Other workers' writes therefore show up within
+that time. Without a version the index is simply rebuilt that often.
+
+The product indexes (autocomplete and typo-tolerant search) use
+search_index_version(), which store.signals bumps only when a product's
+name, category or stock visibility changes (or a category changes), not for
+every catalog write: checkouts that leave stock on the shelf, price edits
+and reviews don't cost every worker a rebuild.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F
+
+
+class LazyIndex:
+    def __init__(self, build, version=None):
+        self.build = build
+        self.version = version
+        self._index = None
+        self._built_version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._index is not None and now - self._checked_at < getattr(settings, 'SEARCH_INDEX_CHECK_SECONDS', 10):
+                return self._index
+            # Read before building, so a write that lands during the build
+            # still moves the version past the one recorded here
+            version = self.version() if self.version else None
+            if self._index is None or self.version is None or version != self._built_version:
+                self._index = self.build()
+                self._built_version = version
+            self._checked_at = now
+            return self._index
+
+    def loaded(self):
+        """
+        The index if this worker has built it already, else None; signal
+        handlers use this so that saves never trigger a full build.
+        """
+        return self._index
+
+    def reset(self):
+        with self._lock:
+            self._index = None
+
+
+def search_index_version():
+    from .models import SearchIndexVersion
+
+    version = SearchIndexVersion.objects.filter(pk=1).values_list('version', flat=True).first()
+    if version is None:
+        SearchIndexVersion.objects.get_or_create(pk=1)
+        return search_index_version()
+    return version
+
+
+def bump_search_index_version():
+    from .models import SearchIndexVersion
+
+    updated = SearchIndexVersion.objects.filter(pk=1).update(version=F('version') + 1)
+    if not updated:
+        SearchIndexVersion.objects.get_or_create(pk=1)
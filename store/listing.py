@@ -0,0 +1,95 @@
+"""
+Filtering and sorting shared by the HTML product listing and the JSON API.
+
+Every sort is a keyset ordering ending in id (see store.pagination) and is
+served by one of the partial (<sort column>, id) WHERE is_in_stock indexes on
+Product, or the category-prefixed ones when a single category is selected, so
+no page ever needs a full sort. Listings therefore filter on is_in_stock
+rather than quantity > 0: a range on quantity can't be matched to an index
+that also provides the order.
+"""
+from decimal import Decimal, InvalidOperation
+
+from . import facets
+from .search import search_products
+
+SORTS = {
+    'newest': ('-created_at', '-id'),
+    'price_asc': ('price', 'id'),
+    'price_desc': ('-price', '-id'),
+    'popular': ('-views_count', '-id'),
+    'rating': ('-rating_avg', '-id'),
+}
+SORT_CHOICES = [
+    ('newest', 'Newest'),
+    ('price_asc', 'Price: low to high'),
+    ('price_desc', 'Price: high to low'),
+    ('popular', 'Most popular'),
+    ('rating', 'Top rated'),
+]
+RELEVANCE = ('search_rank', 'id')
+
+
+def parse_price(value):
+    """
+    A non-negative Decimal, or None for blank/invalid input.
+    """
+    try:
+        price = Decimal(str(value).strip())
+    except InvalidOperation:
+        return None
+    return price if price.is_finite() and price >= 0 else None
+
+
+def filter_products(queryset, params, facet_data=None):
+    """
+    Apply the q, category (id, slug or name), price (band key), min_price,
+    max_price, stock ('', 'out' or 'all') and sort parameters to a Product
+    queryset. Returns (queryset, ordering, filters) where `filters` holds
+    the cleaned values for re-rendering the form and sidebar.
+    """
+    facet_data = facet_data or facets.get_facets()
+    query = params.get('q', '').strip()
+    category = facets.resolve_category(params.get('category', ''), facet_data)
+    band = params.get('price', '') if params.get('price', '') in facets.BANDS else ''
+    min_price = parse_price(params.get('min_price', ''))
+    max_price = parse_price(params.get('max_price', ''))
+    stock = params.get('stock', '') if params.get('stock', '') in ('out', 'all') else ''
+    sort = params.get('sort', '')
+    if sort not in SORTS:
+        sort = '' if query else 'newest'
+
+    # The default, in stock only, is what the partial indexes cover
+    if stock == '':
+        queryset = queryset.filter(is_in_stock=True)
+    elif stock == 'out':
+        queryset = queryset.filter(is_in_stock=False)
+    ordering = SORTS.get(sort, RELEVANCE)
+
+    if params.get('category', '').strip():
+        # An unknown category matches nothing rather than being ignored
+        queryset = queryset.filter(category_id=category['id']) if category else queryset.none()
+    if band:
+        low, high = facets.BANDS[band]
+        queryset = queryset.filter(price__gte=low)
+        if high is not None:
+            queryset = queryset.filter(price__lt=high)
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+    if query:
+        # Last, so the search limit and fuzzy fallback count only rows that
+        # pass the other filters; relevance-ranked unless a sort was chosen
+        queryset = search_products(queryset, query)
+
+    filters = {
+        'query': query,
+        'category': category,
+        'price_band': band,
+        'min_price': min_price,
+        'max_price': max_price,
+        'stock': stock,
+        'sort': sort,
+    }
+    return queryset, ordering, filters
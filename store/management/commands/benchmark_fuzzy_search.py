@@ -0,0 +1,64 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.trigrams import TrigramIndex
+
+BRANDS = ['samsung', 'apple', 'tecno', 'infinix', 'oppo', 'xiaomi', 'nokia', 'huawei', 'sony', 'hisense',
+          'lenovo', 'hp', 'dell', 'asus', 'acer', 'lg', 'jbl', 'anker', 'oraimo', 'vitron']
+KINDS = ['phone', 'tablet', 'laptop', 'television', 'speaker', 'earbuds', 'charger', 'smartwatch',
+         'monitor', 'keyboard', 'router', 'soundbar', 'powerbank', 'headphones', 'camera']
+MODIFIERS = ['pro', 'max', 'ultra', 'lite', 'plus', 'mini', 'neo', 'air', 'prime', 'edge']
+
+
+def typo(word):
+    """Drop, swap or double one character."""
+    if len(word) < 4:
+        return word
+    i = random.randrange(1, len(word) - 1)
+    action = random.choice(('drop', 'swap', 'double'))
+    if action == 'drop':
+        return word[:i] + word[i + 1:]
+    if action == 'swap':
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + word[i] + word[i:]
+
+
+class Command(BaseCommand):
+    help = "Time trigram fallback searches over a synthetic in-memory catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=50_000)
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        names = [
+            f"{random.choice(BRANDS)} {random.choice(KINDS)} {random.choice(MODIFIERS)} {random.randint(1, 999)}"
+            for _ in range(options['products'])
+        ]
+
+        index = TrigramIndex()
+        started = time.perf_counter()
+        index.load(enumerate(names))
+        self.stdout.write(f"built index over {len(index)} names in {time.perf_counter() - started:.2f}s")
+
+        timings, hits = [], 0
+        for _ in range(options['queries']):
+            target = random.randrange(len(names))
+            words = names[target].split()[:2]
+            query = ' '.join(typo(word) for word in words)
+            started = time.perf_counter()
+            results = index.search(query)
+            timings.append((time.perf_counter() - started) * 1000)
+            hits += bool(results)
+
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(
+            f"{len(timings)} misspelled queries: median {statistics.median(timings):.2f}ms, "
+            f"p95 {p95:.2f}ms, max {timings[-1]:.2f}ms, {hits} with results"
+        )
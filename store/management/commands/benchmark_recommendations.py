@@ -0,0 +1,84 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from store import recommendations
+from store.models import Category, Product, Order, OrderItem
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the recommendation build on synthetic orders. Everything runs in "
+        "a transaction that is rolled back, so no data is left behind."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=100_000)
+        parser.add_argument('--products', type=int, default=2_000)
+        parser.add_argument('--items-per-order', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        try:
+            with transaction.atomic():
+                self.run(options['orders'], options['products'], options['items_per_order'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def timed(self, label, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        self.stdout.write(f"{label:<32} {time.perf_counter() - started:8.3f}s")
+        return result
+
+    def make_orders(self, user, product_ids, count, items_per_order):
+        now = timezone.now()
+        orders = Order.objects.bulk_create(
+            [Order(user=user, status='completed', completed_at=now, placed_at=now) for _ in range(count)],
+            batch_size=1000,
+        )
+        items = []
+        for order in orders:
+            for product_id in random.sample(product_ids, items_per_order):
+                items.append(OrderItem(order=order, product_id=product_id, quantity=1, price=1))
+            if len(items) >= 5000:
+                OrderItem.objects.bulk_create(items)
+                items = []
+        OrderItem.objects.bulk_create(items)
+
+    def run(self, order_count, product_count, items_per_order):
+        user = get_user_model().objects.create(username='benchmark', email='benchmark@example.com')
+        category = Category.objects.create(name='Benchmark', slug='benchmark')
+        products = Product.objects.bulk_create(
+            [Product(category=category, name=f'Item {i}', slug=f'benchmark-item-{i}', description='',
+                     price=1, quantity=10) for i in range(product_count)],
+            batch_size=1000,
+        )
+        product_ids = [product.id for product in products]
+
+        self.timed(f"generate {order_count} orders", self.make_orders, user, product_ids, order_count, items_per_order)
+        run = self.timed("full build", recommendations.build_full)
+        self.stdout.write(f"  {run.orders_processed} orders, "
+                          f"{recommendations.ProductRecommendation.objects.count()} neighbour rows")
+
+        new_orders = max(order_count // 100, 1)
+        self.make_orders(user, product_ids, new_orders, items_per_order)
+        run = self.timed(f"incremental (+{new_orders} orders)", recommendations.refresh_incremental)
+        self.stdout.write(f"  {run.orders_processed} orders")
+
+        sample = random.sample(products, min(1000, len(products)))
+        started = time.perf_counter()
+        for product in sample:
+            recommendations.recommended_products(product)
+        per_lookup = (time.perf_counter() - started) / len(sample) * 1000
+        self.stdout.write(f"{'product_detail lookup':<32} {per_lookup:8.3f}ms")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.featured import build_feed
+
+
+class Command(BaseCommand):
+    help = "Rebuild the cached home page featured feed (curated slots plus most popular products)."
+
+    def handle(self, *args, **options):
+        feed = build_feed()
+        self.stdout.write(self.style.SUCCESS(f"Featured feed rebuilt with {len(feed)} products."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from store import recommendations
+from store.conditional import bump_catalog_version
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the 'customers also bought' table from placed orders (paid, "
+        "processing, shipped or completed). Incremental by default; --full "
+        "recounts every placed order."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Rebuild from all placed orders.")
+
+    def handle(self, *args, **options):
+        if options['full']:
+            run = recommendations.build_full()
+        else:
+            run = recommendations.refresh_incremental()
+        bump_catalog_version()  # product pages list the recommendations
+        kind = "Full rebuild" if run.full_rebuild else "Incremental refresh"
+        self.stdout.write(self.style.SUCCESS(
+            f"{kind} done: {run.orders_processed} orders processed through {run.processed_through:%Y-%m-%d %H:%M:%S}."
+        ))
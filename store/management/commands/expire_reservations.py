@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from store.checkout import expire_reservations
+
+
+class Command(BaseCommand):
+    help = (
+        "Return stock held by expired checkout reservations. Run it periodically "
+        "(e.g. every minute from cron); holds outlive RESERVATION_TTL_SECONDS by "
+        "at most the interval between runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        expired = expire_reservations(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired} stock reservations."))
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.counters import get_buffer
+
+
+class Command(BaseCommand):
+    help = (
+        "Write buffered product view counts to the database now. With "
+        "VIEW_COUNT_BUFFER='memory' each worker flushes its own buffer; use 'cache' "
+        "with a shared cache to flush every worker from here."
+    )
+
+    def handle(self, *args, **options):
+        buffer = get_buffer()
+        if buffer is None:
+            self.stdout.write("View count buffering is off; nothing to flush.")
+            return
+        if getattr(settings, 'VIEW_COUNT_BUFFER', 'cache') == 'memory':
+            # Hits live in each web worker's memory, not in this process
+            self.stdout.write(self.style.WARNING(
+                "VIEW_COUNT_BUFFER is 'memory': each worker flushes its own hits and this "
+                "command cannot reach them. Set VIEW_COUNT_BUFFER='cache' to flush from here."
+            ))
+            return
+        written = buffer.flush()
+        self.stdout.write(self.style.SUCCESS(f"Flushed {written} buffered product views."))
@@ -0,0 +1,170 @@
+import csv
+import io
+import json
+import sys
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from store.models import Category, Product
+from store.signals import products_bulk_created
+from store.slugs import unique_slugs
+
+MAX_REPORTED_ERRORS = 20
+
+
+class RowError(ValueError):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream products from a CSV or JSONL file (or '-' for stdin) into the catalog. "
+        "Columns: name, price, category, and optionally description and quantity. "
+        "Missing categories are created. Rows are inserted with bulk_create, one "
+        "transaction per chunk, so memory use does not grow with the file size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV/JSONL file to import, or '-' for stdin.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Rows per insert transaction.")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('jsonl' if options['path'].endswith(('.jsonl', '.ndjson')) else 'csv')
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+
+        self.categories = {}
+        self.errors = 0
+        imported = 0
+        started = time.monotonic()
+
+        with self.open(options['path']) as stream:
+            chunk = []
+            for line_number, row in self.read_rows(stream, fmt):
+                try:
+                    chunk.append(self.clean(row))
+                except RowError as exc:
+                    self.report_error(line_number, exc)
+                    continue
+                if len(chunk) >= chunk_size:
+                    imported += self.insert(chunk)
+                    chunk = []
+                    self.report_progress(imported, started)
+            if chunk:
+                imported += self.insert(chunk)
+                self.report_progress(imported, started)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} products in {elapsed:.1f}s; {self.errors} rows skipped."
+        ))
+
+    # ----------------------------
+    # Reading
+    # ----------------------------
+    def open(self, path):
+        if path == '-':
+            return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+        try:
+            return open(path, encoding='utf-8', newline='')
+        except OSError as exc:
+            raise CommandError(f"Cannot open {path}: {exc}")
+
+    def read_rows(self, stream, fmt):
+        """
+        Yield (line_number, dict) pairs one at a time.
+        """
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                self.report_error(line_number, f"invalid JSON ({exc})")
+                continue
+            if not isinstance(row, dict):
+                self.report_error(line_number, "expected a JSON object")
+                continue
+            yield line_number, row
+
+    def clean(self, row):
+        name = (row.get('name') or '').strip()
+        category = (row.get('category') or '').strip()
+        if not name:
+            raise RowError("missing name")
+        if not category:
+            raise RowError("missing category")
+        price = self.clean_field('price', str(row.get('price', '')).strip())
+        if price < 0:
+            raise RowError("negative price")
+        quantity = self.clean_field('quantity', row.get('quantity') or 0)
+        return {
+            'name': name[:255],
+            'category': category,
+            'description': (row.get('description') or '').strip(),
+            'price': price,
+            'quantity': quantity,
+        }
+
+    def clean_field(self, name, value):
+        """
+        Validate `value` as the Product field would (finite, max_digits,
+        decimal_places, range), so bad values fail the row, not the insert.
+        """
+        try:
+            return Product._meta.get_field(name).clean(value, None)
+        except ValidationError as exc:
+            raise RowError(f"invalid {name} {value!r} ({' '.join(exc.messages)})")
+
+    # ----------------------------
+    # Writing
+    # ----------------------------
+    def get_category(self, name):
+        category = self.categories.get(name)
+        if category is None:
+            category = Category.objects.filter(name=name).first() or Category.objects.create(name=name)
+            self.categories[name] = category
+        return category
+
+    def insert(self, rows):
+        with transaction.atomic():
+            slugs = unique_slugs(Product, [row['name'] for row in rows])
+            products = [
+                Product(
+                    category=self.get_category(row['category']),
+                    name=row['name'],
+                    slug=slug,
+                    description=row['description'],
+                    price=row['price'],
+                    quantity=row['quantity'],
+                    is_in_stock=row['quantity'] > 0,  # bulk_create skips Product.save()
+                )
+                for row, slug in zip(rows, slugs)
+            ]
+            created = Product.objects.bulk_create(products)
+            products_bulk_created.send(sender=Product, products=created)
+        return len(created)
+
+    # ----------------------------
+    # Reporting
+    # ----------------------------
+    def report_error(self, line_number, message):
+        self.errors += 1
+        if self.errors <= MAX_REPORTED_ERRORS:
+            self.stderr.write(f"Line {line_number}: skipped, {message}.")
+        elif self.errors == MAX_REPORTED_ERRORS + 1:
+            self.stderr.write("Further row errors are counted but not shown.")
+
+    def report_progress(self, imported, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(f"{imported} products imported ({imported / elapsed:.0f} rows/s)")
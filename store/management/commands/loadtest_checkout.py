@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.admission import Gate
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate a flash sale against a scratch SQLite file and report completed "
+        "checkouts per second with and without the admission gate. Each simulated "
+        "checkout is --steps write transactions that must all finish within "
+        "--timeout seconds; nothing touches the project database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shoppers', default='5,20,80,200', help="Comma-separated concurrency levels")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds per run")
+        parser.add_argument('--max-active', type=int, default=2, help="Gate size for the gated runs")
+        parser.add_argument('--steps', type=int, default=3, help="Write transactions per checkout")
+        parser.add_argument('--write-ms', type=float, default=40.0, help="Time each transaction holds the writer lock")
+        parser.add_argument('--timeout', type=float, default=5.0, help="Request deadline in seconds")
+        parser.add_argument('--poll-ms', type=float, default=100.0, help="Waiting room polling interval")
+
+    def handle(self, *args, **options):
+        self.options = options
+        levels = [int(level) for level in options['shoppers'].split(',') if level.strip()]
+        self.stdout.write(
+            f"{'mode':<10}{'shoppers':>9}{'done/s':>9}{'timeouts':>10}{'p95 s':>8}{'avg wait s':>12}{'max queue':>11}"
+        )
+        for shoppers in levels:
+            for gated in (False, True):
+                self.report(shoppers, gated, self.run(shoppers, gated))
+
+    def report(self, shoppers, gated, result):
+        latencies = sorted(result['latencies'])
+        p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+        waits = result['waits']
+        avg_wait = sum(waits) / len(waits) if waits else 0
+        self.stdout.write(
+            f"{'gated' if gated else 'ungated':<10}{shoppers:>9}{len(latencies) / self.options['duration']:>9.1f}"
+            f"{result['timeouts']:>10}{p95:>8.2f}{avg_wait:>12.2f}{result['max_queue']:>11}"
+        )
+
+    def checkout(self, path, deadline):
+        """
+        One simulated checkout; True if every step committed before the deadline.
+        """
+        hold = self.options['write_ms'] / 1000
+        connection = sqlite3.connect(path, timeout=max(deadline - time.monotonic(), 0.001), isolation_level=None)
+        try:
+            for _ in range(self.options['steps']):
+                connection.execute('BEGIN IMMEDIATE')
+                connection.execute('UPDATE stock SET quantity = quantity - 1 WHERE id = 1')
+                time.sleep(hold)  # the rest of the transaction's work
+                if time.monotonic() > deadline:
+                    connection.execute('ROLLBACK')  # the client has given up; the work is wasted
+                    return False
+                connection.execute('COMMIT')
+            return True
+        except sqlite3.OperationalError:  # database is locked: the busy timeout ran out
+            return False
+        finally:
+            connection.close()
+
+    def run(self, shoppers, gated):
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        setup = sqlite3.connect(path)
+        setup.execute('PRAGMA journal_mode=WAL')
+        setup.execute('CREATE TABLE stock (id INTEGER PRIMARY KEY, quantity INTEGER)')
+        setup.execute('INSERT INTO stock VALUES (1, 1000000000)')
+        setup.commit()
+        setup.close()
+
+        gate = Gate('loadtest', max_active=self.options['max_active'], lease_seconds=60, queue_idle_seconds=60)
+        gate.reset()
+        result = {'latencies': [], 'waits': [], 'timeouts': 0, 'max_queue': 0}
+        lock = threading.Lock()
+        stop_at = time.monotonic() + self.options['duration']
+
+        def shopper(number):
+            ticket = f'shopper:{number}'
+            while time.monotonic() < stop_at:
+                queued_at = time.monotonic()
+                if gated:
+                    while True:
+                        admission = gate.enter(ticket)
+                        if admission.admitted or time.monotonic() >= stop_at:
+                            break
+                        with lock:
+                            result['max_queue'] = max(result['max_queue'], admission.queue_depth)
+                        time.sleep(self.options['poll_ms'] / 1000)
+                    if not admission.admitted:
+                        return
+                started = time.monotonic()
+                completed = self.checkout(path, started + self.options['timeout'])
+                if gated:
+                    gate.leave(ticket)
+                with lock:
+                    if completed:
+                        result['latencies'].append(time.monotonic() - started)
+                        result['waits'].append(started - queued_at)
+                    else:
+                        result['timeouts'] += 1
+
+        threads = [threading.Thread(target=shopper, args=(number,)) for number in range(shoppers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        gate.reset()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        return result
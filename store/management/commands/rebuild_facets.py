@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.facets import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the product_list facet counters (category x price band x in stock) from the catalog."
+
+    def handle(self, *args, **options):
+        rebuild()
+        self.stdout.write(self.style.SUCCESS("Facet counters rebuilt."))
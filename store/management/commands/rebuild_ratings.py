@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from store.conditional import bump_catalog_version
+from store.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = "Recompute every product's denormalized rating aggregates from its reviews."
+
+    def handle(self, *args, **options):
+        rebuild_ratings()
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS("Product rating aggregates rebuilt."))
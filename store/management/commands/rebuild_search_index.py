@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index from the product table."
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stdout.write(self.style.WARNING("This database backend has no search index; nothing to do."))
+            return
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
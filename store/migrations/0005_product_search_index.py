@@ -0,0 +1,50 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE store_product_fts USING fts5("
+            "name, category, description, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO store_product_fts (rowid, name, category, description) "
+            "SELECT p.id, p.name, c.name, p.description "
+            "FROM store_product p JOIN store_category c ON c.id = p.category_id"
+        )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE store_product_search ("
+            "product_id bigint PRIMARY KEY, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX store_product_search_document_idx ON store_product_search USING GIN (document)"
+        )
+        schema_editor.execute(
+            "INSERT INTO store_product_search (product_id, document) "
+            "SELECT p.id, setweight(to_tsvector('simple', p.name), 'A') "
+            "|| setweight(to_tsvector('simple', c.name), 'B') "
+            "|| setweight(to_tsvector('simple', p.description), 'D') "
+            "FROM store_product p JOIN store_category c ON c.id = p.category_id"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS store_product_fts")
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute("DROP TABLE IF EXISTS store_product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_order_cancelled_at_order_completed_at_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
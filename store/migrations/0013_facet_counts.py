@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:45
+
+import django.db.models.deletion
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def backfill_facet_counts(apps, schema_editor):
+    # Same bands as store.facets.PRICE_BANDS at the time of this migration
+    bounds = [('under-1000', Decimal('1000')), ('1000-4999', Decimal('5000')), ('5000-19999', Decimal('20000')),
+              ('20000-49999', Decimal('50000'))]
+    Product = apps.get_model('store', 'Product')
+    FacetCount = apps.get_model('store', 'FacetCount')
+    counts = {}
+    for category_id, price, in_stock in Product.objects.values_list('category_id', 'price', 'is_in_stock').iterator():
+        band = next((key for key, high in bounds if price < high), '50000-plus')
+        key = (category_id, band, in_stock)
+        counts[key] = counts.get(key, 0) + 1
+    FacetCount.objects.bulk_create([
+        FacetCount(category_id=category_id, price_band=band, in_stock=in_stock, count=count)
+        for (category_id, band, in_stock), count in counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_product_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_band', models.CharField(max_length=20)),
+                ('in_stock', models.BooleanField()),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facet_counts', to='store.category')),
+            ],
+            options={
+                'unique_together': {('category', 'price_band', 'in_stock')},
+            },
+        ),
+        migrations.RunPython(backfill_facet_counts, migrations.RunPython.noop),
+    ]
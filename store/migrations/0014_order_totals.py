@@ -0,0 +1,28 @@
+from django.db import migrations
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_totals(apps, schema_editor):
+    # Pending orders were only totalled when checkout was opened
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    money = DecimalField(max_digits=12, decimal_places=2)
+    totals = (
+        OrderItem.objects.filter(order_id=OuterRef('pk'))
+        .values('order_id')
+        .annotate(total=Sum(ExpressionWrapper(F('quantity') * F('price'), output_field=money)))
+        .values('total')
+    )
+    Order.objects.update(total_amount=Coalesce(Subquery(totals, output_field=money), Value(0), output_field=money))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_facet_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
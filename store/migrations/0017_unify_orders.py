@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+# accounts.Order statuses that have a different name here
+STATUS_MAP = {'delivered': 'completed'}
+
+
+def copy_account_orders(apps, schema_editor):
+    """
+    Move accounts.Order/OrderItem rows into store.Order/OrderItem. Orders get
+    new ids; created_at is restored afterwards because auto_now_add overwrites
+    it on insert.
+    """
+    OldOrder = apps.get_model('accounts', 'Order')
+    OldItem = apps.get_model('accounts', 'OrderItem')
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+
+    old_orders = list(OldOrder.objects.order_by('id'))
+    if not old_orders:
+        return
+    new_orders = []
+    for old in old_orders:
+        status = STATUS_MAP.get(old.status, old.status)
+        order = Order(
+            user_id=old.customer_id, status=status, total_amount=old.total_amount,
+            shipping_address=old.shipping_address, pending_at=old.created_at,
+        )
+        if hasattr(order, f'{status}_at'):
+            setattr(order, f'{status}_at', old.updated_at)
+        new_orders.append(order)
+    Order.objects.bulk_create(new_orders, batch_size=500)
+    for old, order in zip(old_orders, new_orders):
+        order.created_at = old.created_at
+    Order.objects.bulk_update(new_orders, ['created_at'], batch_size=500)
+
+    new_ids = {old.id: order.id for old, order in zip(old_orders, new_orders)}
+    OrderItem.objects.bulk_create([
+        OrderItem(order_id=new_ids[item.order_id], product_id=item.product_id, quantity=item.quantity, price=item.price)
+        for item in OldItem.objects.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_idempotency_keys'),
+        ('accounts', '0006_order_customer_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('processing', 'Processing / Packed'), ('shipped', 'Shipped / Out for Delivery'), ('completed', 'Completed / Delivered'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='ordertracking',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('processing', 'Processing / Packed'), ('shipped', 'Shipped / Out for Delivery'), ('completed', 'Completed / Delivered'), ('cancelled', 'Cancelled')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+        ),
+        migrations.RunPython(copy_account_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:41
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+PLACED_STATUSES = ('paid', 'processing', 'shipped', 'completed')
+
+
+def backfill_placed_at(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    Order.objects.filter(status__in=PLACED_STATUSES).update(placed_at=Coalesce('completed_at', 'created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0019_idempotency_keys_per_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_status_completed_idx',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='placed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['placed_at'], name='order_placed_idx'),
+        ),
+        migrations.RunPython(backfill_placed_at, migrations.RunPython.noop),
+    ]
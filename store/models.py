@@ -1,7 +1,12 @@
 from django.db import models
+from django.db.models import Prefetch, Q
+from django.db.models.functions import Substr
 from cloudinary.models import CloudinaryField
-from django.utils.text import slugify
 from django.conf import settings
+from django.utils import timezone
+
+from .slugs import unique_slug
+from .images import image_url, srcset
 
 # ----------------------------
 # Product Categories
@@ -20,35 +25,102 @@ class Category(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = unique_slug(Category, self.name, exclude_pk=self.pk)
         super().save(*args, **kwargs)
 
 
 # ----------------------------
 # Products (single consolidated model)
 # ----------------------------
+class ProductQuerySet(models.QuerySet):
+    def for_listing(self):
+        """
+        Everything a product card needs in a fixed number of queries: the
+        category joined in, only the first additional image prefetched and
+        the description replaced by a short `summary`.
+        """
+        first_image = ProductImage.objects.order_by('uploaded_at', 'id')[:1]
+        return (
+            self.select_related('category')
+            .defer('description')
+            .annotate(summary=Substr('description', 1, 160))
+            .prefetch_related(Prefetch('additional_images', queryset=first_image, to_attr='listing_images'))
+        )
+
+
 class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     name = models.CharField(max_length=255)
     description = models.TextField()
     price = models.DecimalField(max_digits=12, decimal_places=2)
     quantity = models.PositiveIntegerField(default=0)
+    # Units held by StockReservations, maintained by store.checkout
+    reserved_quantity = models.PositiveIntegerField(default=0)
     is_in_stock = models.BooleanField(default=True)
     main_image = CloudinaryField('main_image', null=True, blank=True)
+    # Resized URLs for main_image, maintained by store.images (see srcset below)
+    main_image_variants = models.JSONField(default=dict, blank=True)
     views_count = models.PositiveIntegerField(default=0)
     slug = models.SlugField(unique=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Review aggregates, maintained by store.ratings (never edit by hand)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination on (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+            # Listing sorts: partial indexes over in-stock rows only (see store.listing)
+            models.Index(fields=['created_at', 'id'], condition=Q(is_in_stock=True), name='product_instock_created_idx'),
+            models.Index(fields=['price', 'id'], condition=Q(is_in_stock=True), name='product_instock_price_idx'),
+            models.Index(fields=['views_count', 'id'], condition=Q(is_in_stock=True), name='product_instock_views_idx'),
+            models.Index(fields=['rating_avg', 'id'], condition=Q(is_in_stock=True), name='product_instock_rating_idx'),
+            # The same within one category
+            models.Index(fields=['category', 'created_at', 'id'], condition=Q(is_in_stock=True), name='product_cat_created_idx'),
+            models.Index(fields=['category', 'price', 'id'], condition=Q(is_in_stock=True), name='product_cat_price_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = unique_slug(Product, self.name, exclude_pk=self.pk)
         self.is_in_stock = self.quantity > 0
         super().save(*args, **kwargs)
 
+    @property
+    def main_image_url(self):
+        return image_url(self.main_image)
+
+    @property
+    def main_image_thumb(self):
+        return self.main_image_variants.get('thumb') or self.main_image_url
+
+    @property
+    def main_image_srcset(self):
+        return srcset(self.main_image_variants)
+
+    @property
+    def available_quantity(self):
+        return max(self.quantity - self.reserved_quantity, 0)
+
+    @property
+    def rating_histogram(self):
+        """Review counts per star, highest first: [(5, n), (4, n), ...]."""
+        return [(stars, getattr(self, f'rating_{stars}_count')) for stars in range(5, 0, -1)]
+
 
 # ----------------------------
 # Additional Images
@@ -56,12 +128,65 @@ class Product(models.Model):
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='additional_images')
     image = CloudinaryField('image')
+    variants = models.JSONField(default=dict, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    @property
+    def image_url(self):
+        return image_url(self.image)
+
+    @property
+    def thumb(self):
+        return self.variants.get('thumb') or self.image_url
+
+    @property
+    def srcset(self):
+        return srcset(self.variants)
+
     def __str__(self):
         return f"Image for {self.product.name}"
 
 
+# ----------------------------
+# Facet counters (product_list sidebar)
+# ----------------------------
+class FacetCount(models.Model):
+    """
+    Number of products in one (category, price band, in stock) cell,
+    maintained by store.facets.
+    """
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='facet_counts')
+    price_band = models.CharField(max_length=20)
+    in_stock = models.BooleanField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('category', 'price_band', 'in_stock')
+
+    def __str__(self):
+        return f"{self.category_id}/{self.price_band}/{'in' if self.in_stock else 'out'}: {self.count}"
+
+
+# ----------------------------
+# Featured Products (home page)
+# ----------------------------
+class FeaturedProduct(models.Model):
+    """
+    Admin-curated home page slot; the rest of the feed is filled
+    automatically (see store.featured).
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='featured')
+    position = models.PositiveSmallIntegerField(default=0, help_text="Lower numbers are shown first")
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['position', 'id']
+
+    def __str__(self):
+        return f"Featured #{self.position}: {self.product.name}"
+
+
 # ----------------------------
 # Reviews
 # ----------------------------
@@ -82,6 +207,7 @@ class Review(models.Model):
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
+        ('paid', 'Paid'),
         ('processing', 'Processing / Packed'),
         ('shipped', 'Shipped / Out for Delivery'),
         ('completed', 'Completed / Delivered'),
@@ -102,6 +228,16 @@ class Order(models.Model):
     shipped_at = models.DateTimeField(blank=True, null=True)
     completed_at = models.DateTimeField(blank=True, null=True)
     cancelled_at = models.DateTimeField(blank=True, null=True)
+    # When the order first entered store.customers.PLACED_STATUSES; never moves after that
+    placed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Incremental recommendation refresh scans newly placed orders
+            models.Index(fields=['placed_at'], name='order_placed_idx'),
+            # Keyset pagination of a customer's orders on (created_at, id)
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} ({self.user.username})"
@@ -117,6 +253,22 @@ class OrderItem(models.Model):
         return self.quantity * self.price
 
 
+# ----------------------------
+# Stock held for an order during checkout (see store.checkout)
+# ----------------------------
+class StockReservation(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('order', 'product')
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for order #{self.order_id} until {self.expires_at}"
+
+
 # ----------------------------
 # Optional: Order Tracking Logs
 # ----------------------------
@@ -131,3 +283,86 @@ class OrderTracking(models.Model):
 
     def __str__(self):
         return f"{self.get_status_display()} for Order #{self.order.id} at {self.timestamp}"
+
+
+# ----------------------------
+# "Customers also bought" (built offline by store.recommendations)
+# ----------------------------
+class ProductRecommendation(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.PositiveIntegerField(help_text="Completed orders containing both products")
+
+    class Meta:
+        unique_together = ('product', 'recommended')
+        indexes = [
+            models.Index(fields=['product', '-score'], name='recommendation_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.recommended_id} ({self.score})"
+
+
+class RecommendationRun(models.Model):
+    full_rebuild = models.BooleanField(default=False)
+    processed_through = models.DateTimeField(help_text="Orders completed up to this time are included")
+    orders_processed = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Recommendation run through {self.processed_through}"
+
+
+# ----------------------------
+# Catalog version (conditional GET)
+# ----------------------------
+class CatalogVersion(models.Model):
+    """
+    Single row (pk=1) bumped whenever catalog pages would render differently;
+    see store.conditional.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Catalog version {self.version}"
+
+
+class SearchIndexVersion(models.Model):
+    """
+    Single row (pk=1) bumped only when the in-memory search indexes would
+    change (product names, categories, what is in stock); see store.lazyindex.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Search index version {self.version}"
+
+
+# ----------------------------
+# Idempotency keys (see store.idempotency)
+# ----------------------------
+class IdempotencyKey(models.Model):
+    key = models.CharField(max_length=64)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    method = models.CharField(max_length=8)
+    path = models.CharField(max_length=255)
+    # Null while the first request is still running
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        # Keys are per user; anonymous requests share one namespace, which
+        # needs its own constraint since NULL users never collide
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_uniq'),
+            models.UniqueConstraint(fields=['key'], condition=Q(user__isnull=True), name='idempotency_anon_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.path} [{self.key}]"
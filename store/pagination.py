@@ -0,0 +1,174 @@
+"""
+Keyset (cursor) pagination.
+
+A page is located by the ordering values of the row at its edge rather than
+by an OFFSET, so fetching page 500 costs the same indexed range scan as page
+one. Cursors are opaque url-safe tokens; a tampered or stale token simply
+yields the first page.
+"""
+import base64
+import binascii
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+DEFAULT_ORDERING = ('-created_at', '-id')
+
+
+def _encode_value(value):
+    # Keep full datetime precision; the equality half of the keyset needs it
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps([direction, [_encode_value(v) for v in values]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Return (direction, values) or None if the token is not a valid cursor.
+    """
+    if not token:
+        return None
+    try:
+        payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, values = json.loads(payload)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    if direction not in ('n', 'p') or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.next_query = ''
+        self.previous_query = ''
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class CursorPaginator:
+    """
+    Paginate a queryset on a unique ordering, e.g. ('-created_at', '-id').
+
+    The last ordering field must be unique (normally the primary key) so that
+    every row has exactly one position. Works on model and .values() querysets.
+    """
+
+    def __init__(self, queryset, per_page, ordering=DEFAULT_ORDERING):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.fields = [(f.lstrip('-'), f.startswith('-')) for f in ordering]
+
+    def _output_field(self, name):
+        try:
+            return self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return self.queryset.query.annotations[name].output_field
+
+    def _clean(self, values):
+        """
+        Convert decoded cursor values back to the ordering fields' types;
+        None if they don't fit the ordering.
+        """
+        if len(values) != len(self.fields):
+            return None
+        cleaned = []
+        for (name, _), value in zip(self.fields, values):
+            if value is None or isinstance(value, (list, dict)):
+                return None
+            try:
+                cleaned.append(self._output_field(name).to_python(value))
+            except (ValidationError, ValueError, TypeError, ArithmeticError):
+                return None
+            if cleaned[-1] is None:
+                return None
+        return cleaned
+
+    def _row_values(self, row):
+        if isinstance(row, dict):
+            return [row[name] for name, _ in self.fields]
+        return [getattr(row, name) for name, _ in self.fields]
+
+    def _seek(self, values, forward):
+        """
+        Build the row-value comparison "(f1, f2, ...) > (v1, v2, ...)" as a
+        chain of ORs, which every backend can serve from a composite index.
+        """
+        condition = Q()
+        equal_prefix = {}
+        for (name, descending), value in zip(self.fields, values):
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= Q(**equal_prefix, **{f'{name}__{lookup}': value})
+            equal_prefix[name] = value
+        return condition
+
+    def _order_by(self, forward):
+        if forward:
+            return [f'-{name}' if desc else name for name, desc in self.fields]
+        return [name if desc else f'-{name}' for name, desc in self.fields]
+
+    def page(self, cursor=None):
+        decoded = decode_cursor(cursor)
+        if decoded:
+            values = self._clean(decoded[1])
+            decoded = (decoded[0], values) if values is not None else None
+        forward = decoded is None or decoded[0] == 'n'
+
+        queryset = self.queryset.order_by(*self._order_by(forward))
+        if decoded:
+            queryset = queryset.filter(self._seek(decoded[1], forward))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+        if not rows:
+            return CursorPage(rows)
+
+        if forward:
+            next_cursor = encode_cursor('n', self._row_values(rows[-1])) if has_more else None
+            previous_cursor = encode_cursor('p', self._row_values(rows[0])) if decoded else None
+        else:
+            next_cursor = encode_cursor('n', self._row_values(rows[-1]))
+            previous_cursor = encode_cursor('p', self._row_values(rows[0])) if has_more else None
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+
+def paginate(request, queryset, per_page, ordering=DEFAULT_ORDERING):
+    """
+    Page `queryset` from the request's `cursor` parameter and attach
+    next/previous query strings that keep the other GET parameters.
+    """
+    page = CursorPaginator(queryset, per_page, ordering).page(request.GET.get('cursor'))
+    for attr, cursor in (('next_query', page.next_cursor), ('previous_query', page.previous_cursor)):
+        if cursor:
+            params = request.GET.copy()
+            params['cursor'] = cursor
+            setattr(page, attr, '?' + params.urlencode())
+    return page
@@ -0,0 +1,86 @@
+"""
+Denormalized review aggregates on Product.
+
+Every Review create/update/delete shifts the product's rating_count,
+rating_sum, the matching rating_N_count bucket and rating_avg in a single
+UPDATE, so pages never aggregate the review table. `rebuild_ratings`
+recomputes everything from scratch for backfills.
+"""
+from django.db import transaction
+from django.db.models import F, Q, Case, When, Value, Count, Sum, FloatField
+from django.db.models.functions import Cast, Round
+
+from .models import Product, Review
+
+STARS = range(1, 6)
+HISTOGRAM_FIELDS = [f'rating_{stars}_count' for stars in STARS]
+
+
+def apply_rating(product_id, rating, sign):
+    """
+    Add (sign=1) or remove (sign=-1) one rating from a product's aggregates.
+    """
+    # All right-hand sides see the row as it was before the UPDATE
+    new_count = F('rating_count') + sign
+    # Rounded in SQL like rebuild_ratings(): SQLite keeps whatever REAL it is
+    # given, and listing cursors compare against the 2 dp value
+    new_avg = Round(Cast(F('rating_sum') + sign * rating, FloatField()) / new_count, 2)
+    updates = {
+        'rating_count': new_count,
+        'rating_sum': F('rating_sum') + sign * rating,
+        'rating_avg': Case(
+            When(rating_count__lte=-sign, then=Value(0.0)),
+            default=new_avg,
+            output_field=FloatField(),
+        ),
+    }
+    if rating in STARS:
+        field = f'rating_{rating}_count'
+        updates[field] = F(field) + sign
+    Product.objects.filter(id=product_id).update(**updates)
+
+
+def review_changed(old, new):
+    """
+    Move a review's contribution from `old` to `new`, each a
+    (product_id, rating) pair or None.
+    """
+    if old == new:
+        return
+    with transaction.atomic():
+        if old:
+            apply_rating(*old, sign=-1)
+        if new:
+            apply_rating(*new, sign=1)
+
+
+def rebuild_ratings():
+    """
+    Recompute every product's aggregates from the review table.
+    """
+    stats = (
+        Review.objects.values('product')
+        .annotate(
+            count=Count('id'),
+            total=Sum('rating'),
+            **{field: Count('id', filter=Q(rating=stars)) for stars, field in zip(STARS, HISTOGRAM_FIELDS)}
+        )
+        .order_by()
+    )
+    fields = ['rating_avg', 'rating_count', 'rating_sum'] + HISTOGRAM_FIELDS
+    with transaction.atomic():
+        Product.objects.update(**{field: 0 for field in fields})
+        products = []
+        for row in stats.iterator():
+            product = Product(
+                id=row['product'],
+                rating_count=row['count'],
+                rating_sum=row['total'],
+                rating_avg=round(row['total'] / row['count'], 2),
+                **{field: row[field] for field in HISTOGRAM_FIELDS}
+            )
+            products.append(product)
+            if len(products) >= 500:
+                Product.objects.bulk_update(products, fields)
+                products = []
+        Product.objects.bulk_update(products, fields)
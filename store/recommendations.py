@@ -0,0 +1,151 @@
+"""
+"Customers also bought" recommendations.
+
+Two products co-occur when they appear in the same placed order (see
+store.customers.PLACED_STATUSES). Orders are windowed by Order.placed_at,
+which is set once when an order is first placed, so an order that later
+moves from 'paid' to 'completed' is never counted twice. The pair
+counts come from one self-join over OrderItem grouped by product pair, so
+the database does the heavy lifting, and only the top
+RECOMMENDATIONS_PER_PRODUCT neighbours of each product are kept in
+ProductRecommendation. product_detail then needs a single indexed lookup.
+
+A full build recounts every placed order. An incremental refresh only
+counts orders placed since the last run and merges those counts into the
+stored top-N lists; pairs that had already dropped out of a product's top N
+restart from their new count, so run a full build now and then.
+"""
+import heapq
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .customers import PLACED_STATUSES
+from .models import Order, OrderItem, ProductRecommendation, RecommendationRun
+
+BATCH_SIZE = 1000
+
+
+def _per_product():
+    return getattr(settings, 'RECOMMENDATIONS_PER_PRODUCT', 8)
+
+
+def _pair_counts(placed_after, placed_through):
+    """
+    Yield (product_id, other_id, orders_in_common) for orders placed in
+    (placed_after, placed_through], best pairs first within each product.
+    placed_after=None takes everything placed up to placed_through.
+    """
+    item_table = OrderItem._meta.db_table
+    order_table = Order._meta.db_table
+    adapt = connection.ops.adapt_datetimefield_value
+    if placed_after is None:
+        window = "o.placed_at <= %s"
+        params = [adapt(placed_through)]
+    else:
+        window = "o.placed_at > %s AND o.placed_at <= %s"
+        params = [adapt(placed_after), adapt(placed_through)]
+    statuses = ', '.join(['%s'] * len(PLACED_STATUSES))
+    sql = f"""
+        SELECT a.product_id, b.product_id, COUNT(DISTINCT a.order_id) AS score
+        FROM {item_table} a
+        JOIN {item_table} b ON b.order_id = a.order_id AND b.product_id <> a.product_id
+        JOIN {order_table} o ON o.id = a.order_id
+        WHERE o.status IN ({statuses}) AND {window}
+        GROUP BY a.product_id, b.product_id
+        ORDER BY a.product_id, score DESC, b.product_id
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*PLACED_STATUSES, *params])
+        while True:
+            rows = cursor.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+            yield from rows
+
+
+def _count_orders(placed_after, placed_through):
+    orders = Order.objects.filter(status__in=PLACED_STATUSES, placed_at__lte=placed_through)
+    if placed_after is not None:
+        orders = orders.filter(placed_at__gt=placed_after)
+    return orders.count()
+
+
+def build_full():
+    """
+    Replace every product's neighbours with counts over all placed orders.
+    """
+    now = timezone.now()
+    limit = _per_product()
+    with transaction.atomic():
+        ProductRecommendation.objects.all().delete()
+        batch = []
+        current, kept = None, 0
+        for product_id, other_id, score in _pair_counts(None, now):
+            if product_id != current:
+                current, kept = product_id, 0
+            if kept >= limit:
+                continue
+            kept += 1
+            batch.append(ProductRecommendation(product_id=product_id, recommended_id=other_id, score=score))
+            if len(batch) >= BATCH_SIZE:
+                ProductRecommendation.objects.bulk_create(batch)
+                batch = []
+        ProductRecommendation.objects.bulk_create(batch)
+        return RecommendationRun.objects.create(
+            full_rebuild=True, processed_through=now, orders_processed=_count_orders(None, now),
+        )
+
+
+def refresh_incremental():
+    """
+    Fold orders placed since the last run into the stored neighbours.
+    Falls back to a full build when there is no previous run.
+    """
+    last_run = RecommendationRun.objects.first()
+    if last_run is None:
+        return build_full()
+
+    now = timezone.now()
+    limit = _per_product()
+    deltas = defaultdict(dict)
+    for product_id, other_id, score in _pair_counts(last_run.processed_through, now):
+        deltas[product_id][other_id] = score
+
+    with transaction.atomic():
+        product_ids = list(deltas)
+        for start in range(0, len(product_ids), BATCH_SIZE):
+            chunk = product_ids[start:start + BATCH_SIZE]
+            scores = defaultdict(dict)
+            existing = ProductRecommendation.objects.filter(product_id__in=chunk)
+            for product_id, other_id, score in existing.values_list('product_id', 'recommended_id', 'score'):
+                scores[product_id][other_id] = score
+            rows = []
+            for product_id in chunk:
+                merged = scores[product_id]
+                for other_id, delta in deltas[product_id].items():
+                    merged[other_id] = merged.get(other_id, 0) + delta
+                top = heapq.nsmallest(limit, merged.items(), key=lambda pair: (-pair[1], pair[0]))
+                rows.extend(
+                    ProductRecommendation(product_id=product_id, recommended_id=other_id, score=score)
+                    for other_id, score in top
+                )
+            existing.delete()
+            ProductRecommendation.objects.bulk_create(rows)
+        return RecommendationRun.objects.create(
+            processed_through=now, orders_processed=_count_orders(last_run.processed_through, now),
+        )
+
+
+def recommended_products(product, limit=None):
+    """
+    In-stock products most often bought together with `product`.
+    """
+    recommendations = (
+        ProductRecommendation.objects.filter(product=product, recommended__quantity__gt=0)
+        .select_related('recommended')
+        .order_by('-score')[:limit or _per_product()]
+    )
+    return [recommendation.recommended for recommendation in recommendations]
@@ -0,0 +1,189 @@
+"""
+Full-text product search.
+
+Products are indexed on name, category name and description. SQLite uses an
+FTS5 virtual table and PostgreSQL a tsvector table with a GIN index; both are
+keyed by product id and kept in sync from store.signals. Any other backend
+falls back to the old icontains filter.
+"""
+import re
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import Case, When, Value, IntegerField, Q
+
+from .trigrams import product_index as fuzzy_product_index
+
+FTS_TABLE = 'store_product_fts'
+PG_TABLE = 'store_product_search'
+
+# Product fields that feed the index; saves touching none of them are skipped
+INDEXED_FIELDS = {'name', 'description', 'category'}
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def is_supported():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def _tokens(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+# ----------------------------
+# Index maintenance
+# ----------------------------
+def index_products(products):
+    """
+    Insert or refresh the index rows for the given products.
+    """
+    if not is_supported():
+        return
+    rows = [(p.pk, p.name, p.category.name, p.description) for p in products]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, category, description) VALUES (%s, %s, %s, %s)",
+                rows,
+            )
+        else:
+            cursor.executemany(
+                f"""
+                INSERT INTO {PG_TABLE} (product_id, document)
+                VALUES (%s, setweight(to_tsvector('simple', %s), 'A')
+                         || setweight(to_tsvector('simple', %s), 'B')
+                         || setweight(to_tsvector('simple', %s), 'D'))
+                ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document
+                """,
+                rows,
+            )
+
+
+def remove_products(product_ids):
+    if not is_supported() or not product_ids:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in product_ids])
+        else:
+            cursor.execute(f"DELETE FROM {PG_TABLE} WHERE product_id = ANY(%s)", [list(product_ids)])
+
+
+def rebuild_index():
+    """
+    Rebuild the whole index from store_product in one statement.
+    """
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(f"""
+                INSERT INTO {FTS_TABLE} (rowid, name, category, description)
+                SELECT p.id, p.name, c.name, p.description
+                FROM store_product p JOIN store_category c ON c.id = p.category_id
+            """)
+        else:
+            cursor.execute(f"TRUNCATE {PG_TABLE}")
+            cursor.execute(f"""
+                INSERT INTO {PG_TABLE} (product_id, document)
+                SELECT p.id, setweight(to_tsvector('simple', p.name), 'A')
+                             || setweight(to_tsvector('simple', c.name), 'B')
+                             || setweight(to_tsvector('simple', p.description), 'D')
+                FROM store_product p JOIN store_category c ON c.id = p.category_id
+            """)
+
+
+# ----------------------------
+# Querying
+# ----------------------------
+def ranked_product_ids(query, limit=None, queryset=None):
+    """
+    Return product ids matching every word of the query (as a prefix), best
+    match first. Returns None when the backend has no search index.
+
+    With a Product `queryset`, only its rows are ranked, so its filters (in
+    stock, category, price) apply before SEARCH_RESULTS_LIMIT does.
+    """
+    if not is_supported():
+        return None
+    tokens = _tokens(query)
+    if not tokens:
+        return []
+    limit = limit or getattr(settings, 'SEARCH_RESULTS_LIMIT', 1000)
+    restrict, restrict_params = '', []
+    if queryset is not None:
+        try:
+            subquery, restrict_params = queryset.order_by().values('id').query.sql_with_params()
+        except EmptyResultSet:
+            return []
+        restrict = f"AND {{column}} IN ({subquery})"
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            match = ' '.join(f'"{token}"*' for token in tokens)
+            cursor.execute(
+                f"""
+                SELECT rowid FROM {FTS_TABLE}
+                WHERE {FTS_TABLE} MATCH %s {restrict.format(column='rowid')}
+                ORDER BY bm25({FTS_TABLE}, 10.0, 4.0, 1.0)
+                LIMIT %s
+                """,
+                [match, *restrict_params, limit],
+            )
+        else:
+            tsquery = ' & '.join(f'{token}:*' for token in tokens)
+            cursor.execute(
+                f"""
+                SELECT product_id FROM {PG_TABLE}
+                WHERE document @@ to_tsquery('simple', %s) {restrict.format(column='product_id')}
+                ORDER BY ts_rank(document, to_tsquery('simple', %s)) DESC
+                LIMIT %s
+                """,
+                [tsquery, *restrict_params, tsquery, limit],
+            )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def rank_by_ids(queryset, ids):
+    """
+    Restrict `queryset` to `ids`, annotated with `search_rank` (the position
+    in `ids`, 0 = best) and ordered by it.
+    """
+    if not ids:
+        return queryset.none().annotate(search_rank=Value(0, output_field=IntegerField()))
+    rank = Case(
+        *[When(id=pk, then=Value(position)) for position, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(id__in=ids).annotate(search_rank=rank).order_by('search_rank', 'id')
+
+
+def with_fuzzy_matches(ids, query, fuzzy_index):
+    """
+    Append trigram matches from `fuzzy_index` when the exact search found
+    fewer than SEARCH_FUZZY_MIN_RESULTS ids.
+    """
+    if len(ids) >= getattr(settings, 'SEARCH_FUZZY_MIN_RESULTS', 3):
+        return ids
+    seen = set(ids)
+    return ids + [pk for pk, _ in fuzzy_index.get().search(query) if pk not in seen]
+
+
+def search_products(queryset, query):
+    """
+    Filter a Product queryset down to the matches for `query`, annotated with
+    `search_rank` (0 = best match) and ordered by it. Misspelled queries
+    fall back to trigram similarity on product names. Apply other filters
+    first: only rows of `queryset` are ranked and counted.
+    """
+    ids = ranked_product_ids(query, queryset=queryset)
+    if ids is None:
+        return queryset.filter(
+            Q(name__icontains=query) | Q(description__icontains=query) | Q(category__name__icontains=query)
+        ).annotate(search_rank=Value(0, output_field=IntegerField())).order_by('search_rank', 'id')
+    return rank_by_ids(queryset, with_fuzzy_matches(ids, query, fuzzy_product_index))
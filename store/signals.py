@@ -0,0 +1,364 @@
+from collections import Counter
+
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver, Signal
+from django.utils import timezone
+
+from . import search, ratings, autocomplete, images, featured, facets, totals, customers
+from .trigrams import product_index as fuzzy_product_index
+from .conditional import bump_catalog_version
+from .lazyindex import bump_search_index_version
+from .models import Product, Category, Review, ProductImage, FeaturedProduct, Order, OrderItem
+
+# Sent with `products=[...]` after a bulk_create of products (which fires no
+# post_save), so derived data can be brought up to date in one pass.
+products_bulk_created = Signal()
+
+# Sent by store.checkout after commit with `product_ids` (stock taken with
+# queryset.update(), so no post_save) and `sold_out`, the (id, category_id,
+# price) rows that reached zero.
+stock_changed = Signal()
+
+
+# ----------------------------
+# Search index sync
+# ----------------------------
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    # Counter-only saves (e.g. views_count) don't change the indexed text
+    if update_fields and not search.INDEXED_FIELDS & set(update_fields):
+        return
+    search.index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+
+@receiver(products_bulk_created)
+def index_bulk_products(sender, products, **kwargs):
+    search.index_products(products)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, raw=False, **kwargs):
+    # A new category has no products yet; a rename changes every product's document
+    if raw or created:
+        return
+    search.index_products(instance.products.select_related('category'))
+
+
+# ----------------------------
+# Rating aggregates
+# ----------------------------
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, raw=False, **kwargs):
+    instance._previous_rating = None
+    if instance.pk and not raw:
+        instance._previous_rating = (
+            Review.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    ratings.review_changed(getattr(instance, '_previous_rating', None), (instance.product_id, instance.rating))
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_delete(sender, instance, **kwargs):
+    ratings.review_changed((instance.product_id, instance.rating), None)
+
+
+# ----------------------------
+# Autocomplete prefix index
+# ----------------------------
+@receiver(post_save, sender=Product)
+def update_product_suggestion(sender, instance, raw=False, **kwargs):
+    index = autocomplete.loaded_index()
+    if index is None or raw:
+        return
+    if instance.quantity > 0:
+        index.add(*autocomplete.product_entry(instance.pk, instance.name))
+    else:
+        index.remove(autocomplete.PRODUCT, instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_suggestion(sender, instance, **kwargs):
+    index = autocomplete.loaded_index()
+    if index is not None:
+        index.remove(autocomplete.PRODUCT, instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def update_category_suggestion(sender, instance, raw=False, **kwargs):
+    index = autocomplete.loaded_index()
+    if index is not None and not raw:
+        index.add(*autocomplete.category_entry(instance.pk, instance.name, instance.slug))
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_suggestion(sender, instance, **kwargs):
+    index = autocomplete.loaded_index()
+    if index is not None:
+        index.remove(autocomplete.CATEGORY, instance.pk)
+
+
+# ----------------------------
+# Trigram (typo-tolerant) index
+# ----------------------------
+@receiver(post_save, sender=Product)
+def update_fuzzy_product(sender, instance, raw=False, **kwargs):
+    index = fuzzy_product_index.loaded()
+    if index is None or raw:
+        return
+    if instance.quantity > 0:
+        index.add(instance.pk, instance.name)
+    else:
+        index.remove(instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def remove_fuzzy_product(sender, instance, **kwargs):
+    index = fuzzy_product_index.loaded()
+    if index is not None:
+        index.remove(instance.pk)
+
+
+@receiver(products_bulk_created)
+def reset_in_memory_indexes(sender, **kwargs):
+    # Cheaper to rebuild on next use than to insert a large batch one by one
+    autocomplete.reset_index()
+    fuzzy_product_index.reset()
+
+
+# ----------------------------
+# Search index version
+# ----------------------------
+# Tells other workers' in-memory indexes (store.lazyindex) to rebuild; only
+# changes to what they hold count, unlike the catalog version.
+def _search_fields(product):
+    return (product.name, product.category_id, bool(product.is_in_stock))
+
+
+@receiver(pre_save, sender=Product)
+def remember_search_fields(sender, instance, raw=False, **kwargs):
+    instance._previous_search_fields = None
+    if instance.pk and not raw:
+        instance._previous_search_fields = (
+            Product.objects.filter(pk=instance.pk).values_list('name', 'category_id', 'is_in_stock').first()
+        )
+
+
+@receiver(post_save, sender=Product)
+def product_search_changed(sender, instance, raw=False, **kwargs):
+    if not raw and getattr(instance, '_previous_search_fields', None) != _search_fields(instance):
+        bump_search_index_version()
+
+
+@receiver(post_delete, sender=Product)
+def product_search_removed(sender, instance, **kwargs):
+    if instance.is_in_stock:
+        bump_search_index_version()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_search_changed(sender, raw=False, **kwargs):
+    if not raw:
+        bump_search_index_version()
+
+
+@receiver(products_bulk_created)
+def bulk_search_changed(sender, products, **kwargs):
+    if any(product.is_in_stock for product in products):
+        bump_search_index_version()
+
+
+# ----------------------------
+# Image variants
+# ----------------------------
+# Uploads through store.images record variants up front; these catch images
+# set any other way (admin, shell) and rebuild only when the source changed.
+@receiver(post_save, sender=Product)
+def refresh_main_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or not instance.main_image or images.variants_current(instance.main_image_variants, instance.main_image):
+        return
+    instance.main_image_variants = images.build_variants(instance.main_image)
+    Product.objects.filter(pk=instance.pk).update(main_image_variants=instance.main_image_variants)
+
+
+@receiver(post_save, sender=ProductImage)
+def refresh_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or images.variants_current(instance.variants, instance.image):
+        return
+    instance.variants = images.build_variants(instance.image)
+    ProductImage.objects.filter(pk=instance.pk).update(variants=instance.variants)
+
+
+# ----------------------------
+# Catalog version (conditional GET)
+# ----------------------------
+# Anything rendered on home/product_list/product_detail invalidates their
+# ETags. views_count is written with update() and so is deliberately absent.
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def catalog_changed(sender, raw=False, **kwargs):
+    if not raw:
+        bump_catalog_version()
+
+
+@receiver(products_bulk_created)
+def catalog_bulk_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+# ----------------------------
+# Home page featured feed
+# ----------------------------
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=FeaturedProduct)
+@receiver(post_delete, sender=FeaturedProduct)
+def drop_featured_feed(sender, raw=False, **kwargs):
+    if not raw:
+        featured.invalidate_feed()
+
+
+@receiver(products_bulk_created)
+def drop_featured_feed_bulk(sender, **kwargs):
+    featured.invalidate_feed()
+
+
+# ----------------------------
+# Facet counters
+# ----------------------------
+@receiver(pre_save, sender=Product)
+def remember_facet_cell(sender, instance, raw=False, **kwargs):
+    instance._previous_facet_cell = None
+    if instance.pk and not raw:
+        row = Product.objects.filter(pk=instance.pk).values_list('category_id', 'price', 'is_in_stock').first()
+        if row:
+            instance._previous_facet_cell = facets.cell(*row)
+
+
+@receiver(post_save, sender=Product)
+def update_facet_counts(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Product.save() sets is_in_stock from quantity before this runs
+    new = facets.cell(instance.category_id, instance.price, instance.is_in_stock)
+    facets.product_moved(getattr(instance, '_previous_facet_cell', None), new)
+
+
+@receiver(post_delete, sender=Product)
+def remove_facet_count(sender, instance, **kwargs):
+    facets.product_moved(facets.cell(instance.category_id, instance.price, instance.is_in_stock), None)
+
+
+@receiver(products_bulk_created)
+def add_bulk_facet_counts(sender, products, **kwargs):
+    facets.products_added(products)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def drop_cached_facets(sender, raw=False, **kwargs):
+    # The cached sidebar carries category names and slugs
+    if not raw:
+        facets.invalidate()
+
+
+# ----------------------------
+# Checkout stock changes
+# ----------------------------
+@receiver(stock_changed)
+def refresh_after_checkout(sender, product_ids, sold_out, **kwargs):
+    bump_catalog_version()
+    if not sold_out:
+        return
+    deltas = Counter()
+    for pk, category_id, price in sold_out:
+        deltas[facets.cell(category_id, price, True)] -= 1
+        deltas[facets.cell(category_id, price, False)] += 1
+    facets.adjust(deltas)
+    featured.invalidate_feed()
+    bump_search_index_version()
+    suggestions, fuzzy = autocomplete.loaded_index(), fuzzy_product_index.loaded()
+    for pk, _, _ in sold_out:
+        if suggestions is not None:
+            suggestions.remove(autocomplete.PRODUCT, pk)
+        if fuzzy is not None:
+            fuzzy.remove(pk)
+
+
+# ----------------------------
+# Order totals
+# ----------------------------
+@receiver(post_save, sender=OrderItem)
+def update_total_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    totals.refresh_totals([instance.order_id])
+
+
+@receiver(post_delete, sender=OrderItem)
+def update_total_on_delete(sender, instance, **kwargs):
+    totals.refresh_totals([instance.order_id])
+
+
+# ----------------------------
+# Customer order summaries
+# ----------------------------
+@receiver(pre_save, sender=Order)
+def remember_previous_order_state(sender, instance, raw=False, **kwargs):
+    instance._previous_order_state = None
+    if instance.pk and not raw:
+        instance._previous_order_state = (
+            Order.objects.filter(pk=instance.pk).values_list('status', 'total_amount').first()
+        )
+
+
+@receiver(pre_save, sender=Order)
+def stamp_placed_at(sender, instance, raw=False, **kwargs):
+    # Counted once from here on by store.recommendations and store.featured,
+    # however the status moves later
+    if not raw and instance.placed_at is None and customers.is_placed(instance.status):
+        instance.placed_at = timezone.now()
+
+
+@receiver(post_save, sender=Order)
+def update_summary_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    customers.order_changed(
+        instance.user_id, getattr(instance, '_previous_order_state', None), (instance.status, instance.total_amount),
+    )
+
+
+@receiver(post_delete, sender=Order)
+def update_summary_on_delete(sender, instance, **kwargs):
+    customers.order_changed(instance.user_id, (instance.status, instance.total_amount), None)
+
+
+# ----------------------------
+# Stock reservations
+# ----------------------------
+@receiver(pre_delete, sender=Order)
+def release_reservations(sender, instance, **kwargs):
+    # The cascade would drop the holds without returning them to stock.
+    # Imported here because store.checkout imports this module.
+    from .checkout import release
+    release(instance)
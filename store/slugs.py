@@ -0,0 +1,54 @@
+"""
+Unique slug generation.
+
+A slug is the slugified name when that is free, otherwise the name plus a
+short random suffix. unique_slugs() does the same for a whole batch with one
+`slug__in` lookup per round, which is what bulk imports need.
+"""
+import string
+
+from django.utils.crypto import get_random_string
+from django.utils.text import slugify
+
+SUFFIX_LENGTH = 6
+
+
+def _base(name, max_length):
+    return slugify(name)[:max_length - SUFFIX_LENGTH - 1].strip('-') or 'item'
+
+
+def _suffixed(base):
+    return f'{base}-{get_random_string(SUFFIX_LENGTH, string.ascii_lowercase + string.digits)}'
+
+
+def unique_slug(model, name, exclude_pk=None):
+    max_length = model._meta.get_field('slug').max_length
+    base = _base(name, max_length)
+    slug = slugify(name)[:max_length].strip('-') or base
+    taken = model.objects.exclude(pk=exclude_pk) if exclude_pk else model.objects.all()
+    while taken.filter(slug=slug).exists():
+        slug = _suffixed(base)
+    return slug
+
+
+def unique_slugs(model, names):
+    """
+    Return one unique slug per name, unique among themselves and against
+    the table.
+    """
+    max_length = model._meta.get_field('slug').max_length
+    bases = [_base(name, max_length) for name in names]
+    slugs = [slugify(name)[:max_length].strip('-') or base for name, base in zip(names, bases)]
+    accepted = set()
+    pending = list(range(len(slugs)))
+    while pending:
+        taken = set(model.objects.filter(slug__in={slugs[i] for i in pending}).values_list('slug', flat=True))
+        retry = []
+        for i in pending:
+            if slugs[i] in taken or slugs[i] in accepted:
+                slugs[i] = _suffixed(bases[i])
+                retry.append(i)
+            else:
+                accepted.add(slugs[i])
+        pending = retry
+    return slugs
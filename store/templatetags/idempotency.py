@@ -0,0 +1,17 @@
+import uuid
+
+from django import template
+from django.utils.html import format_html
+
+from store.idempotency import FIELD
+
+register = template.Library()
+
+
+@register.simple_tag
+def idempotency_field():
+    """
+    Hidden idempotency key for a form; base.html replaces the value on every
+    page view so cached copies of the page don't share a key.
+    """
+    return format_html('<input type="hidden" name="{}" value="{}">', FIELD, uuid.uuid4().hex)
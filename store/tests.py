@@ -1,3 +1,1697 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+import cloudinary
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.core.cache import cache
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from PIL import Image as PILImage
+
+from helpcentre.models import FAQ, HelpCategory
+from helpcentre.search import faq_index
+
+from . import autocomplete, facets, featured, images, ratings, recommendations, search
+from .lazyindex import bump_search_index_version
+from .trigrams import product_index as fuzzy_product_index
+from .admission import Gate
+from .idempotency import idempotent
+from .counters import CacheViewCountBuffer, ViewCountBuffer
+from .checkout import OrderNotPending, OutOfStock, complete_order, expire_reservations, reserve
+from .customers import refresh_summaries
+from .models import Category, FacetCount, FeaturedProduct, IdempotencyKey, Order, OrderItem, Product, ProductImage, ProductRecommendation, Review, StockReservation
+from .pagination import CursorPaginator, encode_cursor
+
+
+# ----------------------------
+# Full-text search index stays in sync with products
+# ----------------------------
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.phones = Category.objects.create(name='Phones')
+        cls.cables = Category.objects.create(name='Cables')
+        cls.phone = Product.objects.create(
+            category=cls.phones, name='Galaxy handset', description='A fast phone', price=100, quantity=5,
+        )
+        cls.cable = Product.objects.create(
+            category=cls.cables, name='USB lead', description='Charges a galaxy handset', price=5, quantity=5,
+        )
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(search.ranked_product_ids('galaxy'), [self.phone.pk, self.cable.pk])
+
+    def test_words_match_as_prefixes(self):
+        self.assertEqual(search.ranked_product_ids('gal hand'), [self.phone.pk, self.cable.pk])
+        self.assertEqual(search.ranked_product_ids('usb'), [self.cable.pk])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.phone.name = 'Pixel handset'
+        self.phone.save()
+        self.assertEqual(search.ranked_product_ids('pixel'), [self.phone.pk])
+        self.assertEqual(search.ranked_product_ids('galaxy'), [self.cable.pk])
+
+        self.cable.delete()
+        self.assertEqual(search.ranked_product_ids('handset'), [self.phone.pk])
+
+    def test_category_rename_reindexes_its_products(self):
+        self.cables.name = 'Accessories'
+        self.cables.save()
+        self.assertEqual(search.ranked_product_ids('accessories'), [self.cable.pk])
+
+    def test_rebuild_matches_incremental_index(self):
+        before = search.ranked_product_ids('handset')
+        search.rebuild_index()
+        self.assertEqual(search.ranked_product_ids('handset'), before)
+
+    def test_product_list_orders_by_relevance(self):
+        cache.clear()
+        response = self.client.get(reverse('store:product_list'), {'q': 'galaxy'})
+        self.assertEqual([product.pk for product in response.context['products']], [self.phone.pk, self.cable.pk])
+
+
+# ----------------------------
+# Cursor pagination
+# ----------------------------
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Phones')
+        cls.products = [
+            Product.objects.create(category=category, name=f'Phone {i}', description='', price=100 + i % 3, quantity=1)
+            for i in range(7)
+        ]
+
+    def walk(self, ordering):
+        paginator = CursorPaginator(Product.objects.all(), 3, ordering)
+        page, seen = paginator.page(), []
+        while True:
+            seen.extend(product.pk for product in page)
+            if not page.has_next:
+                return seen, page
+            page = paginator.page(page.next_cursor)
+
+    def test_pages_cover_every_row_once_in_order(self):
+        seen, _ = self.walk(('price', 'id'))
+        expected = [p.pk for p in sorted(self.products, key=lambda p: (p.price, p.pk))]
+        self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_the_earlier_page(self):
+        paginator = CursorPaginator(Product.objects.all(), 3)
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        self.assertEqual([p.pk for p in paginator.page(second.previous_cursor)], [p.pk for p in first])
+        self.assertFalse(paginator.page(second.previous_cursor).has_previous)
+
+    def test_garbage_cursors_yield_the_first_page(self):
+        paginator = CursorPaginator(Product.objects.all(), 3, ('-price', '-id'))
+        first = [p.pk for p in paginator.page()]
+        for values in (['x', 'y'], [None, None], ['1.00', 'abc'], ['NaN', 1], [[1], {}], [1], [1, 2, 3]):
+            with self.subTest(values=values):
+                self.assertEqual([p.pk for p in paginator.page(encode_cursor('n', values))], first)
+        self.assertEqual([p.pk for p in paginator.page('not a cursor')], first)
+
+    def test_tampered_cursor_in_views_is_not_an_error(self):
+        cursor = encode_cursor('n', ['yesterday', 'x'])
+        cache.clear()
+        self.assertEqual(self.client.get(reverse('store:product_list'), {'cursor': cursor}).status_code, 200)
+        self.assertEqual(self.client.get(reverse('store:api_products'), {'cursor': cursor}).status_code, 200)
+        self.assertEqual(
+            self.client.get(reverse('store:product_list'), {'q': 'phone', 'cursor': encode_cursor('n', ['a', 'b'])}).status_code,
+            200,
+        )
+
+
+# ----------------------------
+# Product cards load in a fixed number of queries
+# ----------------------------
+class ListingQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Phones')
+
+    def add_products(self, count):
+        for i in range(count):
+            product = Product.objects.create(
+                category=self.category, name=f'Phone {i}', description='x' * 500, price=100, quantity=1,
+            )
+            for n in range(2):
+                name = f'phone_{product.pk}_{n}'
+                ProductImage.objects.create(
+                    product=product, image=name, variants={'source': images.source_key(name), 'thumb': f'/{name}.jpg'},
+                )
+
+    def listing_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('store:product_list'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        self.add_products(2)
+        few, _ = self.listing_queries()
+        self.add_products(6)
+        many, response = self.listing_queries()
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.context['products']), 8)
+
+    def test_cards_get_one_image_and_a_short_summary(self):
+        self.add_products(1)
+        product = Product.objects.for_listing().get()
+        self.assertEqual(len(product.listing_images), 1)
+        self.assertEqual(product.listing_images[0].image.public_id, f'phone_{product.pk}_0')
+        self.assertEqual(len(product.summary), 160)
+        self.assertIn('description', product.get_deferred_fields())
+
+
+# ----------------------------
+# Buffered product view counts
+# ----------------------------
+class ViewCountBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Phones')
+        cls.products = [
+            Product.objects.create(category=category, name=f'Phone {i}', description='', price=100, quantity=1)
+            for i in range(40)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def views(self):
+        return dict(Product.objects.values_list('id', 'views_count'))
+
+    def test_memory_buffer_flushes_at_the_threshold(self):
+        buffer = ViewCountBuffer(flush_interval=3600, flush_threshold=3)
+        first, second = self.products[:2]
+        buffer.add(first.pk)
+        buffer.add(second.pk)
+        self.assertEqual(self.views()[first.pk], 0)
+        with self.assertNumQueries(1):
+            buffer.add(first.pk)
+        self.assertEqual((self.views()[first.pk], self.views()[second.pk]), (2, 1))
+
+    def test_cache_buffer_keeps_every_product_registered_under_concurrency(self):
+        buffer = CacheViewCountBuffer(flush_interval=3600, flush_threshold=10 ** 6)
+        ids = [product.pk for product in self.products]
+
+        def hit(offset):
+            for pk in ids[offset:] + ids[:offset]:
+                buffer.add(pk)
+
+        threads = [threading.Thread(target=hit, args=(n * 5,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(buffer.flush(), 8 * len(ids))
+        self.assertEqual(set(self.views().values()), {8})
+
+    def test_cache_buffer_prunes_drained_products(self):
+        buffer = CacheViewCountBuffer(flush_interval=3600, flush_threshold=10 ** 6)
+        first, second = self.products[:2]
+        buffer.add(first.pk)
+        buffer.add(second.pk)
+        buffer.flush()
+        self.assertEqual(cache.get(CacheViewCountBuffer.DIRTY_KEY), set())
+
+        # A drained product registers again on its next hit
+        buffer.add(first.pk)
+        self.assertEqual(cache.get(CacheViewCountBuffer.DIRTY_KEY), {first.pk})
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual((self.views()[first.pk], self.views()[second.pk]), (2, 1))
+
+    def test_hits_during_a_flush_are_kept(self):
+        buffer = CacheViewCountBuffer(flush_interval=3600, flush_threshold=10 ** 6)
+        product = self.products[0]
+        buffer.add(product.pk)
+        read_counts = cache.get_many
+
+        def get_many_then_hit(keys):
+            counts = read_counts(keys)
+            if buffer._key(product.pk) in keys:
+                buffer.add(product.pk)  # lands between the read and the decrement
+            return counts
+
+        cache.get_many = get_many_then_hit
+        try:
+            self.assertEqual(buffer.flush(), 1)
+        finally:
+            del cache.get_many
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(self.views()[product.pk], 2)
+
+
+# ----------------------------
+# Review aggregates move with each review
+# ----------------------------
+class RatingAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Phones')
+        cls.phone = Product.objects.create(category=category, name='Phone', description='', price=100, quantity=1)
+        cls.tablet = Product.objects.create(category=category, name='Tablet', description='', price=200, quantity=1)
+        cls.user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='pass')
+
+    def aggregates(self, product):
+        product.refresh_from_db()
+        return (
+            product.rating_count, product.rating_sum, round(product.rating_avg, 2),
+            [getattr(product, field) for field in ratings.HISTOGRAM_FIELDS],
+        )
+
+    def test_create_update_and_delete_shift_the_aggregates(self):
+        five = Review.objects.create(product=self.phone, customer=self.user, rating=5)
+        three = Review.objects.create(product=self.phone, customer=self.user, rating=3)
+        self.assertEqual(self.aggregates(self.phone), (2, 8, 4.0, [0, 0, 1, 0, 1]))
+
+        three.rating = 4
+        three.save()
+        self.assertEqual(self.aggregates(self.phone), (2, 9, 4.5, [0, 0, 0, 1, 1]))
+
+        five.delete()
+        three.delete()
+        self.assertEqual(self.aggregates(self.phone), (0, 0, 0, [0, 0, 0, 0, 0]))
+
+    def test_moving_a_review_to_another_product(self):
+        review = Review.objects.create(product=self.phone, customer=self.user, rating=2)
+        review.product = self.tablet
+        review.save()
+        self.assertEqual(self.aggregates(self.phone), (0, 0, 0, [0, 0, 0, 0, 0]))
+        self.assertEqual(self.aggregates(self.tablet), (1, 2, 2.0, [0, 1, 0, 0, 0]))
+
+    def test_rebuild_matches_the_incremental_aggregates(self):
+        for rating in (1, 4, 4, 5):
+            Review.objects.create(product=self.phone, customer=self.user, rating=rating)
+        before = self.aggregates(self.phone)
+        Product.objects.update(rating_count=0, rating_sum=0, rating_avg=0)
+        ratings.rebuild_ratings()
+        self.assertEqual(self.aggregates(self.phone), before)
+        self.assertEqual(before[:3], (4, 14, 3.5))
+
+    @override_settings(PRODUCTS_PER_PAGE=1)
+    def test_top_rated_listing_pages_through_tied_averages(self):
+        tied = [self.phone, self.tablet, Product.objects.create(
+            category=self.phone.category, name='Laptop', description='', price=300, quantity=1,
+        )]
+        for product in tied:
+            for rating in (5, 4, 4):  # 13 / 3 is stored as 4.33
+                Review.objects.create(product=product, customer=self.user, rating=rating)
+        self.assertEqual(Product.objects.filter(rating_avg=Decimal('4.33')).count(), 3)
+
+        cache.clear()
+        seen, query = [], '?sort=rating'
+        while query:
+            page = self.client.get(reverse('store:product_list') + query).context['page']
+            seen.extend(product.pk for product in page)
+            query = getattr(page, 'next_query', None)
+        self.assertEqual(seen, sorted((product.pk for product in tied), reverse=True))
+
+
+# ----------------------------
+# "Customers also bought" from real orders
+# ----------------------------
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Phones')
+        cls.phone, cls.case, cls.charger, cls.cable = [
+            Product.objects.create(category=category, name=name, description='', price=10, quantity=50)
+            for name in ('Phone', 'Case', 'Charger', 'Cable')
+        ]
+        cls.user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='pass')
+
+    def buy(self, *products, complete=True):
+        order = Order.objects.create(user=self.user)
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+        if complete:
+            complete_order(order)
+        return order
+
+    def neighbours(self, product):
+        return list(
+            ProductRecommendation.objects.filter(product=product)
+            .order_by('-score', 'recommended_id').values_list('recommended_id', 'score')
+        )
+
+    def test_full_build_counts_orders_in_common(self):
+        self.buy(self.phone, self.case)
+        self.buy(self.phone, self.case, self.charger)
+        self.buy(self.phone, self.cable, complete=False)  # still a cart
+
+        run = recommendations.build_full()
+        self.assertEqual(run.orders_processed, 2)
+        self.assertEqual(self.neighbours(self.phone), [(self.case.pk, 2), (self.charger.pk, 1)])
+        self.assertEqual(self.neighbours(self.cable), [])
+        self.assertEqual(recommendations.recommended_products(self.phone), [self.case, self.charger])
+
+    def test_incremental_refresh_adds_newly_completed_orders(self):
+        self.buy(self.phone, self.case)
+        recommendations.build_full()
+        self.buy(self.phone, self.charger)
+        self.buy(self.phone, self.charger)
+
+        run = recommendations.refresh_incremental()
+        self.assertEqual(run.orders_processed, 2)
+        self.assertEqual(self.neighbours(self.phone), [(self.charger.pk, 2), (self.case.pk, 1)])
+        incremental = self.neighbours(self.phone)
+        recommendations.build_full()
+        self.assertEqual(self.neighbours(self.phone), incremental)
+
+    @override_settings(RECOMMENDATIONS_PER_PRODUCT=1)
+    def test_only_the_top_neighbours_are_kept(self):
+        self.buy(self.phone, self.case)
+        self.buy(self.phone, self.case, self.charger)
+        recommendations.build_full()
+        self.assertEqual(self.neighbours(self.phone), [(self.case.pk, 2)])
+
+    def test_paid_orders_count_and_cancelled_orders_do_not(self):
+        paid = self.buy(self.phone, self.case)
+        paid.status = 'paid'  # as the M-Pesa callback leaves it
+        paid.save()
+        cancelled = self.buy(self.phone, self.cable)
+        cancelled.status = 'cancelled'
+        cancelled.save()
+
+        run = recommendations.build_full()
+        self.assertEqual(run.orders_processed, 1)
+        self.assertEqual(self.neighbours(self.phone), [(self.case.pk, 1)])
+
+    def pay(self, *products):
+        # Paid outside complete_order, so completed_at stays empty
+        order = self.buy(*products, complete=False)
+        order.status = 'paid'
+        order.save()
+        return order
+
+    def test_orders_are_counted_once_however_their_status_moves(self):
+        paid = self.pay(self.phone, self.case)
+        recommendations.build_full()
+        self.assertEqual(self.neighbours(self.phone), [(self.case.pk, 1)])
+
+        paid.status, paid.completed_at = 'completed', timezone.now()
+        paid.save()
+        self.pay(self.phone, self.case)
+        run = recommendations.refresh_incremental()
+        self.assertEqual(run.orders_processed, 1)
+        self.assertEqual(self.neighbours(self.phone), [(self.case.pk, 2)])
+        recommendations.build_full()
+        self.assertEqual(self.neighbours(self.phone), [(self.case.pk, 2)])
+
+
+# ----------------------------
+# Autocomplete prefix index
+# ----------------------------
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.phones = Category.objects.create(name='Phones')
+        cls.galaxy = Product.objects.create(
+            category=cls.phones, name='Samsung Galaxy', description='', price=100, quantity=5,
+        )
+        Product.objects.create(category=cls.phones, name='Galaxy Tab', description='', price=100, quantity=0)
+
+    def setUp(self):
+        autocomplete.reset_index()
+        self.addCleanup(autocomplete.reset_index)
+
+    def labels(self, query):
+        response = self.client.get(reverse('store:autocomplete'), {'q': query})
+        return [result['label'] for result in response.json()['results']]
+
+    def test_matches_any_word_prefix_of_in_stock_products_and_categories(self):
+        self.assertEqual(self.labels('gal'), ['Samsung Galaxy'])
+        self.assertEqual(self.labels('SAMS'), ['Samsung Galaxy'])
+        self.assertEqual(self.labels('pho'), ['Phones'])
+        self.assertEqual(self.labels(''), [])
+
+    def test_signals_keep_this_workers_index_current(self):
+        autocomplete.get_index()
+        self.galaxy.name = 'Pixel'
+        self.galaxy.save()
+        self.assertEqual(self.labels('pix'), ['Pixel'])
+        self.assertEqual(self.labels('gal'), [])
+        self.galaxy.delete()
+        self.assertEqual(self.labels('pix'), [])
+
+    @override_settings(SEARCH_INDEX_CHECK_SECONDS=0)
+    def test_changes_from_other_workers_are_picked_up(self):
+        autocomplete.get_index()
+        # Another worker's write: no signal reaches this process, only the
+        # search index version in the database moves
+        Product.objects.filter(pk=self.galaxy.pk).update(name='Pixel')
+        bump_search_index_version()
+        self.assertEqual(self.labels('pix'), ['Pixel'])
+        self.assertEqual(self.labels('gal'), [])
+
+    @override_settings(SEARCH_INDEX_CHECK_SECONDS=0)
+    def test_writes_that_leave_the_index_alone_do_not_rebuild_it(self):
+        user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='pass')
+        index = autocomplete.get_index()
+        self.galaxy.price = 90
+        self.galaxy.save()
+        Review.objects.create(product=self.galaxy, customer=user, rating=5)
+        order = Order.objects.create(user=user)
+        OrderItem.objects.create(order=order, product=self.galaxy, quantity=1, price=self.galaxy.price)
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_order(order)  # stock left on the shelf
+        self.assertIs(autocomplete.get_index(), index)
+
+        self.galaxy.refresh_from_db()
+        self.galaxy.quantity = 0
+        self.galaxy.save()
+        self.assertIsNot(autocomplete.get_index(), index)
+
+    def test_version_is_only_read_every_check_interval(self):
+        autocomplete.get_index()
+        with self.assertNumQueries(0):
+            self.labels('gal')
+
+
+# ----------------------------
+# Typo-tolerant fallback search
+# ----------------------------
+class FuzzySearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.phones = Category.objects.create(name='Phones')
+        cls.galaxy = Product.objects.create(
+            category=cls.phones, name='Samsung Galaxy', description='', price=100, quantity=5,
+        )
+        help_category = HelpCategory.objects.create(name='Orders')
+        cls.faq = FAQ.objects.create(category=help_category, question='How do I track my order?', answer='...')
+
+    def setUp(self):
+        cache.clear()
+        for index in (fuzzy_product_index, faq_index):
+            index.reset()
+            self.addCleanup(index.reset)
+
+    def listed(self, **params):
+        response = self.client.get(reverse('store:product_list'), params)
+        return [product.pk for product in response.context['products']]
+
+    def test_misspelled_queries_fall_back_to_trigrams(self):
+        self.assertEqual(search.ranked_product_ids('samsng galxy'), [])
+        self.assertEqual(self.listed(q='samsng galxy'), [self.galaxy.pk])
+        response = self.client.get(reverse('helpcentre:help_centre'), {'q': 'trak ordr'})
+        self.assertEqual(list(response.context['faqs']), [self.faq])
+
+    def test_out_of_stock_exact_matches_do_not_suppress_the_fallback(self):
+        for i in range(3):
+            Product.objects.create(category=self.phones, name=f'Galaxi case {i}', description='', price=5, quantity=0)
+        # Three exact hits, all out of stock: the listing must still fall back
+        self.assertEqual(self.listed(q='galaxi'), [self.galaxy.pk])
+        self.assertEqual(len(self.listed(q='galaxi', stock='out')), 3)
+
+    def test_other_filters_apply_before_the_result_limit(self):
+        tablets = Category.objects.create(name='Tablets')
+        for i in range(3):
+            Product.objects.create(category=self.phones, name=f'Galaxy case {i}', description='', price=5, quantity=1)
+        tab = Product.objects.create(category=tablets, name='Galaxy Tab', description='', price=300, quantity=1)
+        with override_settings(SEARCH_RESULTS_LIMIT=2):
+            self.assertEqual(self.listed(q='galaxy', category=tablets.slug), [tab.pk])
+            self.assertEqual(self.listed(q='galaxy', min_price='200'), [tab.pk])
+
+    @override_settings(SEARCH_INDEX_CHECK_SECONDS=0)
+    def test_changes_from_other_workers_are_picked_up(self):
+        fuzzy_product_index.get()
+        faq_index.get()
+        # Written without signals, as another worker's save looks from here
+        Product.objects.filter(pk=self.galaxy.pk).update(name='Google Pixel')
+        bump_search_index_version()
+        FAQ.objects.filter(pk=self.faq.pk).update(question='Where is my parcel?')
+
+        self.assertEqual([pk for pk, _ in fuzzy_product_index.get().search('gogle pixl')], [self.galaxy.pk])
+        self.assertEqual(fuzzy_product_index.get().search('samsng galxy'), [])
+        self.assertEqual([pk for pk, _ in faq_index.get().search('wher parcl')], [self.faq.pk])
+
+    @override_settings(SEARCH_INDEX_CHECK_SECONDS=0)
+    def test_stock_and_review_writes_do_not_rebuild_the_product_index(self):
+        user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='pass')
+        index = fuzzy_product_index.get()
+        Review.objects.create(product=self.galaxy, customer=user, rating=4)
+        order = Order.objects.create(user=user)
+        OrderItem.objects.create(order=order, product=self.galaxy, quantity=2, price=self.galaxy.price)
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_order(order)
+        self.assertIs(fuzzy_product_index.get(), index)
+
+
+# ----------------------------
+# Streaming product import
+# ----------------------------
+class ImportProductsTests(TestCase):
+    def run_import(self, suffix, content, *args):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8') as handle:
+            handle.write(content)
+        self.addCleanup(os.remove, handle.name)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_products', handle.name, *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_csv_rows_are_inserted_in_chunks_with_categories_and_slugs(self):
+        out, _ = self.run_import('.csv', (
+            "name,price,category,quantity\n"
+            "Phone,100.50,Phones,3\n"
+            "Phone,90,Phones,0\n"
+            "Cable,5,Accessories,\n"
+        ), '--chunk-size', '2')
+        self.assertIn("Imported 3 products", out)
+        rows = list(Product.objects.order_by('id').values_list('name', 'category__name', 'price', 'quantity', 'is_in_stock'))
+        self.assertEqual(rows, [
+            ('Phone', 'Phones', Decimal('100.50'), 3, True),
+            ('Phone', 'Phones', Decimal('90.00'), 0, False),
+            ('Cable', 'Accessories', Decimal('5.00'), 0, False),
+        ])
+        self.assertEqual(len(set(Product.objects.values_list('slug', flat=True))), 3)
+        self.assertEqual(search.ranked_product_ids('cable'), [Product.objects.get(name='Cable').pk])
+
+    def test_bad_values_skip_the_row_not_the_run(self):
+        bad_prices = ['NaN', 'Infinity', '-Infinity', '1e20', '1.234', '-1', 'abc', '']
+        lines = [json.dumps({'name': f'Bad {price}', 'category': 'Phones', 'price': price}) for price in bad_prices]
+        lines += [
+            json.dumps({'name': 'Bad quantity', 'category': 'Phones', 'price': '1', 'quantity': -2}),
+            json.dumps({'name': 'No category', 'price': '1'}),
+            'not json',
+            json.dumps({'name': 'Good', 'category': 'Phones', 'price': 9999999999.99, 'quantity': '4'}),
+        ]
+        out, err = self.run_import('.jsonl', '\n'.join(lines) + '\n')
+        self.assertIn("Imported 1 products", out)
+        self.assertIn(f"{len(lines) - 1} rows skipped", out)
+        self.assertIn("invalid price 'NaN'", err)
+        self.assertIn("invalid price '1e20'", err)
+        self.assertEqual(list(Product.objects.values_list('name', 'price', 'quantity')), [
+            ('Good', Decimal('9999999999.99'), 4),
+        ])
+
+
+# ----------------------------
+# Staff streaming exports
+# ----------------------------
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Phones')
+        cls.phone = Product.objects.create(category=category, name='Phone, "Pro"', description='', price=100, quantity=2)
+        users = get_user_model().objects
+        cls.staff = users.create_user(username='staff', email='staff@example.com', password='pass', is_staff=True)
+        cls.customer = users.create_user(username='bob', email='bob@example.com', password='pass')
+        order = Order.objects.create(user=cls.customer)
+        OrderItem.objects.create(order=order, product=cls.phone, quantity=2, price=100)
+
+    def export(self, name, **params):
+        response = self.client.get(reverse(f'store:{name}'), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_products_csv_streams_a_header_and_quoted_rows(self):
+        self.client.force_login(self.staff)
+        response, body = self.export('export_products')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="products-', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0][:3], ['id', 'name', 'slug'])
+        self.assertEqual(rows[1][:2], [str(self.phone.pk), 'Phone, "Pro"'])
+        self.assertEqual(len(rows), 2)
+
+    def test_orders_jsonl_has_one_object_per_line_item(self):
+        self.client.force_login(self.staff)
+        _, body = self.export('export_orders', format='jsonl')
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(lines), 1)
+        self.assertEqual((lines[0]['customer'], lines[0]['quantity'], lines[0]['order_total']), ('bob', 2, '200.00'))
+
+    def test_date_range_filters_and_bad_input(self):
+        self.client.force_login(self.staff)
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        _, body = self.export('export_products', start=tomorrow)
+        self.assertEqual(len(body.splitlines()), 1)  # header only
+        _, body = self.export('export_products', end=timezone.localdate().isoformat())
+        self.assertEqual(len(body.splitlines()), 2)
+        self.assertEqual(self.client.get(reverse('store:export_products'), {'start': '2024-13-40'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('store:export_products'), {'format': 'xml'}).status_code, 400)
+
+    def test_staff_only(self):
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get(reverse('store:export_orders')).status_code, 302)
+
+
+# ----------------------------
+# Concurrent image uploads (local backend)
+# ----------------------------
+def use_test_cloudinary(test):
+    """
+    Give cloudinary a cloud name for the test, so URL building doesn't
+    depend on CLOUDINARY_CLOUD_NAME in the environment.
+    """
+    previous = cloudinary.config().cloud_name
+    cloudinary.config(cloud_name='test-cloud')
+    test.addCleanup(cloudinary.config, cloud_name=previous)
+
+
+def image_file(name, size=(800, 400)):
+    buffer = io.BytesIO()
+    PILImage.new('RGB', size, 'red').save(buffer, format='JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Phones')
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings_override = override_settings(IMAGE_UPLOAD_BACKEND='local', MEDIA_ROOT=media, MEDIA_URL='/media/')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media = media
+        use_test_cloudinary(self)
+
+    def make_product(self, main=None):
+        return Product(category=self.category, name='Phone', description='', price=100, quantity=1, main_image=main)
+
+    def test_main_and_additional_images_upload_and_resolve_to_media_urls(self):
+        product = self.make_product(image_file('main.JPG'))
+        with CaptureQueriesContext(connection) as queries:
+            failed = images.save_with_images(product, [image_file('a.jpg'), image_file('b.jpg')])
+        self.assertEqual(failed, 0)
+        image_writes = [q['sql'] for q in queries.captured_queries if 'store_productimage' in q['sql']]
+        self.assertEqual(len(image_writes), 1)  # one bulk INSERT, and variants weren't rebuilt by signals
+        # The catalog version moves after the images land, so no ETag outlives them
+        statements = [q['sql'] for q in queries.captured_queries]
+        insert = max(i for i, sql in enumerate(statements) if 'store_productimage' in sql)
+        self.assertTrue(any(sql.startswith('UPDATE "store_catalogversion"') for sql in statements[insert:]))
+
+        product = Product.objects.get(pk=product.pk)
+        self.assertTrue(product.main_image_url.startswith('/media/local/product_images/'))
+        self.assertTrue(os.path.exists(os.path.join(self.media, images.local_name(product.main_image))))
+        self.assertTrue(product.main_image_thumb.endswith('_thumb.jpg'))
+        additional = list(product.additional_images.all())
+        self.assertEqual(len(additional), 2)
+        for image in additional:
+            self.assertTrue(image.image_url.startswith('/media/local/product_images/'))
+            self.assertTrue(image.thumb.startswith('/media/local/product_images/'))
+
+        response = self.client.get(reverse('store:product_detail', args=[product.pk]))
+        self.assertContains(response, product.main_image_variants['large'])
+        self.assertContains(response, additional[0].variants['large'])
+        self.assertNotContains(response, 'res.cloudinary.com')
+
+    def test_failed_additional_uploads_are_counted(self):
+        class FlakyBackend(images.LocalBackend):
+            def upload(self, file):
+                if file.name.startswith('bad'):
+                    raise OSError("upload failed")
+                return super().upload(file)
+
+        product = self.make_product()
+        with self.assertLogs('store.images', 'ERROR'):
+            failed = images.save_with_images(product, [image_file('good.jpg'), image_file('bad.jpg')], backend=FlakyBackend())
+        self.assertEqual(failed, 1)
+        self.assertEqual(product.additional_images.count(), 1)
+
+        with self.assertLogs('store.images', 'ERROR'), self.assertRaises(images.ImageUploadError):
+            images.save_with_images(self.make_product(image_file('bad-main.jpg')), [], backend=FlakyBackend())
+
+    def test_cloudinary_references_still_build_cloudinary_urls(self):
+        product = self.make_product('sample.jpg')
+        self.assertIn('/image/upload/', product.main_image_url)
+        self.assertIsNone(images.local_name(product.main_image))
+
+
+# ----------------------------
+# Responsive image variants
+# ----------------------------
+class ImageVariantTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Phones')
+
+    def setUp(self):
+        use_test_cloudinary(self)
+
+    def test_cloudinary_variants_are_width_limited_transformations(self):
+        variants = images.build_variants('sample.jpg', images.CloudinaryBackend())
+        self.assertEqual(variants['source'], images.source_key('sample.jpg'))
+        for name, width in images.VARIANT_WIDTHS.items():
+            self.assertIn(f'w_{width}', variants[name])
+            self.assertIn('c_limit', variants[name])
+        self.assertEqual(
+            images.srcset(variants),
+            f"{variants['thumb']} 200w, {variants['medium']} 600w, {variants['large']} 1200w",
+        )
+
+    @override_settings(IMAGE_UPLOAD_BACKEND='cloudinary')
+    def test_variants_follow_the_source_image(self):
+        product = Product.objects.create(
+            category=self.category, name='Phone', description='', price=100, quantity=1, main_image='first.jpg',
+        )
+        product.refresh_from_db()
+        self.assertTrue(images.variants_current(product.main_image_variants, product.main_image))
+        self.assertIn('first', product.main_image_variants['thumb'])
+
+        product.main_image = 'second.jpg'
+        product.save()
+        product.refresh_from_db()
+        self.assertIn('second', product.main_image_variants['thumb'])
+        self.assertEqual(product.main_image_thumb, product.main_image_variants['thumb'])
+
+    @override_settings(IMAGE_UPLOAD_BACKEND='local')
+    def test_variants_come_from_the_backend_that_owns_the_image(self):
+        # Uploads now go to MEDIA_ROOT, but older images still live in Cloudinary
+        product = Product.objects.create(
+            category=self.category, name='Phone', description='', price=100, quantity=1, main_image='legacy.jpg',
+        )
+        image = ProductImage.objects.create(product=product, image='legacy-side.jpg')
+        product.refresh_from_db()
+        image.refresh_from_db()
+        self.assertIn('/image/upload/', product.main_image_variants['thumb'])
+        self.assertIn('legacy-side', image.variants['thumb'])
+
+    def test_listing_renders_srcset(self):
+        variants = images.build_variants('sample.jpg', images.CloudinaryBackend())
+        Product.objects.create(
+            category=self.category, name='Phone', description='', price=100, quantity=1,
+            main_image='sample.jpg', main_image_variants=variants,
+        )
+        cache.clear()
+        response = self.client.get(reverse('store:product_list'))
+        self.assertContains(response, f'srcset="{images.srcset(variants)}"')
+        self.assertEqual(images.public_variants(variants), {name: variants[name] for name in images.VARIANT_WIDTHS})
+
+
+# ----------------------------
+# Conditional GET on catalog pages
+# ----------------------------
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Phones')
+        cls.phone = Product.objects.create(category=cls.category, name='Phone', description='', price=100, quantity=1)
+        cls.user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='pass')
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        return first['ETag'], self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code
+
+    def test_unchanged_pages_answer_304(self):
+        for url in (reverse('store:home'), reverse('store:product_list'), reverse('store:product_detail', args=[self.phone.pk])):
+            with self.subTest(url=url):
+                _, status = self.revalidate(url)
+                self.assertEqual(status, 304)
+
+    def test_catalog_changes_invalidate_the_etag(self):
+        url = reverse('store:product_list')
+        etag, _ = self.revalidate(url)
+        Product.objects.create(category=self.category, name='Tablet', description='', price=200, quantity=1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_product_edit_invalidates_its_page_but_views_do_not(self):
+        url = reverse('store:product_detail', args=[self.phone.pk])
+        etag, _ = self.revalidate(url)
+        Product.objects.filter(pk=self.phone.pk).update(views_count=50)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.phone.price = 90
+        self.phone.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depends_on_the_viewer(self):
+        url = reverse('store:product_list')
+        anonymous, _ = self.revalidate(url)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=anonymous).status_code, 200)
+
+    def test_pages_with_flash_messages_are_not_conditional(self):
+        self.client.force_login(self.user)
+        url = reverse('store:product_list')
+        etag, _ = self.revalidate(url)
+        self.client.post(reverse('store:toggle_wishlist', args=[self.phone.pk]))  # queues a message
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+
+# ----------------------------
+# JSON catalog API
+# ----------------------------
+class CatalogApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.phones = Category.objects.create(name='Phones')
+        cls.products = [
+            Product.objects.create(category=cls.phones, name=f'Phone {i}', description='d' * 300, price=100 + i, quantity=1)
+            for i in range(5)
+        ]
+        Product.objects.create(category=cls.phones, name='Sold out', description='', price=1, quantity=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, name, *args, **params):
+        return self.client.get(reverse(f'store:{name}', args=args), params)
+
+    def test_sparse_fieldsets_select_only_the_requested_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get('api_products', fields='id,name,summary')
+        results = response.json()['results']
+        self.assertEqual(set(results[0]), {'id', 'name', 'summary'})
+        self.assertEqual(len(results[0]['summary']), 160)
+        page_sql = [q['sql'] for q in queries.captured_queries if 'FROM "store_product"' in q['sql']]
+        self.assertTrue(page_sql and all('"price"' not in sql.split(' FROM ')[0] for sql in page_sql))
+
+    def test_unknown_fields_and_bad_limits_are_400(self):
+        response = self.get('api_products', fields='id,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['error'])
+        self.assertEqual(self.get('api_products', limit='x').status_code, 400)
+        self.assertEqual(self.get('api_products', limit='0').status_code, 400)
+
+    def test_cursor_pages_cover_the_in_stock_listing(self):
+        seen, params = [], {'limit': 2, 'sort': 'price_asc', 'fields': 'id'}
+        url = reverse('store:api_products')
+        while url:
+            data = self.client.get(url, params).json()
+            seen.extend(row['id'] for row in data['results'])
+            url, params = data['next'], None
+        self.assertEqual(seen, [product.pk for product in self.products])
+
+    def test_detail_extras_and_404(self):
+        product = self.products[0]
+        data = self.get('api_product_detail', product.pk, fields='name,url,images').json()
+        self.assertEqual(data, {'name': product.name, 'url': reverse('store:product_detail', args=[product.pk]), 'images': []})
+        self.assertEqual(self.get('api_product_detail', 0).status_code, 404)
+
+    def test_categories_count_in_stock_products(self):
+        data = self.get('api_categories').json()['results']
+        self.assertEqual(data, [{'id': self.phones.pk, 'name': 'Phones', 'slug': self.phones.slug, 'product_count': 5}])
+
+    def test_responses_are_public_and_revalidate(self):
+        response = self.get('api_products')
+        self.assertIn('public', response['Cache-Control'])
+        again = self.client.get(reverse('store:api_products'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+
+# ----------------------------
+# Cached featured feed on the home page
+# ----------------------------
+@override_settings(FEATURED_PRODUCTS_COUNT=3, FEATURED_SALES_WEIGHT=20)
+class FeaturedFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Phones')
+        cls.curated, cls.viewed, cls.sold, cls.plain = [
+            Product.objects.create(category=category, name=name, description='', price=100, quantity=10)
+            for name in ('Curated', 'Viewed', 'Sold', 'Plain')
+        ]
+        Product.objects.create(category=category, name='Sold out', description='', price=1, quantity=0, views_count=10 ** 6)
+        Product.objects.filter(pk=cls.viewed.pk).update(views_count=30)
+        FeaturedProduct.objects.create(product=cls.curated, position=1)
+        cls.user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='pass')
+
+    def setUp(self):
+        cache.clear()
+
+    def sell(self, product, quantity):
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product=product, quantity=quantity, price=product.price)
+        complete_order(order)
+
+    def names(self):
+        return [entry['name'] for entry in featured.get_feed()]
+
+    def test_curated_slots_come_first_then_views_plus_weighted_sales(self):
+        self.sell(self.sold, 2)  # 2 * 20 = 40 beats 30 views
+        self.assertEqual(self.names(), ['Curated', 'Sold', 'Viewed'])
+
+    def test_feed_is_served_from_the_cache_until_the_catalog_changes(self):
+        self.names()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(), ['Curated', 'Viewed', 'Plain'])
+        self.viewed.quantity = 0
+        self.viewed.save()
+        self.assertEqual(self.names(), ['Curated', 'Plain', 'Sold'])
+
+    def test_paid_orders_count_as_sales(self):
+        self.sell(self.sold, 2)
+        order = Order.objects.get(items__product=self.sold)
+        order.status = 'paid'
+        order.save()
+        self.assertEqual(self.names(), ['Curated', 'Sold', 'Viewed'])
+
+    def test_home_page_renders_the_feed(self):
+        response = self.client.get(reverse('store:home'))
+        self.assertContains(response, 'Curated')
+        self.assertNotContains(response, 'Sold out')
+
+
+# ----------------------------
+# Facet counters for the product listing sidebar
+# ----------------------------
+class FacetCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.phones = Category.objects.create(name='Phones')
+        cls.laptops = Category.objects.create(name='Laptops')
+        cls.phone = Product.objects.create(category=cls.phones, name='Phone', description='', price=500, quantity=1)
+        Product.objects.create(category=cls.phones, name='Case', description='', price=200, quantity=0)
+        Product.objects.create(category=cls.laptops, name='Laptop', description='', price=60000, quantity=4)
+        cls.user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='pass')
+
+    def setUp(self):
+        cache.clear()
+
+    def counts(self):
+        return {
+            (category_id, band, in_stock): count
+            for category_id, band, in_stock, count in
+            FacetCount.objects.filter(count__gt=0).values_list('category_id', 'price_band', 'in_stock', 'count')
+        }
+
+    def assertMatchesRebuild(self):
+        incremental = self.counts()
+        facets.rebuild()
+        self.assertEqual(incremental, self.counts())
+
+    def test_counters_follow_create_edit_and_delete(self):
+        self.assertEqual(self.counts(), {
+            (self.phones.pk, 'under-1000', True): 1,
+            (self.phones.pk, 'under-1000', False): 1,
+            (self.laptops.pk, '50000-plus', True): 1,
+        })
+        self.phone.price = 6000
+        self.phone.save()
+        self.assertEqual(self.counts()[(self.phones.pk, '5000-19999', True)], 1)
+        self.assertNotIn((self.phones.pk, 'under-1000', True), self.counts())
+        self.phone.quantity = 0
+        self.phone.save()
+        self.assertEqual(self.counts()[(self.phones.pk, '5000-19999', False)], 1)
+        self.phone.delete()
+        self.assertNotIn((self.phones.pk, '5000-19999', False), self.counts())
+        self.assertMatchesRebuild()
+
+    def test_checkout_selling_out_a_product_moves_its_count(self):
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product=self.phone, quantity=1, price=self.phone.price)
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_order(order)
+        self.assertEqual(self.counts()[(self.phones.pk, 'under-1000', False)], 2)
+        self.assertNotIn((self.phones.pk, 'under-1000', True), self.counts())
+        self.assertMatchesRebuild()
+
+    def test_bulk_import_adds_counts(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as handle:
+            handle.write("name,price,category,quantity\nTablet,25000,Phones,2\nCharger,300,Phones,5\n")
+        self.addCleanup(os.remove, handle.name)
+        call_command('import_products', handle.name, stdout=io.StringIO())
+        self.assertEqual(self.counts()[(self.phones.pk, '20000-49999', True)], 1)
+        self.assertEqual(self.counts()[(self.phones.pk, 'under-1000', True)], 2)
+        self.assertMatchesRebuild()
+
+    def test_rebuild_command_repairs_drifted_counters(self):
+        FacetCount.objects.update(count=42)
+        call_command('rebuild_facets', stdout=io.StringIO())
+        self.assertEqual(sum(self.counts().values()), 3)
+
+    def test_facets_are_cached_until_a_counter_changes(self):
+        facets.get_facets()
+        with self.assertNumQueries(0):
+            facets.get_facets()
+        Product.objects.create(category=self.laptops, name='Netbook', description='', price=20000, quantity=1)
+        self.assertEqual(facets.get_facets()['cells'][(self.laptops.pk, '20000-49999', True)], 1)
+
+    def test_sidebar_counts_are_narrowed_by_the_other_facets(self):
+        response = self.client.get(reverse('store:product_list'), {'category': self.phones.slug})
+        sidebar = response.context['facets']
+        self.assertEqual(
+            {c['name']: c['count'] for c in sidebar['categories']},
+            {'Phones': 1, 'Laptops': 1},
+        )
+        self.assertEqual({b['key']: b['count'] for b in sidebar['price_bands']}['under-1000'], 1)
+        self.assertEqual({s['key']: s['count'] for s in sidebar['stock']}, {'': 1, 'out': 1, 'all': 2})
+
+
+# ----------------------------
+# Product listing sorts use the composite indexes
+# ----------------------------
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN is SQLite syntax")
+class ProductListQueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        phones = Category.objects.create(name='Phones')
+        laptops = Category.objects.create(name='Laptops')
+        for i in range(30):
+            Product.objects.create(
+                category=phones if i % 2 else laptops,
+                name=f'Product {i}',
+                description='A product',
+                price=100 + i,
+                quantity=i % 3,
+            )
+
+    def listing_plan(self, **params):
+        """
+        Run product_list and return the EXPLAIN QUERY PLAN of its page query.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('store:product_list'), params)
+        self.assertEqual(response.status_code, 200)
+        page_queries = [
+            q['sql'] for q in queries.captured_queries
+            if q['sql'].startswith('SELECT') and 'FROM "store_product"' in q['sql'] and 'LIMIT' in q['sql']
+        ]
+        self.assertEqual(len(page_queries), 1, page_queries)
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + page_queries[0])
+            return ' | '.join(row[-1] for row in cursor.fetchall())
+
+    def assertUsesIndex(self, plan, index):
+        self.assertIn(index, plan)
+        self.assertNotIn('TEMP B-TREE', plan, "ordering was not served by the index")
+
+    def test_default_sort_uses_created_index(self):
+        self.assertUsesIndex(self.listing_plan(), 'product_instock_created_idx')
+
+    def test_price_sorts_use_price_index(self):
+        self.assertUsesIndex(self.listing_plan(sort='price_asc'), 'product_instock_price_idx')
+        self.assertUsesIndex(self.listing_plan(sort='price_desc'), 'product_instock_price_idx')
+
+    def test_price_range_uses_price_index(self):
+        plan = self.listing_plan(sort='price_asc', min_price='105', max_price='120')
+        self.assertUsesIndex(plan, 'product_instock_price_idx')
+        self.assertIn('price>? AND price<?', plan)
+
+    def test_popularity_and_rating_sorts(self):
+        self.assertUsesIndex(self.listing_plan(sort='popular'), 'product_instock_views_idx')
+        self.assertUsesIndex(self.listing_plan(sort='rating'), 'product_instock_rating_idx')
+
+    def test_category_filter_uses_category_indexes(self):
+        self.assertUsesIndex(self.listing_plan(category='Phones'), 'product_cat_created_idx')
+        self.assertUsesIndex(self.listing_plan(category='Phones', sort='price_asc'), 'product_cat_price_idx')
+
+    def test_filters_and_order(self):
+        response = self.client.get(reverse('store:product_list'), {'sort': 'price_desc', 'max_price': '110'})
+        prices = [product.price for product in response.context['products']]
+        self.assertEqual(prices, sorted(prices, reverse=True))
+        self.assertTrue(prices and max(prices) <= 110)
+        self.assertTrue(all(product.quantity > 0 for product in response.context['products']))
+
+
+# ----------------------------
+# Checkout takes stock atomically
+# ----------------------------
+class CheckoutTests(TransactionTestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Phones')
+        self.users = get_user_model().objects
+
+    def make_order(self, username, *lines):
+        user = self.users.create_user(username=username, email=f'{username}@example.com', password='pass')
+        order = Order.objects.create(user=user)
+        for product, quantity in lines:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity, price=product.price)
+        return order
+
+    def make_product(self, name, quantity):
+        return Product.objects.create(category=self.category, name=name, description='', price=1000, quantity=quantity)
+
+    def test_concurrent_checkouts_never_oversell(self):
+        stock, buyers = 5, 20
+        product = self.make_product('Phone', stock)
+        orders = [self.make_order(f'buyer{i}', (product, 1)) for i in range(buyers)]
+        results, start = [], threading.Barrier(buyers)
+
+        def checkout(order):
+            start.wait()
+            try:
+                complete_order(order)
+                results.append('ok')
+            except OutOfStock:
+                results.append('out')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(order,)) for order in orders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(results.count('ok'), stock)
+        self.assertEqual(results.count('out'), buyers - stock)
+        self.assertEqual(product.quantity, 0)
+        self.assertFalse(product.is_in_stock)
+        self.assertEqual(Order.objects.filter(status='completed').count(), stock)
+        self.assertEqual(Order.objects.filter(status='pending').count(), buyers - stock)
+        # The sold-out product moved to the out-of-stock facet cell
+        self.assertEqual(FacetCount.objects.get(category=self.category, in_stock=False).count, 1)
+        self.assertEqual(FacetCount.objects.get(category=self.category, in_stock=True).count, 0)
+
+    def test_short_line_fails_the_whole_order(self):
+        plenty, scarce = self.make_product('Case', 10), self.make_product('Charger', 1)
+        order = self.make_order('buyer', (plenty, 3), (scarce, 2))
+
+        with self.assertRaises(OutOfStock) as caught:
+            complete_order(order)
+
+        self.assertEqual([line[0] for line in caught.exception.shortages], [scarce.pk])
+        plenty.refresh_from_db()
+        scarce.refresh_from_db()
+        order.refresh_from_db()
+        self.assertEqual((plenty.quantity, scarce.quantity), (10, 1))
+        self.assertEqual(order.status, 'pending')
+        self.assertIsNone(order.completed_at)
+
+    def test_order_completes_once(self):
+        product = self.make_product('Phone', 5)
+        order = self.make_order('buyer', (product, 2))
+
+        complete_order(order)
+        with self.assertRaises(OrderNotPending):
+            complete_order(order)
+
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 3)
+        self.assertTrue(product.is_in_stock)
+
+
+# ----------------------------
+# Cart and checkout totals
+# ----------------------------
+class CartTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Phones')
+        cls.products = [
+            Product.objects.create(category=category, name=f'Phone {i}', description='', price=100 * (i + 1), quantity=10)
+            for i in range(5)
+        ]
+        cls.user = get_user_model().objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.order = Order.objects.create(user=self.user)
+
+    def add(self, product, quantity=1):
+        return OrderItem.objects.create(order=self.order, product=product, quantity=quantity, price=product.price)
+
+    def cart_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('store:cart'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_total_follows_item_changes(self):
+        first = self.add(self.products[0], 2)
+        self.add(self.products[1], 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, 400)
+
+        first.quantity = 5
+        first.save()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, 700)
+
+        first.delete()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, 200)
+
+    def test_cart_query_count_is_fixed(self):
+        self.add(self.products[0])
+        _, one_item = self.cart_queries()
+        for product in self.products[1:]:
+            self.add(product, 2)
+        response, five_items = self.cart_queries()
+        self.assertEqual(one_item, five_items)
+        self.assertEqual(response.context['total'], 100 + 2 * (200 + 300 + 400 + 500))
+
+    def test_checkout_get_does_not_write(self):
+        self.add(self.products[0], 3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('store:checkout'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['order'].total_amount, 300)
+        writes = [q['sql'] for q in queries.captured_queries if not q['sql'].startswith('SELECT')]
+        self.assertFalse([sql for sql in writes if 'store_' in sql], writes)
+
+
+# ----------------------------
+# Cookie cart
+# ----------------------------
+class CookieCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Phones')
+        cls.phone = Product.objects.create(category=category, name='Phone', description='', price=500, quantity=10)
+        cls.case = Product.objects.create(category=category, name='Case', description='', price=50, quantity=10)
+        cls.user = get_user_model().objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+
+    def add(self, product):
+        return self.client.post(reverse('store:add_to_cart', args=[product.pk]))
+
+    def test_adding_writes_nothing(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.add(self.phone)
+            self.add(self.phone)
+            self.add(self.case)
+        self.assertFalse([q['sql'] for q in queries.captured_queries if not q['sql'].startswith('SELECT')])
+        self.assertFalse(Order.objects.exists())
+
+        response = self.client.get(reverse('store:cart'))
+        self.assertEqual(response.context['total'], 2 * 500 + 50)
+
+    def test_tampered_cookie_is_ignored(self):
+        self.add(self.phone)
+        self.client.cookies['cart'] = f'{self.case.pk}:5'
+        self.assertEqual(self.client.get(reverse('store:cart')).context['items'], [])
+
+    def test_login_merges_cart_into_pending_order(self):
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product=self.phone, quantity=1, price=self.phone.price)
+        self.add(self.phone)
+        self.add(self.case)
+
+        response = self.client.post(reverse('accounts:login'), {'username': 'buyer@example.com', 'password': 'pass'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.cookies['cart'].value, '')
+
+        order.refresh_from_db()
+        self.assertEqual(dict(order.items.values_list('product_id', 'quantity')), {self.phone.pk: 2, self.case.pk: 1})
+        self.assertEqual(order.total_amount, 2 * 500 + 50)
+
+    def test_adding_needs_a_post(self):
+        response = self.client.get(reverse('store:add_to_cart', args=[self.phone.pk]))
+        self.assertEqual(response.status_code, 405)
+        self.assertNotIn('cart', response.cookies)
+
+    def test_checkout_get_shows_the_cookie_cart_without_writing(self):
+        self.client.force_login(self.user)
+        self.add(self.case)
+        self.add(self.case)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('store:checkout'))
+        self.assertTemplateUsed(response, 'store/cart.html')
+        self.assertEqual(response.context['total'], 100)
+        writes = [q['sql'] for q in queries.captured_queries if not q['sql'].startswith('SELECT')]
+        self.assertFalse([sql for sql in writes if 'store_' in sql], writes)
+        self.assertFalse(Order.objects.exists())
+
+    def test_place_order_persists_cart_once(self):
+        self.client.force_login(self.user)
+        self.add(self.case)
+        self.add(self.case)
+
+        response = self.client.post(reverse('store:start_checkout'))
+        self.assertRedirects(response, reverse('store:checkout'))
+        order = Order.objects.get(user=self.user, status='pending')
+        self.assertEqual(order.total_amount, 100)
+        # The cookie was cleared, so checkout now shows the order
+        self.assertEqual(self.client.get(reverse('store:checkout')).context['order'], order)
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, 100)
+
+
+# ----------------------------
+# Batch cart changes and reorder
+# ----------------------------
+class CartBatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Phones')
+        cls.products = [
+            Product.objects.create(category=category, name=f'Phone {i}', description='', price=100 * (i + 1), quantity=10)
+            for i in range(4)
+        ]
+        cls.sold_out = Product.objects.create(category=category, name='Sold out', description='', price=1, quantity=0)
+        cls.user = get_user_model().objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def batch(self, changes):
+        return self.client.post(reverse('store:cart_batch'), {'changes': changes}, content_type='application/json')
+
+    def test_changes_apply_in_one_request(self):
+        first, second, third, fourth = self.products
+        self.batch([{'product_id': p.pk, 'quantity': 2} for p in (first, second, third)])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.batch([
+                {'product_id': first.pk, 'quantity': 1, 'op': 'add'},
+                {'product_id': second.pk, 'quantity': 5, 'op': 'set'},
+                {'product_id': third.pk, 'op': 'remove'},
+                {'product_id': fourth.pk, 'quantity': 1},
+                {'product_id': self.sold_out.pk, 'quantity': 1},
+            ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['skipped'], [self.sold_out.pk])
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "store_orderitem"')]
+        self.assertEqual(len(inserts), 1)
+
+        order = Order.objects.get(user=self.user, status='pending')
+        self.assertEqual(
+            dict(order.items.values_list('product_id', 'quantity')),
+            {first.pk: 3, second.pk: 5, fourth.pk: 1},
+        )
+        self.assertEqual(order.total_amount, 3 * 100 + 5 * 200 + 400)
+
+    def test_invalid_changes_are_rejected(self):
+        for changes in ([], [{'product_id': 'x'}], [{'product_id': 1, 'op': 'double'}], [{'product_id': 1, 'quantity': 0}]):
+            self.assertEqual(self.batch(changes).status_code, 400, changes)
+        self.assertFalse(Order.objects.exists())
+
+    def test_reorder_adds_past_lines_to_cart(self):
+        past = Order.objects.create(user=self.user, status='completed')
+        for product in self.products[:2]:
+            OrderItem.objects.create(order=past, product=product, quantity=2, price=product.price)
+
+        response = self.client.post(reverse('store:reorder', args=[past.pk]))
+        self.assertRedirects(response, reverse('store:cart'))
+        pending = Order.objects.get(user=self.user, status='pending')
+        self.assertEqual(pending.total_amount, 2 * 100 + 2 * 200)
+
+
+# ----------------------------
+# Stock reservations
+# ----------------------------
+class ReservationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            category=Category.objects.create(name='Phones'), name='Phone', description='', price=1000, quantity=3,
+        )
+        users = get_user_model().objects
+        cls.alice = users.create_user(username='alice', email='alice@example.com', password='pass')
+        cls.bob = users.create_user(username='bob', email='bob@example.com', password='pass')
+
+    def make_order(self, user, quantity):
+        order = Order.objects.create(user=user)
+        OrderItem.objects.create(order=order, product=self.product, quantity=quantity, price=self.product.price)
+        return order
+
+    def available(self):
+        self.product.refresh_from_db()
+        return self.product.available_quantity
+
+    def test_held_stock_is_not_available_to_others(self):
+        alice_order, bob_order = self.make_order(self.alice, 2), self.make_order(self.bob, 2)
+        reserve(alice_order)
+        self.assertEqual(self.available(), 1)
+
+        with self.assertRaises(OutOfStock) as caught:
+            reserve(bob_order)
+        self.assertEqual(caught.exception.shortages[0][3], 1)
+        with self.assertRaises(OutOfStock):
+            complete_order(bob_order)
+
+        complete_order(alice_order)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.quantity, self.product.reserved_quantity), (1, 0))
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_restarting_checkout_replaces_the_hold(self):
+        order = self.make_order(self.alice, 2)
+        reserve(order)
+        reserve(order)
+        self.assertEqual(self.available(), 1)
+        self.assertEqual(StockReservation.objects.get().quantity, 2)
+
+    def test_expired_holds_are_released_in_bulk(self):
+        reserve(self.make_order(self.alice, 1))
+        reserve(self.make_order(self.bob, 2))
+        self.assertEqual(self.available(), 0)
+
+        self.assertEqual(expire_reservations(batch_size=1), 0)
+        self.assertEqual(expire_reservations(batch_size=1, now=timezone.now() + timedelta(days=1)), 2)
+        self.assertEqual(self.available(), 3)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_cancelling_or_deleting_releases(self):
+        self.client.force_login(self.alice)
+        order = self.make_order(self.alice, 2)
+        reserve(order)
+        self.client.get(reverse('store:cancel_order', args=[order.pk]))
+        self.assertEqual(self.available(), 3)
+
+        other = self.make_order(self.bob, 3)
+        reserve(other)
+        other.delete()
+        self.assertEqual(self.available(), 3)
+
+    def test_place_order_reserves(self):
+        self.client.force_login(self.alice)
+        self.client.post(reverse('store:add_to_cart', args=[self.product.pk]))
+        response = self.client.post(reverse('store:start_checkout'))
+        self.assertRedirects(response, reverse('store:checkout'))
+        self.assertEqual(self.available(), 2)
+        self.assertIsNotNone(self.client.get(reverse('store:checkout')).context['reserved_until'])
+
+
+# ----------------------------
+# Checkout waiting room
+# ----------------------------
+@override_settings(ADMISSION_MAX_ACTIVE=1)
+class AdmissionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = get_user_model().objects
+        cls.alice = users.create_user(username='alice', email='alice@example.com', password='pass')
+        cls.bob = users.create_user(username='bob', email='bob@example.com', password='pass')
+        Order.objects.create(user=cls.alice)
+        Order.objects.create(user=cls.bob)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_gate_queues_in_arrival_order(self):
+        gate = Gate('test', max_active=2)
+        self.assertTrue(gate.enter('a').admitted)
+        self.assertTrue(gate.enter('b').admitted)
+        self.assertEqual(gate.enter('c').position, 1)
+        self.assertEqual(gate.enter('d').position, 2)
+        self.assertEqual(gate.enter('c').position, 1)
+
+        gate.leave('a')
+        self.assertTrue(gate.enter('c').admitted)
+        self.assertEqual(gate.enter('d').position, 1)
+        metrics = gate.metrics()
+        self.assertEqual((metrics['active'], metrics['queue_depth'], metrics['admitted_total']), (2, 1, 3))
+
+    def test_abandoned_places_and_lapsed_leases_free_up(self):
+        gate = Gate('test', max_active=1)
+        gate.enter('a')
+        gate.enter('b')
+        cache.delete(gate._seen_key('b'))  # b stopped polling
+        state = cache.get(gate.key)
+        state['active']['a'] = 0  # a's lease lapsed
+        cache.set(gate.key, state)
+
+        self.assertTrue(gate.enter('c').admitted)
+        metrics = gate.metrics()
+        self.assertEqual((metrics['expired_total'], metrics['abandoned_total']), (1, 1))
+
+    def test_waiting_room_until_admitted(self):
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get(reverse('store:checkout')).status_code, 200)
+
+        self.client.force_login(self.bob)
+        response = self.client.get(reverse('store:checkout'))
+        self.assertEqual(response.status_code, 503)
+        self.assertTemplateUsed(response, 'store/waiting_room.html')
+        self.assertEqual(response['Retry-After'], '3')
+        self.assertEqual(self.client.get(reverse('store:admission_status')).json()['position'], 1)
+
+        Gate('checkout').leave(f'user:{self.alice.pk}')
+        self.assertTrue(self.client.get(reverse('store:admission_status')).json()['admitted'])
+        self.assertEqual(self.client.get(reverse('store:checkout')).status_code, 200)
+
+    @override_settings(ADMISSION_MAX_ACTIVE=0)
+    def test_gate_can_be_turned_off(self):
+        for user in (self.alice, self.bob):
+            self.client.force_login(user)
+            self.assertEqual(self.client.get(reverse('store:checkout')).status_code, 200)
+
+
+# ----------------------------
+# Idempotency keys
+# ----------------------------
+class IdempotencyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            category=Category.objects.create(name='Phones'), name='Phone', description='', price=1000, quantity=5,
+        )
+        cls.user = get_user_model().objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_resubmitted_add_to_cart_is_replayed(self):
+        url = reverse('store:add_to_cart', args=[self.product.pk])
+        first = self.client.post(url, {'idempotency_key': 'k1'})
+        second = self.client.post(url, {'idempotency_key': 'k1'})
+        self.assertEqual(second.status_code, first.status_code)
+        self.assertEqual(second['Location'], first['Location'])
+        self.assertEqual(second['Idempotent-Replay'], 'true')
+        self.assertEqual(second.cookies['cart'].value, first.cookies['cart'].value)
+
+        self.client.post(url, {'idempotency_key': 'k2'})
+        self.assertEqual(self.client.get(reverse('store:cart')).context['items'][0]['quantity'], 2)
+
+    def test_resubmitted_checkout_takes_stock_once(self):
+        self.client.force_login(self.user)
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product=self.product, quantity=2, price=self.product.price)
+
+        data = {'phone_number': '254700000000', 'idempotency_key': 'checkout-1'}
+        first = self.client.post(reverse('store:checkout'), data)
+        second = self.client.post(reverse('store:checkout'), data)
+        self.assertTrue(first.context['success'])
+        self.assertEqual(second.content, first.content)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 3)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('store:add_to_cart', args=[self.product.pk]), {'idempotency_key': 'k1'})
+        response = self.client.post(reverse('store:start_checkout'), {'idempotency_key': 'k1'})
+        self.assertEqual(response.status_code, 422)
+
+    def test_keys_are_scoped_to_the_user(self):
+        url = reverse('store:add_to_cart', args=[self.product.pk])
+        self.client.force_login(self.user)
+        first = self.client.post(url, {'idempotency_key': 'shared'})
+        self.client.logout()
+        other = get_user_model().objects.create_user(username='other', email='other@example.com', password='pass')
+        self.client.force_login(other)
+        second = self.client.post(url, {'idempotency_key': 'shared'})
+        self.assertEqual(second.status_code, first.status_code)
+        self.assertFalse(second.has_header('Idempotent-Replay'))
+        self.assertEqual(IdempotencyKey.objects.filter(key='shared').count(), 2)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            IdempotencyKey.objects.create(key='anon', method='POST', path=url, expires_at=timezone.now())
+            IdempotencyKey.objects.create(key='anon', method='POST', path=url, expires_at=timezone.now())
+
+    def test_requests_without_a_key_are_not_recorded(self):
+        self.client.post(reverse('store:add_to_cart', args=[self.product.pk]))
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class IdempotencyConcurrencyTests(TransactionTestCase):
+    def test_concurrent_duplicate_waits_for_the_first(self):
+        calls = []
+
+        @idempotent
+        def slow_view(request):
+            calls.append(1)
+            time.sleep(0.5)
+            return HttpResponse(f'call {len(calls)}')
+
+        def post():
+            request = RequestFactory().post('/slow/', {'idempotency_key': 'same'})
+            request.user = AnonymousUser()
+            try:
+                responses.append(slow_view(request))
+            finally:
+                connection.close()
+
+        responses = []
+        threads = [threading.Thread(target=post) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([response.content for response in responses], [b'call 1'] * 3)
+        self.assertEqual(sum(response.has_header('Idempotent-Replay') for response in responses), 2)
+
+
+# ----------------------------
+# Customer order summary follows order state changes
+# ----------------------------
+class CustomerSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            category=Category.objects.create(name='Phones'), name='Phone', description='', price=1000, quantity=10,
+        )
+        cls.user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='pass')
+
+    def make_order(self, quantity):
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product=self.product, quantity=quantity, price=self.product.price)
+        return order
+
+    def summary(self):
+        profile = self.user.customer_profile
+        profile.refresh_from_db()
+        return profile.order_count, profile.lifetime_spend, profile.last_order_id
+
+    def test_summary_counts_placed_orders_only(self):
+        order = self.make_order(2)
+        self.assertEqual(self.summary(), (0, 0, None))
+
+        complete_order(order)
+        self.assertEqual(self.summary(), (1, 2000, order.pk))
+
+        later = self.make_order(1)
+        later.refresh_from_db()  # pick up the total the items set
+        later.status = 'paid'
+        later.save()
+        self.assertEqual(self.summary(), (2, 3000, later.pk))
+
+        later.status = 'cancelled'
+        later.save()
+        self.assertEqual(self.summary(), (1, 2000, order.pk))
+
+        order.delete()
+        self.assertEqual(self.summary(), (0, 0, None))
+
+    def test_summary_matches_a_rebuild(self):
+        for quantity in (1, 2, 3):
+            complete_order(self.make_order(quantity))
+        self.make_order(4)  # still a cart
+        before = self.summary()
+        refresh_summaries([self.user.pk])
+        self.assertEqual(self.summary(), before)
+        self.assertEqual(before[:2], (3, 6000))
+
+    def test_dashboard_header_reads_the_profile(self):
+        complete_order(self.make_order(2))
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('accounts:customer_dashboard'))
+        self.assertContains(response, 'Ksh 2000.00')
+        self.assertContains(response, reverse('store:order_detail', args=[self.user.store_orders.get().pk]))
+        self.assertNotIn('products', response.context)  # nothing unrendered is built
@@ -0,0 +1,41 @@
+"""
+Denormalized order totals.
+
+Order.total_amount is the sum of quantity * price over the order's items. It
+is recomputed in the database by a single UPDATE whenever an OrderItem is
+saved or deleted (see store.signals), so the cart and checkout read it
+straight off the order instead of loading and summing every item.
+"""
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Order, OrderItem
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def line_total():
+    return ExpressionWrapper(F('quantity') * F('price'), output_field=MONEY)
+
+
+def order_total(order_id):
+    """
+    Sum of the order's lines, aggregated by the database.
+    """
+    return OrderItem.objects.filter(order_id=order_id).aggregate(
+        total=Coalesce(Sum(line_total()), Value(0), output_field=MONEY)
+    )['total']
+
+
+def refresh_totals(order_ids=None):
+    """
+    Recompute total_amount for the given orders (all orders if None).
+    """
+    totals = (
+        OrderItem.objects.filter(order_id=OuterRef('pk'))
+        .values('order_id')
+        .annotate(total=Sum(line_total()))
+        .values('total')
+    )
+    orders = Order.objects.all() if order_ids is None else Order.objects.filter(pk__in=order_ids)
+    return orders.update(total_amount=Coalesce(Subquery(totals, output_field=MONEY), Value(0), output_field=MONEY))
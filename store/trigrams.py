@@ -0,0 +1,107 @@
+"""
+Typo-tolerant matching with an in-memory trigram inverted index.
+
+Texts are split into padded character trigrams (the pg_trgm scheme) and each
+trigram maps to the ids containing it. A query only visits the postings of
+its own trigrams and scores each candidate by the share of the query's
+trigrams it contains (ties broken by Jaccard similarity), so "samsng galxy"
+still finds "Samsung Galaxy" and "trak ordr" finds a longer FAQ question.
+Searches use it as a fallback when exact matching returns too few results.
+"""
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from .autocomplete import normalize
+from .lazyindex import LazyIndex, search_index_version
+
+
+def trigrams(text):
+    grams = set()
+    for word in normalize(text).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(set)   # trigram -> ids
+        self._grams = {}                    # id -> trigrams
+
+    def __len__(self):
+        return len(self._grams)
+
+    def load(self, items):
+        """
+        Replace the contents with (id, text) pairs.
+        """
+        postings, grams = defaultdict(set), {}
+        for pk, text in items:
+            grams[pk] = trigrams(text)
+            for gram in grams[pk]:
+                postings[gram].add(pk)
+        with self._lock:
+            self._postings, self._grams = postings, grams
+
+    def add(self, pk, text):
+        with self._lock:
+            self.remove(pk)
+            self._grams[pk] = trigrams(text)
+            for gram in self._grams[pk]:
+                self._postings[gram].add(pk)
+
+    def remove(self, pk):
+        with self._lock:
+            for gram in self._grams.pop(pk, ()):
+                self._postings[gram].discard(pk)
+
+    def search(self, query, limit=20, threshold=None):
+        """
+        Return [(id, similarity)] best first, keeping matches at or above
+        `threshold` (SEARCH_FUZZY_THRESHOLD by default).
+        """
+        if threshold is None:
+            threshold = getattr(settings, 'SEARCH_FUZZY_THRESHOLD', 0.45)
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        shared = Counter()
+        with self._lock:
+            for gram in query_grams:
+                shared.update(self._postings.get(gram, ()))
+            scored = []
+            for pk, common in shared.items():
+                similarity = common / len(query_grams)
+                if similarity >= threshold:
+                    jaccard = common / (len(query_grams) + len(self._grams[pk]) - common)
+                    scored.append((pk, similarity, jaccard))
+        scored.sort(key=lambda item: (-item[1], -item[2], item[0]))
+        return [(pk, similarity) for pk, similarity, _ in scored[:limit]]
+
+
+class LazyTrigramIndex(LazyIndex):
+    """
+    A per-worker TrigramIndex built from `loader()` on first use and rebuilt
+    when `version()` changes (see store.lazyindex).
+    """
+
+    def __init__(self, loader, version=None):
+        self.loader = loader
+        super().__init__(self._build, version)
+
+    def _build(self):
+        index = TrigramIndex()
+        index.load(self.loader())
+        return index
+
+
+def _load_products():
+    from .models import Product
+
+    return Product.objects.filter(quantity__gt=0).values_list('id', 'name').iterator()
+
+
+product_index = LazyTrigramIndex(_load_products, version=search_index_version)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'store'
 
@@ -9,8 +9,14 @@ urlpatterns = [
 
     # Products listing and details
     path('products/', views.product_list, name='product_list'),
+    path('search/autocomplete/', views.autocomplete, name='autocomplete'),
     path('product/<int:product_id>/', views.product_detail, name='product_detail'),
 
+    # Read-only JSON catalog API (see store.api)
+    path('api/products/', api.product_list, name='api_products'),
+    path('api/products/<int:product_id>/', api.product_detail, name='api_product_detail'),
+    path('api/categories/', api.category_list, name='api_categories'),
+
     # Admin actions
     path('product/add/', views.add_product, name='add_product'),
     path('product/update/<int:product_id>/', views.update_product, name='update_product'),
@@ -19,10 +25,17 @@ urlpatterns = [
     # Wishlist toggle
     path('wishlist/toggle/<int:product_id>/', views.toggle_wishlist, name='toggle_wishlist'),
     path('cart/', views.cart, name='cart'),
+    path('cart/batch/', views.cart_batch, name='cart_batch'),
+    path('checkout/start/', views.start_checkout, name='start_checkout'),
     path('checkout/', views.checkout, name='checkout'),
+    path('checkout/queue/', views.admission_status, name='admission_status'),
+    path('checkout/queue/metrics/', views.admission_metrics, name='admission_metrics'),
     path('add-to-cart/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('cancel-order/<int:order_id>/', views.cancel_order, name='cancel_order'),
     path('order/<int:order_id>/', views.order_detail, name='order_detail'),
+    path('order/<int:order_id>/reorder/', views.reorder, name='reorder'),
+    path('export/products/', views.export_products, name='export_products'),
+    path('export/orders/', views.export_orders, name='export_orders'),
     path('shipping-info/', views.shipping_info, name='shipping_info'),
     # About Us page
     path('about/', views.about, name='about'),
@@ -1,10 +1,30 @@
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db.models import Q, F
-from .models import Product, Category, ProductImage, Order, OrderItem, OrderTracking
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
+from .models import Product, Order, OrderItem, OrderTracking
 from accounts.models import Wishlist
 from .forms import ProductForm, CategoryForm
+from .listing import filter_products, SORT_CHOICES
+from .facets import get_facets, sidebar
+from .pagination import paginate
+from .counters import record_product_view
+from .recommendations import recommended_products
+from .featured import get_feed
+from .checkout import complete_order, reserve, release, CheckoutError, OutOfStock
+from .admission import admission_required, checkout_gate, leave, ticket_for
+from .idempotency import idempotent
+from .totals import line_total
+from .carts import Cart, CartChangeError, apply_changes, parse_changes, persist as persist_cart, reorder_changes
+from .autocomplete import suggest
+from .exports import is_staff, stream_export
+from .images import save_with_images, ImageUploadError
+from .conditional import catalog_etag, catalog_last_modified, product_etag, product_last_modified
 
 # ----------------------------
 # Helper: check if user is admin
@@ -15,49 +35,70 @@ def is_admin(user):
 # ----------------------------
 # Home Page
 # ----------------------------
+# Catalog pages answer repeat visits with 304 Not Modified (see store.conditional)
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
 def home(request):
-    products = Product.objects.filter(quantity__gt=0)[:10]  # first 10 featured products
-    return render(request, 'store/home.html', {'products': products})
+    # Cached list of dicts (see store.featured); no catalog queries on a hit
+    return render(request, 'store/home.html', {'products': get_feed()})
 
 # ----------------------------
 # Product List (Customer view)
 # ----------------------------
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
 def product_list(request):
-    query = request.GET.get('q', '')
-    category_filter = request.GET.get('category', '')
-
-    products = Product.objects.filter(quantity__gt=0)
-
-    if query:
-        products = products.filter(Q(name__icontains=query) | Q(description__icontains=query))
+    # Filters and sorts are described in store.listing; the sidebar counts
+    # come from the cached facet counters (store.facets)
+    facet_data = get_facets()
+    products, ordering, filters = filter_products(Product.objects.for_listing(), request.GET, facet_data)
+    category = filters['category']
 
-    if category_filter:
-        products = products.filter(category__name__icontains=category_filter)
-
-    categories = Category.objects.all()
+    page = paginate(request, products, settings.PRODUCTS_PER_PAGE, ordering)
     return render(request, 'store/product_list.html', {
-        'products': products,
-        'categories': categories,
-        'query': query,
-        'category_filter': category_filter
+        'products': page,
+        'page': page,
+        'facets': sidebar(facet_data, category['id'] if category else None, filters['price_band'], filters['stock']),
+        'query': filters['query'],
+        'category_filter': category['slug'] if category else request.GET.get('category', ''),
+        'price_band': filters['price_band'],
+        'stock': filters['stock'],
+        'min_price': filters['min_price'],
+        'max_price': filters['max_price'],
+        'sort': filters['sort'],
+        'sort_choices': SORT_CHOICES,
     })
 
+# ----------------------------
+# Search Suggestions (JSON)
+# ----------------------------
+@cache_control(public=True, max_age=60)
+def autocomplete(request):
+    query = request.GET.get('q', '').strip()
+    return JsonResponse({'query': query, 'results': suggest(query, limit=10)})
+
 # ----------------------------
 # Product Detail
 # ----------------------------
 def product_detail(request, product_id):
+    # Counted before the conditional check so 304 responses are views too.
+    # Buffered; written back to views_count in batches (see store.counters),
+    # and unknown ids simply match no row when flushed.
+    record_product_view(product_id)
+    return _product_detail(request, product_id)
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=product_etag, last_modified_func=product_last_modified)
+def _product_detail(request, product_id):
     product = get_object_or_404(Product, id=product_id)
 
-    # Increment views_count atomically
-    Product.objects.filter(id=product.id).update(views_count=F('views_count') + 1)
-    product.refresh_from_db(fields=['views_count'])
-
     # Get all additional images
     additional_images = product.additional_images.all()
 
     return render(request, 'store/product_detail.html', {
         'product': product,
-        'additional_images': additional_images
+        'additional_images': additional_images,
+        'recommended_products': recommended_products(product),
     })
 
 # ----------------------------
@@ -69,12 +110,17 @@ def add_product(request):
     if request.method == 'POST':
         form = ProductForm(request.POST, request.FILES)
         if form.is_valid():
-            product = form.save()
-            files = request.FILES.getlist('additional_images')
-            for f in files:
-                ProductImage.objects.create(product=product, image=f)
-            messages.success(request, f"Product '{product.name}' added successfully.")
-            return redirect('store:product_list')
+            product = form.save(commit=False)
+            try:
+                # Main and additional images upload in parallel (see store.images)
+                failed = save_with_images(product, request.FILES.getlist('additional_images'))
+            except ImageUploadError as exc:
+                messages.error(request, str(exc))
+            else:
+                if failed:
+                    messages.warning(request, f"{failed} additional image(s) could not be uploaded.")
+                messages.success(request, f"Product '{product.name}' added successfully.")
+                return redirect('store:product_list')
     else:
         form = ProductForm()
     return render(request, 'store/add_product.html', {'form': form})
@@ -89,12 +135,16 @@ def update_product(request, product_id):
     if request.method == 'POST':
         form = ProductForm(request.POST, request.FILES, instance=product)
         if form.is_valid():
-            product = form.save()
-            files = request.FILES.getlist('additional_images')
-            for f in files:
-                ProductImage.objects.create(product=product, image=f)
-            messages.success(request, f"Product '{product.name}' updated successfully.")
-            return redirect('store:product_detail', product_id=product.id)
+            product = form.save(commit=False)
+            try:
+                failed = save_with_images(product, request.FILES.getlist('additional_images'))
+            except ImageUploadError as exc:
+                messages.error(request, str(exc))
+            else:
+                if failed:
+                    messages.warning(request, f"{failed} additional image(s) could not be uploaded.")
+                messages.success(request, f"Product '{product.name}' updated successfully.")
+                return redirect('store:product_detail', product_id=product.id)
     else:
         form = ProductForm(instance=product)
     return render(request, 'store/update_product.html', {'form': form, 'product': product})
@@ -128,35 +178,109 @@ def toggle_wishlist(request, product_id):
 # ----------------------------
 # Cart / Add to Cart
 # ----------------------------
-@login_required
+@require_POST
+@idempotent
 def add_to_cart(request, product_id):
+    # Only the signed cart cookie changes; see store.carts
     product = get_object_or_404(Product, id=product_id)
-    order, created = Order.objects.get_or_create(user=request.user, status='pending')
-    item, created = OrderItem.objects.get_or_create(order=order, product=product, defaults={'price': product.price, 'quantity': 1})
-    if not created:
-        item.quantity += 1
-        item.save()
-    return redirect('store:cart')
+    basket = Cart.from_request(request)
+    if not basket.add(product.pk):
+        messages.error(request, "Your cart is full. Check out or remove items first.")
+    response = redirect('store:cart')
+    basket.save(response)
+    return response
 
-@login_required
 def cart(request):
-    order = Order.objects.filter(user=request.user, status='pending').first()
-    items = order.items.all() if order else []
-    total = sum(item.get_total_price() for item in items) if order else 0
-    return render(request, 'store/cart.html', {'items': items, 'total': total})
+    # Lines already saved on a pending order, plus those still in the cookie
+    lines, total = {}, 0
+    if request.user.is_authenticated:
+        order = Order.objects.filter(user=request.user, status='pending').first()
+        if order:
+            for item in order.items.select_related('product').annotate(line_total=line_total()):
+                lines[item.product_id] = {
+                    'product': item.product, 'quantity': item.quantity,
+                    'price': item.price, 'line_total': item.line_total,
+                }
+            total = order.total_amount
+    for product, quantity in Cart.from_request(request).products():
+        line = lines.setdefault(product.pk, {'product': product, 'quantity': 0, 'price': product.price, 'line_total': 0})
+        line['quantity'] += quantity
+        line['line_total'] += quantity * line['price']
+        total += quantity * line['price']
+    return render(request, 'store/cart.html', {'items': list(lines.values()), 'total': total})
+
+@login_required
+@require_POST
+@idempotent
+def cart_batch(request):
+    """
+    Apply {"changes": [{"product_id", "quantity", "op": "add"|"set"|"remove"}]}
+    to the pending order in one transaction.
+    """
+    try:
+        payload = json.loads(request.body or b'null')
+        changes = parse_changes(payload.get('changes') if isinstance(payload, dict) else None)
+    except ValueError as exc:  # includes JSONDecodeError and CartChangeError
+        message = str(exc) if isinstance(exc, CartChangeError) else "Request body must be JSON."
+        return JsonResponse({'error': message}, status=400)
+    order, skipped = apply_changes(request.user, changes)
+    items = order.items.annotate(line_total=line_total()).values('product_id', 'quantity', 'price', 'line_total')
+    return JsonResponse({
+        'order': order.id,
+        'items': list(items),
+        'total': order.total_amount,
+        'skipped': skipped,
+    })
+
+@login_required
+@require_POST
+def reorder(request, order_id):
+    past_order = get_object_or_404(Order, id=order_id, user=request.user)
+    _, skipped = apply_changes(request.user, reorder_changes(past_order))
+    if skipped:
+        messages.warning(request, f"{len(skipped)} item(s) from order #{past_order.id} are no longer available.")
+    messages.success(request, f"Items from order #{past_order.id} were added to your cart.")
+    return redirect('store:cart')
 
 # ----------------------------
 # Checkout / MPESA Payment
 # ----------------------------
 @login_required
+@idempotent
+@admission_required
+def start_checkout(request):
+    """
+    "Place Order": save the cookie cart and hold stock for the order.
+    """
+    if request.method != 'POST':
+        return redirect('store:checkout')
+    basket = Cart.from_request(request)
+    persist_cart(basket, request.user)
+    order = Order.objects.filter(user=request.user, status='pending').first()
+    response = redirect('store:checkout' if order else 'store:product_list')
+    if order:
+        try:
+            reserve(order)
+        except OutOfStock as exc:
+            messages.error(request, str(exc))
+            response = redirect('store:cart')
+    if basket:
+        basket.clear(response)
+    return response
+
+@login_required
+@idempotent
+@admission_required
 def checkout(request):
+    # Cookie lines only become an order through "Place Order" (start_checkout)
+    # or login; until then show them in the cart instead of writing here
+    if Cart.from_request(request):
+        return cart(request)
+
     order = Order.objects.filter(user=request.user, status='pending').first()
     if not order:
         return redirect('store:product_list')
 
-    order.total_amount = sum(item.get_total_price() for item in order.items.all())
-    order.save()
-
     if request.method == "POST":
         phone_number = request.POST.get("phone_number")
         if not phone_number:
@@ -165,15 +289,16 @@ def checkout(request):
                 "error": "Please enter a valid phone number."
             })
 
-        # Reduce stock
-        for item in order.items.all():
-            item.product.quantity -= item.quantity
-            item.product.save()
-
-        # Complete order
-        order.status = 'completed'
-        order.save()
+        # Take stock for every line and complete the order, all or nothing
+        try:
+            complete_order(order)
+        except CheckoutError as exc:
+            return render(request, 'mpesapayment/mpesa_payment.html', {
+                "order": order,
+                "error": str(exc),
+            })
 
+        leave(request)  # done with the checkout critical section
         mpesa_details = {
             "phone_number": phone_number,
             "amount": order.total_amount,
@@ -187,7 +312,31 @@ def checkout(request):
             "success": True
         })
 
-    return render(request, 'mpesapayment/mpesa_payment.html', {"order": order})
+    reserved_until = order.reservations.order_by('expires_at').values_list('expires_at', flat=True).first()
+    return render(request, 'mpesapayment/mpesa_payment.html', {"order": order, "reserved_until": reserved_until})
+
+# ----------------------------
+# Checkout waiting room
+# ----------------------------
+@login_required
+@cache_control(no_store=True)
+def admission_status(request):
+    """
+    Polled by the waiting room; polling also keeps the shopper's place.
+    """
+    admission = checkout_gate.enter(ticket_for(request))
+    return JsonResponse({
+        'admitted': admission.admitted,
+        'position': admission.position,
+        'queue_depth': admission.queue_depth,
+        'retry_after': admission.retry_after,
+    })
+
+@login_required
+@user_passes_test(is_staff)
+@cache_control(no_store=True)
+def admission_metrics(request):
+    return JsonResponse(checkout_gate.metrics())
 
 # ----------------------------
 # Cancel Order
@@ -198,6 +347,7 @@ def cancel_order(request, order_id):
     if order.status == 'pending':
         order.status = 'cancelled'
         order.save()
+        release(order)
     return redirect('accounts:customer_dashboard')
 
 # ----------------------------
@@ -222,6 +372,50 @@ def order_detail(request, order_id):
     })
     
     
+# ----------------------------
+# Staff: Streaming Exports
+# ----------------------------
+@login_required
+@user_passes_test(is_staff)
+def export_products(request):
+    columns = [
+        ('id', 'id'),
+        ('name', 'name'),
+        ('slug', 'slug'),
+        ('category', 'category__name'),
+        ('price', 'price'),
+        ('quantity', 'quantity'),
+        ('is_in_stock', 'is_in_stock'),
+        ('views_count', 'views_count'),
+        ('rating_avg', 'rating_avg'),
+        ('rating_count', 'rating_count'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    ]
+    return stream_export(request, Product.objects.order_by('id'), columns, 'products')
+
+@login_required
+@user_passes_test(is_staff)
+def export_orders(request):
+    # One row per order line, with the order's fields repeated on each line
+    columns = [
+        ('order_id', 'order_id'),
+        ('order_created_at', 'order__created_at'),
+        ('customer', 'order__user__username'),
+        ('customer_email', 'order__user__email'),
+        ('status', 'order__status'),
+        ('order_total', 'order__total_amount'),
+        ('completed_at', 'order__completed_at'),
+        ('item_id', 'id'),
+        ('product_id', 'product_id'),
+        ('product', 'product__name'),
+        ('quantity', 'quantity'),
+        ('unit_price', 'price'),
+    ]
+    items = OrderItem.objects.order_by('order_id', 'id')
+    return stream_export(request, items, columns, 'orders', date_field='order__created_at')
+
+
 def shipping_info(request):
     return render(request, 'store/shipping_info.html')
 